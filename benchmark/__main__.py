@@ -0,0 +1,57 @@
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+import pandas as pd
+
+from benchmark.reference import ReferenceSwitchLogParser
+from plotter.parser import SwitchLogParser
+
+
+def count_lines(path: Path) -> int:
+    with open(path, 'rb') as f:
+        return sum(block.count(b'\n') for block in iter(lambda: f.read(1024 * 1024), b''))
+
+
+def main() -> None:
+    parser = ArgumentParser()
+    parser.add_argument('--switch-log', type=Path, required=True, help='The switch log to parse, e.g. p4s.s1.log')
+    parser.add_argument('--repeat', type=int, default=3, help='How many times the bulk parser should be timed')
+    parser.add_argument('--skip-reference', action='store_true',
+                        help='Do not run the (slow) reference parser, do not validate the output of the bulk parser')
+    args = parser.parse_args()
+
+    # Load some args into intermediate variables to add type hints
+    args_switch_log: Path = args.switch_log
+
+    if not args_switch_log.exists():
+        raise FileNotFoundError(f'Cannot find the file: {args_switch_log}')
+
+    line_count = count_lines(args_switch_log)
+    print(f'Switch log: {args_switch_log} ({line_count} lines, {args_switch_log.stat().st_size} bytes)')
+
+    best_seconds = float('inf')
+    data = None
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        data = SwitchLogParser.parse(args_switch_log)
+        best_seconds = min(best_seconds, time.perf_counter() - start)
+    print(f'Bulk parser: {best_seconds:.3f} s, {line_count / best_seconds:,.0f} lines/s'
+          f' (best of {args.repeat}, {data.shape[0]} log entries)')
+
+    if args.skip_reference:
+        return
+
+    start = time.perf_counter()
+    reference_data = ReferenceSwitchLogParser.parse(args_switch_log)
+    reference_seconds = time.perf_counter() - start
+    print(f'Reference parser: {reference_seconds:.3f} s, {line_count / reference_seconds:,.0f} lines/s')
+
+    # Raises an AssertionError if the bulk parser's output differs from the reference parser's output
+    pd.testing.assert_frame_equal(data, reference_data)
+    print(f'The output of the bulk parser is identical to the output of the reference parser'
+          f' ({reference_seconds / best_seconds:.1f}x speedup)')
+
+
+if __name__ == '__main__':
+    main()
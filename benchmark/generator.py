@@ -0,0 +1,142 @@
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+from p4build.constants import VARIANTS, FLOW_ID_WIDTH, VQ_INDEX_ASSIGNED_COUNT
+from plotter.constants import MAX_QUEUE_DELAY_MS
+from scenario.spec import MeasurementMetadata, TopologySpec
+
+
+def parse_count(value: str) -> int:
+    """Parses e.g. 10K or 50M, the same way as the iperf rates of network.py."""
+    multipliers = {'K': 1_000, 'M': 1_000_000, 'G': 1_000_000_000}
+    if value[-1:].upper() in multipliers:
+        return int(float(value[:-1]) * multipliers[value[-1:].upper()])
+    return int(value)
+
+
+class SyntheticLogGenerator:
+    """
+    Generates switch logs in the format of bmv2 (see the log_msg calls in logic.p4) without running Mininet:
+    each packet is logged by the ingress (the VQ variants also log its meter color) and by the egress.
+    The flows, the queue delays and the packet sizes are random, but the result is deterministic for a given seed.
+    """
+
+    # How many packets are formatted at once
+    CHUNK_PACKET_COUNT: int = 100_000
+
+    # Every n-th packet is a backward packet (server -> client), like the TCP ACKs
+    BACKWARD_PACKET_INTERVAL: int = 4
+    # The large flows (the last flow type) send this many times more packets than the small ones
+    LARGE_FLOW_WEIGHT: float = 10.0
+
+    def __init__(self, line_count: int, flow_count: int, variant: str, seed: int = 0,
+                 duration_seconds: float = 60) -> None:
+        if variant not in VARIANTS:
+            raise ValueError(f'Unknown variant: {variant}')
+        self._line_count: int = line_count
+        self._flow_count: int = flow_count
+        self._variant: str = variant
+        self._seed: int = seed
+        self._duration_seconds: float = duration_seconds
+        # The lines of a packet: "Received IPv4", "Egress port set", ("Meter color") and "Egress data"
+        self._packet_line_count: int = 3 if variant == 'no-vq' else 4
+
+    def write(self, path: Path) -> int:
+        """Writes the log file; returns how many lines have been written."""
+        rng = np.random.default_rng(self._seed)
+
+        # Each flow goes from a client host (its flow type) to a server host, as in the default scenario of network.py
+        metadata = MeasurementMetadata()
+        client_ports = np.array(metadata.client_ports)
+        flow_ingress_ports = rng.choice(client_ports, self._flow_count)
+        flow_egress_ports = rng.integers(client_ports.max() + 1, client_ports.max() + TopologySpec().server_hosts + 1,
+                                         self._flow_count)
+        flow_ids = rng.integers(0, 1 << FLOW_ID_WIDTH, self._flow_count)
+        flow_weights = np.where(np.isin(flow_ingress_ports, metadata.flow_type_ports[-1]), self.LARGE_FLOW_WEIGHT, 1.0)
+        flow_weights /= flow_weights.sum()
+
+        # The packets are spread evenly over the duration, so that load_data keeps the same share of them at any size
+        packet_count = -(-self._line_count // self._packet_line_count)
+        packet_interval_us = self._duration_seconds * 1_000_000 / packet_count
+
+        written_line_count, first_packet = 0, 0
+        with open(path, 'w') as f:
+            while written_line_count < self._line_count:
+                chunk_packet_count = min(self.CHUNK_PACKET_COUNT, packet_count - first_packet)
+                lines = self._format_chunk(rng, flow_ingress_ports, flow_egress_ports, flow_ids, flow_weights,
+                                           first_packet, chunk_packet_count, packet_interval_us)
+                lines = lines[:self._line_count - written_line_count]
+                f.write('\n'.join(lines))
+                f.write('\n')
+                written_line_count += len(lines)
+                first_packet += chunk_packet_count
+        return written_line_count
+
+    def _format_chunk(self, rng: np.random.Generator, flow_ingress_ports: np.ndarray, flow_egress_ports: np.ndarray,
+                      flow_ids: np.ndarray, flow_weights: np.ndarray, first_packet: int, count: int,
+                      packet_interval_us: float) -> List[str]:
+        flows = rng.choice(len(flow_ids), count, p=flow_weights)
+        # bmv2's timestamps are microseconds since the switch has started
+        timestamps = 1_000_000 + ((first_packet + np.arange(count)) * packet_interval_us).astype(np.int64)
+        # The first packet is a forward one: load_data takes its timestamp as the epoch time
+        backward = np.arange(count) % self.BACKWARD_PACKET_INTERVAL == self.BACKWARD_PACKET_INTERVAL - 1
+        ingress_ports = np.where(backward, flow_egress_ports[flows], flow_ingress_ports[flows])
+        egress_ports = np.where(backward, flow_ingress_ports[flows], flow_egress_ports[flows])
+        packet_lengths = np.where(backward, 66, rng.integers(500, 1515, count))
+        dequeue_timedeltas = rng.integers(0, MAX_QUEUE_DELAY_MS * 1_000, count)
+        colors = rng.integers(0, 3, count)
+        vq_ids = self._get_vq_ids(flows, flow_ids, egress_ports)
+
+        lines: List[str] = []
+        for i in range(count):
+            time = self._format_time(int(timestamps[i]))
+            prefix = f'[{time}] [bmv2] [I] [thread 1234] '
+            lines.append(f'{prefix}Received IPv4: ingress={ingress_ports[i]}; ttl=64; protocol=6; ecn=2;'
+                         f' 10.0.{ingress_ports[i]}.2 -> 10.0.{egress_ports[i]}.2')
+            lines.append(f'{prefix}Egress port set to {egress_ports[i]}'
+                         f' and dst MAC to 00:00:0a:00:00:{egress_ports[i]:02x}')
+            if self._variant != 'no-vq':
+                lines.append(f'{prefix}Meter color of VQ={vq_ids[i]}: {colors[i]}')
+            lines.append(f'{prefix}Egress data: timestamp={timestamps[i]}; ingress_port={ingress_ports[i]};'
+                         f' egress_port={egress_ports[i]}; flow_id={flow_ids[flows[i]]}; vq_id={vq_ids[i]};'
+                         f' dequeue_timedelta={dequeue_timedeltas[i]}; packet_length={packet_lengths[i]}')
+        return lines
+
+    def _get_vq_ids(self, flows: np.ndarray, flow_ids: np.ndarray, egress_ports: np.ndarray) -> np.ndarray:
+        if self._variant == 'no-vq':
+            return np.zeros(len(flows), dtype=np.int64)
+        if self._variant == 'per-port-vq':
+            return egress_ports
+        if self._variant == 'per-flow-vq':
+            return (egress_ports << FLOW_ID_WIDTH) | flow_ids[flows]
+        return flows % VQ_INDEX_ASSIGNED_COUNT  # indexed-vq: the controller assigns the indexes in order
+
+    @staticmethod
+    def _format_time(timestamp_us: int) -> str:
+        """The wall-clock time of bmv2's logger: as if the switch had started at noon."""
+        milliseconds = timestamp_us // 1_000
+        seconds, milliseconds = divmod(milliseconds, 1_000)
+        minutes, seconds = divmod(seconds, 60)
+        hours, minutes = divmod(minutes, 60)
+        return f'{12 + hours:02d}:{minutes:02d}:{seconds:02d}.{milliseconds:03d}'
+
+
+def main() -> None:
+    parser = ArgumentParser(description='Generates a synthetic switch log, e.g. to benchmark the plotter')
+    parser.add_argument('--lines', type=parse_count, required=True, help='How many log lines to generate, e.g. 10M')
+    parser.add_argument('--flows', type=int, default=30, help='How many flows the packets belong to')
+    parser.add_argument('--variant', choices=VARIANTS, default='per-flow-vq',
+                        help='Which switch variant to imitate: it determines the VQ IDs and the meter color entries')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', type=Path, required=True, help='The log file to write, e.g. p4s.s1.log')
+    args = parser.parse_args()
+
+    line_count = SyntheticLogGenerator(args.lines, args.flows, args.variant, args.seed).write(args.output)
+    print(f'Generated {line_count} lines into {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,31 @@
+import re
+from pathlib import Path
+from typing import Optional, List
+
+import numpy as np
+import pandas as pd
+
+
+class ReferenceSwitchLogParser:
+    """The original line-by-line parser, kept as a reference to validate the output of the bulk parser."""
+
+    @staticmethod
+    def parse(path: Path) -> pd.DataFrame:
+        columns = ['timestamp', 'ingress_port', 'egress_port', 'flow_id', 'vq_id', 'dequeue_timedelta', 'packet_length']
+        data = pd.DataFrame(np.empty((0, len(columns)), dtype=np.int64), columns=columns)
+        with open(path, 'r') as f:
+            for line in f:
+                row = ReferenceSwitchLogParser._parse_line(line)
+                if row is not None:
+                    data_row_array = np.array(row, dtype=np.int64).reshape((1, len(columns)))
+                    data_row_frame = pd.DataFrame(data_row_array, columns=data.columns)
+                    data = pd.concat([data, data_row_frame], ignore_index=True)
+        return data
+
+    @staticmethod
+    def _parse_line(line: str) -> Optional[List[int]]:
+        line = line.rstrip()
+        match = re.fullmatch(r'\[[^]]+] \[bmv2] \[I] \[[^]]+] Egress data:'
+                             r' timestamp=(\d+); ingress_port=(\d+); egress_port=(\d+); '
+                             r'flow_id=(\d+); vq_id=(\d+); dequeue_timedelta=(\d+); packet_length=(\d+)', line)
+        return list(map(int, match.groups())) if match else None
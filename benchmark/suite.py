@@ -0,0 +1,211 @@
+import dataclasses
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from argparse import ArgumentParser
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from pathlib import Path
+from typing import List, Callable, Any, Optional, Dict, Tuple
+
+import matplotlib
+import numpy as np
+import pandas as pd
+from matplotlib import pyplot as plt
+
+from benchmark.__main__ import count_lines
+from benchmark.generator import SyntheticLogGenerator, VARIANTS, parse_count
+from p4build.constants import PER_FLOW_VQ_VARIANTS
+from plotter.__main__ import PLOT_FUNCTIONS
+from plotter.classifier import classify_ingress_port
+from plotter.loader import load_data
+from plotter.parser import SwitchLogParser
+from plotter.summary import MeasurementSummary, MeterColorAccumulator
+from scenario.spec import MeasurementMetadata
+
+# The directory of network.py
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+
+@dataclass
+class StageResult:
+    name: str
+    seconds: float  # The best of the repeats
+    lines_per_second: float
+    peak_memory_bytes: int  # Allocated by the stage on top of its inputs, as traced by tracemalloc
+
+
+class BenchmarkSuite:
+    """
+    Times each stage of the plotter's pipeline on a switch log, from parsing to plotting.
+    Each stage is repeated, then executed once more while tracing the memory allocations: tracemalloc slows down the
+    allocations, therefore the timed executions do not trace them.
+    """
+
+    def __init__(self, switch_log_path: Path, variant: str, plot_dir: Path, repeat: int) -> None:
+        self._switch_log_path: Path = switch_log_path
+        self._variant: str = variant
+        self._plot_dir: Path = plot_dir
+        self._repeat: int = repeat
+        self._line_count: int = count_lines(switch_log_path)
+
+    def run(self) -> List[StageResult]:
+        cache_path = self._switch_log_path.with_suffix('.parsed.bin')
+        results: List[StageResult] = []
+
+        result, _ = self._measure('parse', lambda: SwitchLogParser.parse(self._switch_log_path))
+        results.append(result)
+        result, _ = self._measure('parse_caching (cold)', lambda: SwitchLogParser.parse_caching(self._switch_log_path),
+                                  setup=lambda: cache_path.unlink() if cache_path.exists() else None)
+        results.append(result)
+        result, _ = self._measure('parse_caching (warm)', lambda: SwitchLogParser.parse_caching(self._switch_log_path))
+        results.append(result)
+        result, meter_colors = self._measure('parse_meter_colors_caching (warm)',
+                                             lambda: SwitchLogParser.parse_meter_colors_caching(self._switch_log_path))
+        results.append(result)
+        result, loaded_data = self._measure('load_data (warm cache)', lambda: load_data(self._switch_log_path))
+        results.append(result)
+        # classify_ingress_port adds a column to its input, so each execution gets a fresh copy
+        copies: List[pd.DataFrame] = []
+        result, data = self._measure('classify_ingress_port', lambda: classify_ingress_port(copies.pop()),
+                                     setup=lambda: copies.append(loaded_data.copy()))
+        results.append(result)
+        per_flow_vqs = self._variant in PER_FLOW_VQ_VARIANTS
+        result, summary = self._measure('summarize',
+                                        lambda: MeasurementSummary.of_data(data, per_flow_vqs=per_flow_vqs))
+        results.append(result)
+        metadata = MeasurementMetadata.read(self._switch_log_path.parent)
+        meter_color_accumulator = MeterColorAccumulator(metadata.warmup_seconds)
+        meter_color_accumulator.add(meter_colors)
+        color_counts = meter_color_accumulator.get_color_counts(np.unique(data.vq_id.to_numpy()))
+        summary = dataclasses.replace(summary, color_counts=color_counts[np.newaxis])
+
+        self._plot_dir.mkdir(parents=True, exist_ok=True)
+        for plot_function in PLOT_FUNCTIONS:
+            result, _ = self._measure(plot_function.__name__,
+                                      lambda: plot_function({'benchmark': summary}, self._plot_dir),
+                                      teardown=lambda: plt.close('all'))
+            results.append(result)
+        return results
+
+    def _measure(self, name: str, stage: Callable[[], Any], setup: Optional[Callable[[], Any]] = None,
+                 teardown: Optional[Callable[[], Any]] = None) -> Tuple[StageResult, Any]:
+        """Returns the result of the stage and its output."""
+        best_seconds = float('inf')
+        output = None
+        for _ in range(self._repeat):
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            output = stage()
+            best_seconds = min(best_seconds, time.perf_counter() - start)
+            if teardown is not None:
+                teardown()
+
+        if setup is not None:
+            setup()
+        tracemalloc.start()
+        stage()
+        _, peak_memory_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        if teardown is not None:
+            teardown()
+
+        result = StageResult(name, best_seconds, self._line_count / best_seconds, peak_memory_bytes)
+        print(f'  {name}: {result.seconds:.3f} s, {result.lines_per_second:,.0f} lines/s,'
+              f' {result.peak_memory_bytes / 2 ** 20:,.1f} MiB peak memory')
+        return result, output
+
+
+def get_environment() -> Dict[str, Optional[str]]:
+    """Identifies the version of the code and of the libraries, so that results can be compared over time."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=PROJECT_DIR, capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'matplotlib': matplotlib.__version__,
+    }
+
+
+def print_comparison(results: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    """Prints the speedup of each stage that has also been benchmarked by the baseline, on a log of the same size."""
+    def get_stage_seconds(logs: List[Dict[str, Any]]) -> Dict[Tuple[str, int, int, str], float]:
+        return {(log['variant'], log['lines'], log['flows'], stage['name']): stage['seconds']
+                for log in logs for stage in log['stages']}
+
+    baseline_seconds = get_stage_seconds(baseline['logs'])
+    print(f'Comparison with the baseline (commit {baseline["environment"]["commit"]}):')
+    for key, seconds in get_stage_seconds(results['logs']).items():
+        if key in baseline_seconds:
+            variant, line_count, flow_count, stage_name = key
+            print(f'  {variant}, {line_count} lines, {flow_count} flows, {stage_name}:'
+                  f' {baseline_seconds[key] / seconds:.2f}x speedup')
+
+
+def main() -> None:
+    parser = ArgumentParser(description='Benchmarks the stages of the plotter on synthetic switch logs')
+    parser.add_argument('--lines', type=parse_count, nargs='+', default=[parse_count('1M')],
+                        help='The sizes of the generated switch logs, e.g. 10K 1M 50M')
+    parser.add_argument('--flows', type=int, nargs='+', default=[30], help='The flow counts of the generated logs')
+    parser.add_argument('--variants', choices=VARIANTS, nargs='+', default=['per-flow-vq'],
+                        help='The switch variants imitated by the generated logs')
+    parser.add_argument('--repeat', type=int, default=3, help='How many times each stage should be timed')
+    parser.add_argument('--work-dir', type=Path, default=Path('work/benchmark'),
+                        help='Where to put the generated logs (they are reused by later benchmarks) and the plots')
+    parser.add_argument('--output', type=Path, default=None,
+                        help='Where to write the results as JSON (default: a new file in the work directory)')
+    parser.add_argument('--baseline', type=Path, default=None,
+                        help='The results of an earlier benchmark (e.g. of an older commit) to compare with')
+    args = parser.parse_args()
+
+    # Load some args into intermediate variables to add type hints
+    args_work_dir: Path = args.work_dir
+    args_output: Optional[Path] = args.output
+
+    matplotlib.use('Agg')
+
+    results: Dict[str, Any] = {'environment': get_environment(), 'logs': []}
+    for variant in args.variants:
+        for line_count in args.lines:
+            for flow_count in args.flows:
+                log_dir = args_work_dir / f'{variant}-{line_count}-{flow_count}'
+                switch_log_path = log_dir / 'p4s.s1.log'
+                if not switch_log_path.exists():
+                    log_dir.mkdir(parents=True, exist_ok=True)
+                    print(f'Generating {switch_log_path}...')
+                    SyntheticLogGenerator(line_count, flow_count, variant).write(switch_log_path)
+
+                print(f'{variant}, {line_count} lines, {flow_count} flows'
+                      f' ({switch_log_path.stat().st_size / 2 ** 20:,.1f} MiB):')
+                stage_results = BenchmarkSuite(switch_log_path, variant, log_dir / 'plot', args.repeat).run()
+                results['logs'].append({
+                    'variant': variant,
+                    'lines': line_count,
+                    'flows': flow_count,
+                    'bytes': switch_log_path.stat().st_size,
+                    'stages': [asdict(stage_result) for stage_result in stage_results],
+                })
+
+    if args_output is None:
+        args_output = args_work_dir / f'results-{datetime.now():%Y%m%d-%H%M%S}.json'
+    args_output.parent.mkdir(parents=True, exist_ok=True)
+    with open(args_output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'Results: {args_output}')
+
+    if args.baseline is not None:
+        with open(args.baseline, 'r') as f:
+            print_comparison(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
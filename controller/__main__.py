@@ -3,12 +3,18 @@ import logging
 import sys
 import time
 from argparse import ArgumentParser, FileType
+from pathlib import Path
 
 import networkx
 from p4utils.utils.topology import NetworkGraph
 
+from controller.adaptive import AdaptiveAlphaLoop
+from controller.api import ConfigApiServer
 from controller.controller import Controller
 from controller.data import Config
+from controller.flow_index import FlowVqIndexer
+from controller.stats import VqStatsPoller
+from tracing.tracer import enable_tracing
 
 
 def main() -> None:
@@ -22,8 +28,29 @@ def main() -> None:
     parser.add_argument("--queue-depth-packets", type=int, required=True)
     parser.add_argument("--vq-committed-alpha", type=float, required=True)
     parser.add_argument("--vq-peak-alpha", type=float, required=True)
+    parser.add_argument("--telemetry-port", type=int,
+                        help="Clone the outgoing packets' telemetry records to this switch port (requires TELEMETRY)")
+    parser.add_argument("--init-workers", type=int, default=1,
+                        help="How many switches to initialize concurrently")
+    parser.add_argument("--api-port", type=int,
+                        help="Serve a local HTTP API on this port to change the configuration at runtime")
+    parser.add_argument("--vq-index-idle-timeout", type=float, default=10.0,
+                        help="Free the VQ of a flow after this many idle seconds (only for VARIANT_INDEXED_VQ)")
+    parser.add_argument("--vq-stats-interval", type=float,
+                        help="Poll the per-VQ color counters every this many seconds into --vq-stats-output")
+    parser.add_argument("--vq-stats-output", type=Path, default=Path('vq_stats.bin'),
+                        help="The binary file to append the VQ statistics to")
+    parser.add_argument("--adaptive-interval", type=float,
+                        help="Adapt the VQ alphas to the switch state every this many seconds")
+    parser.add_argument("--adaptive-target-queue-fraction", type=float, default=0.2,
+                        help="The alphas are decreased when the switch queue is fuller than this fraction")
+    parser.add_argument("--profile", type=Path, nargs='?', const=Path('trace.json'), metavar='TRACE_PATH',
+                        help="Append how long the initialization and the periodic tasks take to a Chrome trace file")
     args = parser.parse_args()
 
+    if args.profile is not None:
+        enable_tracing(args.profile, 'controller')
+
     # We don't use p4utils.utils.helper.load_topo because it imports mininet logging, which screws up the logging module
     with args.topology_path as f:
         topology = NetworkGraph(networkx.node_link_graph(json.load(f)))
@@ -33,9 +60,23 @@ def main() -> None:
         switch_queue_depth_packets=args.queue_depth_packets,
         virtual_queue_committed_alpha=args.vq_committed_alpha,
         virtual_queue_peak_alpha=args.vq_peak_alpha,
+        telemetry_port=args.telemetry_port,
     )
     controller = Controller(topology, config)
-    controller.initialize_switches()
+    controller.initialize_switches(workers=args.init_workers)
+
+    for sw in controller.switch_names:
+        if FlowVqIndexer.is_supported(controller, sw):
+            FlowVqIndexer(controller, sw, args.vq_index_idle_timeout).start()
+
+    if args.api_port is not None:
+        ConfigApiServer(controller, args.api_port).start()
+
+    if args.vq_stats_interval is not None:
+        VqStatsPoller(controller, args.vq_stats_interval, args.vq_stats_output).start()
+
+    if args.adaptive_interval is not None:
+        AdaptiveAlphaLoop(controller, args.adaptive_interval, args.adaptive_target_queue_fraction).run()
 
     logging.getLogger(__name__).info('Controller has finished; waiting until interrupted...')
     while True:
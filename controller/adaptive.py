@@ -0,0 +1,77 @@
+import logging
+import time
+from typing import Dict, List
+
+from controller.controller import Controller
+from tracing.tracer import traced
+
+
+class AdaptiveAlphaLoop:
+    """
+    Periodically adjusts the VQ alphas based on the state of the switches:
+    - The real queue is filling up: the VQs are too loose, the alphas are decreased (multiplicatively)
+    - The real queue is short, but the VQs drop packets: the VQs starve flows, the alphas are increased (additively)
+    The ratio of the peak and the committed alpha is kept, the new alphas are pushed only if they have changed.
+    """
+
+    QUEUE_DEPTH_REGISTER = "MyEgress.port_queue_depth"
+    COLOR_PACKETS_REGISTER = "MyIngress.vq_color_packets"
+
+    def __init__(self, controller: Controller, interval_seconds: float, target_queue_fraction: float = 0.2,
+                 decrease_factor: float = 0.9, increase_step: float = 0.01, min_alpha: float = 0.01,
+                 max_alpha: float = 1.0) -> None:
+        self._logger: logging.Logger = logging.getLogger(__name__)
+        self._controller: Controller = controller
+        self._interval_seconds: float = interval_seconds
+        self._target_queue_fraction: float = target_queue_fraction
+        self._decrease_factor: float = decrease_factor
+        self._increase_step: float = increase_step
+        self._min_alpha: float = min_alpha
+        self._max_alpha: float = max_alpha
+        self._last_red_packets: Dict[str, int] = dict()
+
+    def run(self) -> None:
+        self._logger.info(f"Adapting the VQ alphas every {self._interval_seconds} s...")
+        while True:
+            self.step()
+            time.sleep(self._interval_seconds)
+
+    @traced('controller')
+    def step(self) -> None:
+        config = self._controller.config
+        queue_depth, red_packets = 0, 0
+        for sw in self._controller.switch_names:
+            queue_depth = max(queue_depth, max(self._read(sw, self.QUEUE_DEPTH_REGISTER), default=0))
+            red_packets += self._read_red_packets_delta(sw)
+        queue_fraction = queue_depth / config.switch_queue_depth_packets
+
+        committed_alpha = config.virtual_queue_committed_alpha
+        if queue_fraction > self._target_queue_fraction:
+            committed_alpha *= self._decrease_factor
+        elif red_packets > 0:
+            committed_alpha += self._increase_step
+        else:
+            return
+        self._logger.debug(f"Queue depth: {queue_fraction:.0%} of the maximum, dropped by VQs: {red_packets} packets")
+
+        peak_to_committed = config.virtual_queue_peak_alpha / config.virtual_queue_committed_alpha
+        committed_alpha = self._clip(committed_alpha)
+        peak_alpha = self._clip(committed_alpha * peak_to_committed)
+        # Rounding avoids pushing negligible changes to the switches
+        self._controller.update_config(virtual_queue_committed_alpha=round(committed_alpha, 4),
+                                       virtual_queue_peak_alpha=round(peak_alpha, 4))
+
+    def _read_red_packets_delta(self, sw: str) -> int:
+        # The register contains the packet counts of METER_GREEN, METER_YELLOW then METER_RED: the red ones are last
+        color_packets = self._read(sw, self.COLOR_PACKETS_REGISTER)
+        red_packets = sum(color_packets[len(color_packets) // 3 * 2:])
+        delta = red_packets - self._last_red_packets.get(sw, 0)
+        self._last_red_packets[sw] = red_packets
+        return max(delta, 0)  # Registers are cleared when the switch state is reset
+
+    def _read(self, sw: str, register_name: str) -> List[int]:
+        values = self._controller.read_register(sw, register_name)
+        return values if values is not None else []
+
+    def _clip(self, alpha: float) -> float:
+        return min(max(alpha, self._min_alpha), self._max_alpha)
@@ -0,0 +1,89 @@
+import dataclasses
+import json
+import logging
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Any, Dict
+
+from controller.controller import Controller
+from controller.data import Config
+
+
+class ConfigApiServer:
+    """
+    A small local HTTP API to inspect and change the controller's configuration at runtime:
+    - GET /config: returns the configuration as JSON
+    - POST /config: changes the fields of the JSON object body, e.g. {"virtual_queue_committed_alpha": 0.1}
+    """
+
+    def __init__(self, controller: Controller, port: int, host: str = '127.0.0.1') -> None:
+        self._logger: logging.Logger = logging.getLogger(__name__)
+        self._controller: Controller = controller
+        self._server = ThreadingHTTPServer((host, port), self._create_handler_class())
+
+    def start(self) -> None:
+        """Serves requests in a background thread."""
+        self._logger.info(f"Serving the config API at http://{self._server.server_address[0]}:"
+                          f"{self._server.server_address[1]}/config")
+        threading.Thread(target=self._server.serve_forever, name='config-api', daemon=True).start()
+
+    def _create_handler_class(self) -> type:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path != '/config':
+                    self._respond(404, {'error': f'Unknown path: {self.path}'})
+                    return
+                self._respond(200, dataclasses.asdict(server._controller.config))
+
+            def do_POST(self) -> None:
+                if self.path != '/config':
+                    self._respond(404, {'error': f'Unknown path: {self.path}'})
+                    return
+                try:
+                    body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                    changes = ConfigApiServer._parse_changes(body, server._controller.config)
+                    config = server._controller.update_config(**changes)
+                except ValueError as e:
+                    self._respond(400, {'error': str(e)})
+                    return
+                except Exception as e:
+                    # The switches have rejected the configuration; the controller has restored the previous one
+                    server._logger.exception("Cannot update the configuration")
+                    self._respond(500, {'error': str(e)})
+                    return
+                self._respond(200, dataclasses.asdict(config))
+
+            def _respond(self, status: int, body: Dict[str, Any]) -> None:
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                server._logger.debug(format % args)
+
+        return Handler
+
+    @staticmethod
+    def _parse_changes(body: Any, config: Config) -> Dict[str, Any]:
+        """Validates the requested changes and the resulting configuration; json.loads errors are also ValueErrors."""
+        if not isinstance(body, dict):
+            raise ValueError('The body must be a JSON object')
+        fields = {field.name: field for field in dataclasses.fields(Config)}
+        changes: Dict[str, Any] = dict()
+        for name, value in body.items():
+            if name not in fields:
+                raise ValueError(f'Unknown config field: {name}')
+            if fields[name].type not in (int, float):
+                raise ValueError(f'The config field {name} cannot be changed at runtime')
+            if not isinstance(value, (int, float)) or isinstance(value, bool):
+                raise ValueError(f'The value of {name} must be a number')
+            if fields[name].type is int and value != int(value):
+                raise ValueError(f'The value of {name} must be an integer')
+            changes[name] = fields[name].type(value)
+        dataclasses.replace(config, **changes).validate()
+        return changes
@@ -1,13 +1,24 @@
+import dataclasses
 import logging
-from typing import List, Dict
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Tuple, Optional, Any
 
+import networkx
 from p4utils.utils.sswitch_thrift_API import SimpleSwitchThriftAPI
 from p4utils.utils.topology import NetworkGraph
 
 from controller.data import Config
+from scenario.spec import MEASURED_SWITCH
+from tracing.tracer import span, traced
 
 
 class Controller:
+    # See TELEMETRY_CLONE_SESSION in types.p4
+    TELEMETRY_CLONE_SESSION = 1
+    TELEMETRY_QUEUE_RATE_PPS = 100_000
+
     def __init__(self, topology: NetworkGraph, config: Config) -> None:
         self._logger: logging.Logger = logging.getLogger(__name__)
         self._logger.info("Initializing controller...")
@@ -17,21 +28,152 @@ class Controller:
         self._switch_names: List[str] = sorted(self._topology.get_p4switches().keys())
         self._controllers: Dict[str, SimpleSwitchThriftAPI] = \
             {sw: SimpleSwitchThriftAPI(self._topology.get_thrift_port(sw)) for sw in self._switch_names}
+        # The VQ rates last pushed to each switch: [(cir, cburst), (pir, pburst)]
+        self._vq_rates: Dict[str, List[Tuple[float, int]]] = dict()
+        # The configuration may be changed at runtime, e.g. by the adaptive alpha loop and by the config API
+        self._lock = threading.RLock()
+
+    @property
+    def config(self) -> Config:
+        return self._config
+
+    @property
+    def switch_names(self) -> List[str]:
+        return self._switch_names
+
+    def update_config(self, **changes: Any) -> Config:
+        """
+        Changes the configuration at runtime; only the settings which have actually changed are pushed.
+        If a switch rejects the new configuration, the previous one is restored on every switch and the error is raised
+        (even if the restoring fails too).
+        """
+        with self._lock:
+            new_config = dataclasses.replace(self._config, **changes)
+            new_config.validate()
+            if new_config == self._config:
+                return self._config
+            self._logger.info(f"Updating configuration: {new_config}")
+            old_config, self._config = self._config, new_config
+            try:
+                self._push_config(old_config)
+            except Exception as error:
+                self._logger.exception(f"Restoring the previous configuration: {old_config}")
+                self._config = old_config
+                try:
+                    self._push_config(new_config)
+                except Exception as restore_error:
+                    # The switches might be left partly on each configuration: push all the VQ rates next time
+                    self._logger.exception("Failed to restore the previous configuration")
+                    self._vq_rates.clear()
+                    raise error from restore_error
+                raise
+            return self._config
+
+    def _push_config(self, previous_config: Config) -> None:
+        """Pushes the settings of the current configuration which differ from the previous one to the switches."""
+        for sw in self._switch_names:
+            if (previous_config.switch_queue_rate_pps, previous_config.switch_queue_depth_packets) != \
+                    (self._config.switch_queue_rate_pps, self._config.switch_queue_depth_packets):
+                self._set_switch_queue_limits(sw)
+            self._set_virtual_queue_limits(sw)  # Skipped if the VQ rates of the switch are unchanged
+
+    def read_register(self, sw: str, register_name: str) -> Optional[List[int]]:
+        """Reads a whole register array in one call; returns None if the running P4 program doesn't define it."""
+        with self._lock:
+            controller = self._controllers[sw]
+            if register_name not in controller.get_register_arrays():
+                return None
+            return controller.register_read(register_name)
+
+    def has_register(self, sw: str, register_name: str) -> bool:
+        """Whether the running P4 program defines the register array, e.g. to detect the variant of the program."""
+        with self._lock:
+            return register_name in self._controllers[sw].get_register_arrays()
+
+    def add_table_entry(self, sw: str, table: str, action: str, match_keys: List[str],
+                        action_params: List[str]) -> None:
+        with self._lock:
+            self._controllers[sw].table_add(table, action, match_keys, action_params)
+
+    def delete_table_entry(self, sw: str, table: str, match_keys: List[str]) -> None:
+        with self._lock:
+            self._controllers[sw].table_delete_match(table, match_keys)
+
+    def get_notifications_socket(self, sw: str) -> str:
+        """The nanomsg address where the switch publishes its notifications, e.g. digests."""
+        with self._lock:
+            return self._controllers[sw].client.bm_mgmt_get_info().notifications_socket
+
+    def acknowledge_digest(self, sw: str, context_id: int, list_id: int, buffer_id: int) -> None:
+        """The switch only sends the same digest again once it has been acknowledged."""
+        with self._lock:
+            self._controllers[sw].client.bm_learning_ack_buffer(context_id, list_id, buffer_id)
+
+    @traced('controller')
+    def initialize_switches(self, workers: int = 1) -> None:
+        """Initializes the switches, multiple switches at the same time if more than one worker is used."""
+        self._logger.info(f"Initializing switches using {workers} worker(s)...")
+        start = time.perf_counter()
+        with span('next hops', 'controller'):
+            next_hops = self._get_next_hops()
+        self._logger.info(f"Next hops have been computed in {time.perf_counter() - start:.3f} s")
+
+        # Each switch has its own Thrift client, therefore switches can be initialized independently of each other
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            switch_phase_durations = list(executor.map(lambda sw: self._initialize_switch(sw, next_hops[sw]),
+                                                       self._switch_names))
 
-    def initialize_switches(self) -> None:
-        self._logger.info("Initializing switches...")
-        for sw, controller in self._controllers.items():
-            self._logger.info(f"Initializing switch {sw}...")
-            controller.reset_state()
-            self._set_switch_queue_limits(sw)
-            self._set_virtual_queue_limits(sw)
-            self._fill_l3_tables(sw)
-        self._logger.info("Switches have been initialized")
+        for phase in switch_phase_durations[0].keys() if len(switch_phase_durations) > 0 else []:
+            durations = [phase_durations[phase] for phase_durations in switch_phase_durations]
+            self._logger.info(f"Phase '{phase}' took {sum(durations):.3f} s in total, at most {max(durations):.3f} s"
+                              f" per switch")
+        self._logger.info(f"Switches have been initialized in {time.perf_counter() - start:.3f} s")
+
+    def _initialize_switch(self, sw: str, next_hops: Dict[str, str]) -> Dict[str, float]:
+        """Initializes a single switch; returns how long each phase took in seconds."""
+        self._logger.info(f"Initializing switch {sw}...")
+        phases = [
+            ('reset state', lambda: self._reset_state(sw)),
+            ('switch queue limits', lambda: self._set_switch_queue_limits(sw)),
+            ('virtual queue limits', lambda: self._set_virtual_queue_limits(sw)),
+            ('L3 tables', lambda: self._fill_l3_tables(sw, next_hops)),
+            ('telemetry', lambda: self._set_telemetry_session(sw)),
+        ]
+        phase_durations: Dict[str, float] = dict()
+        for phase, action in phases:
+            start = time.perf_counter()
+            with span(phase, 'controller', switch=sw):
+                action()
+            phase_durations[phase] = time.perf_counter() - start
+            self._logger.debug(f"Switch {sw}: phase '{phase}' took {phase_durations[phase]:.3f} s")
+        return phase_durations
+
+    def _get_next_hops(self) -> Dict[str, Dict[str, str]]:
+        """
+        Determines the next hop from each switch towards each host: switch -> host -> next hop.
+        A single shortest path search is executed from each host, instead of one for each (switch, host) pair.
+        """
+        next_hops: Dict[str, Dict[str, str]] = {sw: dict() for sw in self._switch_names}
+        for dst in self._host_names:
+            # Paths from the host to each node; the reverse of a shortest path is also a shortest path
+            paths: Dict[str, List[str]] = networkx.single_source_dijkstra_path(self._topology, dst, weight='weight')
+            for sw in self._switch_names:
+                if sw in paths:
+                    path = list(reversed(paths[sw]))
+                    self._logger.debug(f'Registering first hop of path: {" -> ".join(path)}')
+                    next_hops[sw][dst] = path[1]
+        return next_hops
+
+    def _reset_state(self, sw: str) -> None:
+        self._controllers[sw].reset_state()
+        self._vq_rates.pop(sw, None)  # The meters have been reset too
 
     def _set_switch_queue_limits(self, sw: str) -> None:
         controller = self._controllers[sw]
         controller.set_queue_rate(self._config.switch_queue_rate_pps)
         controller.set_queue_depth(self._config.switch_queue_depth_packets)
+        # The switch-wide rate has overwritten the rate of the telemetry port too
+        self._set_telemetry_queue_rate(sw)
 
     def _set_virtual_queue_limits(self, sw: str) -> None:
         controller = self._controllers[sw]
@@ -44,22 +186,38 @@ class Controller:
             self._logger.info("Virtual queue not found in switch, skipping...")
             return
 
-        max_rate, max_depth = self._config.switch_queue_rate_pps, self._config.switch_queue_depth_packets
-        alpha_c, alpha_p = self._config.virtual_queue_committed_alpha, self._config.virtual_queue_peak_alpha
-        cir, cburst, pir, pburst = max_rate * alpha_c, max_depth * alpha_c, max_rate * alpha_p, max_depth * alpha_p
-        sec_to_micro = 1 / 1_000_000  # Documentation incorrectly states that rates are in unit/second
-        rates = [(cir * sec_to_micro, int(cburst)), (pir * sec_to_micro, int(pburst))]  # burst sizes must be integers
+        rates = self._config.get_virtual_queue_rates()
+        if self._vq_rates.get(sw) == rates:
+            self._logger.debug(f"VQ rates of switch {sw} are unchanged, skipping...")
+            return
         self._logger.debug(f"VQ rates: [(cir, cburst), (pir, pburst)] = {rates}")
         controller.meter_array_set_rates(meter_name, rates)
+        self._vq_rates[sw] = rates
 
-    def _fill_l3_tables(self, sw: str) -> None:
-        """Fill in the next hop from the switch towards each host. This could be improved by longest prefix matching."""
-        for dst in self._host_names:
-            path: List[str] = list(self._topology.get_shortest_paths_between_nodes(sw, dst)[0])
-            self._logger.debug(f'Registering first hop of path: {" -> ".join(path)}')
+    def _set_telemetry_session(self, sw: str) -> None:
+        """Clone the outgoing packets to the telemetry collector; see TELEMETRY in logic.p4."""
+        # The collector host is only connected to the measured switch, the other switches do not clone any packets
+        if self._config.telemetry_port is None or sw != MEASURED_SWITCH:
+            return
+        self._controllers[sw].mirroring_add(Controller.TELEMETRY_CLONE_SESSION, self._config.telemetry_port)
+        self._set_telemetry_queue_rate(sw)
+
+    def _set_telemetry_queue_rate(self, sw: str) -> None:
+        """The records of all the other ports are sent to the collector's port, it must not become the bottleneck."""
+        if self._config.telemetry_port is None or sw != MEASURED_SWITCH:
+            return
+        self._controllers[sw].set_queue_rate(Controller.TELEMETRY_QUEUE_RATE_PPS, self._config.telemetry_port)
 
+    def _fill_l3_tables(self, sw: str, next_hops: Dict[str, str]) -> None:
+        """Fill in the next hop from the switch towards each host. This could be improved by longest prefix matching."""
+        # Compute all entries first, then send them back-to-back: the Thrift API has no batch call
+        entries = []
+        for dst, next_hop in next_hops.items():
             dst_ip = self._topology.get_host_ip(dst)
-            egress_port = self._topology.node_to_node_port_num(path[0], path[1])
-            next_mac = self._topology.node_to_node_mac(path[1], path[0])
-            self._controllers[sw].table_add("l3_forward", "set_egress_port_and_mac",
-                                            [dst_ip], [str(egress_port), next_mac])
+            egress_port = self._topology.node_to_node_port_num(sw, next_hop)
+            next_mac = self._topology.node_to_node_mac(next_hop, sw)
+            entries.append(([dst_ip], [str(egress_port), next_mac]))
+
+        controller = self._controllers[sw]
+        for match_keys, action_params in entries:
+            controller.table_add("l3_forward", "set_egress_port_and_mac", match_keys, action_params)
@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from typing import List, Tuple, Optional
 
 
 @dataclass(frozen=True)
@@ -7,3 +8,22 @@ class Config:
     switch_queue_depth_packets: int
     virtual_queue_committed_alpha: float
     virtual_queue_peak_alpha: float
+    # The switch port of the telemetry collector host, if the switches have been compiled with TELEMETRY
+    telemetry_port: Optional[int] = None
+
+    def validate(self) -> None:
+        """Raises a ValueError if the configuration is invalid, e.g. the VQ meter rates would not be increasing."""
+        if self.switch_queue_rate_pps <= 0 or self.switch_queue_depth_packets <= 0:
+            raise ValueError('The switch queue rate and depth must be positive')
+        if not 0 < self.virtual_queue_committed_alpha <= 1 or not 0 < self.virtual_queue_peak_alpha <= 1:
+            raise ValueError('The VQ alphas must be in (0, 1]')
+        if self.virtual_queue_committed_alpha > self.virtual_queue_peak_alpha:
+            raise ValueError('The committed VQ alpha must not be greater than the peak VQ alpha')
+
+    def get_virtual_queue_rates(self) -> List[Tuple[float, int]]:
+        """The VQ meter rates in the format of the Thrift API: [(cir, cburst), (pir, pburst)]"""
+        max_rate, max_depth = self.switch_queue_rate_pps, self.switch_queue_depth_packets
+        alpha_c, alpha_p = self.virtual_queue_committed_alpha, self.virtual_queue_peak_alpha
+        cir, cburst, pir, pburst = max_rate * alpha_c, max_depth * alpha_c, max_rate * alpha_p, max_depth * alpha_p
+        sec_to_micro = 1 / 1_000_000  # Documentation incorrectly states that rates are in unit/second
+        return [(cir * sec_to_micro, int(cburst)), (pir * sec_to_micro, int(pburst))]  # burst sizes must be integers
@@ -0,0 +1,131 @@
+import ipaddress
+import logging
+import struct
+import threading
+import time
+from typing import Dict, List, Tuple, Set, Optional
+
+import nnpy
+
+from controller.controller import Controller
+from p4build.constants import VQ_INDEX_ASSIGNED_COUNT
+from tracing.tracer import traced
+
+# (source IP, destination IP, IP protocol, source port, destination port)
+FlowKey = Tuple[str, str, int, int, int]
+
+
+class FlowVqIndexer:
+    """
+    Assigns the VQs of the indexed VQ variant (see VARIANT_INDEXED_VQ in logic.p4) to the flows of a switch:
+    - The switch sends a digest for each packet of a flow without an assigned VQ; such flows share the hashed VQs
+    - A new flow gets a free VQ via the flow_vq_index table if there is one; otherwise it keeps sharing the hashed VQs
+    - The VQ of a flow is freed if it has not been used for the idle timeout (see vq_index_last_seen)
+    """
+
+    TABLE = 'MyIngress.flow_vq_index'
+    ACTION = 'MyIngress.set_vq_index'
+    LAST_SEEN_REGISTER = 'MyIngress.vq_index_last_seen'
+
+    ASSIGNED_VQ_COUNT = VQ_INDEX_ASSIGNED_COUNT
+
+    # The header of bmv2's digest messages, followed by the samples: see flow_digest_t in types.p4
+    _DIGEST_TOPIC = b'LEA|'
+    _DIGEST_HEADER = struct.Struct('<4sQiiQi')  # topic, switch ID, context ID, list ID, buffer ID, sample count
+    _FLOW_DIGEST = struct.Struct('!IIBHH')
+
+    def __init__(self, controller: Controller, sw: str, idle_timeout_seconds: float) -> None:
+        self._logger: logging.Logger = logging.getLogger(__name__)
+        self._controller: Controller = controller
+        self._sw: str = sw
+        self._idle_timeout_seconds: float = idle_timeout_seconds
+        self._flow_to_index: Dict[FlowKey, int] = dict()
+        self._free_indexes: List[int] = list(reversed(range(FlowVqIndexer.ASSIGNED_VQ_COUNT)))  # Assign 0 first
+        # The value of vq_index_last_seen at the last poll, and when it has last changed (controller time)
+        self._index_last_seen: Dict[int, int] = dict()
+        self._index_last_active: Dict[int, float] = dict()
+        # The flows which could not get a VQ: they share the hashed VQs with each other (i.e. they collide)
+        self._unassigned_flows: Set[FlowKey] = set()
+        self._evicted_flow_count: int = 0
+        # The digests and the evictions are handled by different threads
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def is_supported(controller: Controller, sw: str) -> bool:
+        return controller.has_register(sw, FlowVqIndexer.LAST_SEEN_REGISTER)
+
+    def start(self) -> None:
+        """Handles the digests and evicts the idle flows in background threads."""
+        self._logger.info(f"Assigning the VQs of switch {self._sw} to flows, idle timeout:"
+                          f" {self._idle_timeout_seconds} s")
+        threading.Thread(target=self._receive_digests, name=f'digests-{self._sw}', daemon=True).start()
+        threading.Thread(target=self._evict_idle_flows_periodically, name=f'eviction-{self._sw}', daemon=True).start()
+
+    def _receive_digests(self) -> None:
+        socket = nnpy.Socket(nnpy.AF_SP, nnpy.SUB)
+        socket.connect(self._controller.get_notifications_socket(self._sw))
+        socket.setsockopt(nnpy.SUB, nnpy.SUB_SUBSCRIBE, '')
+        while True:
+            self.handle_digest_message(socket.recv())
+
+    @traced('controller')
+    def handle_digest_message(self, message: bytes) -> None:
+        if message[:len(FlowVqIndexer._DIGEST_TOPIC)] != FlowVqIndexer._DIGEST_TOPIC:
+            return  # Not a digest, e.g. a port status notification
+        _, _, context_id, list_id, buffer_id, sample_count = FlowVqIndexer._DIGEST_HEADER.unpack_from(message)
+        for i in range(sample_count):
+            offset = FlowVqIndexer._DIGEST_HEADER.size + i * FlowVqIndexer._FLOW_DIGEST.size
+            src_addr, dst_addr, protocol, src_port, dst_port = FlowVqIndexer._FLOW_DIGEST.unpack_from(message, offset)
+            self._assign((str(ipaddress.IPv4Address(src_addr)), str(ipaddress.IPv4Address(dst_addr)), protocol,
+                          src_port, dst_port))
+        self._controller.acknowledge_digest(self._sw, context_id, list_id, buffer_id)
+
+    def _assign(self, flow: FlowKey) -> None:
+        with self._lock:
+            # The digests of the packets which have arrived before the VQ was assigned
+            if flow in self._flow_to_index:
+                return
+            if len(self._free_indexes) == 0:
+                if flow not in self._unassigned_flows:
+                    self._logger.warning(f"Switch {self._sw}: no free VQ for flow {flow}, it shares the hashed VQs")
+                    self._unassigned_flows.add(flow)
+                return
+
+            index = self._free_indexes.pop()
+            self._controller.add_table_entry(self._sw, FlowVqIndexer.TABLE, FlowVqIndexer.ACTION,
+                                             FlowVqIndexer._get_match_keys(flow), [str(index)])
+            self._flow_to_index[flow] = index
+            self._index_last_seen.pop(index, None)
+            self._index_last_active[index] = time.monotonic()
+            self._unassigned_flows.discard(flow)
+            self._logger.debug(f"Switch {self._sw}: flow {flow} has been assigned VQ {index}")
+
+    def _evict_idle_flows_periodically(self) -> None:
+        while True:
+            time.sleep(self._idle_timeout_seconds / 2)
+            self.evict_idle_flows()
+
+    @traced('controller')
+    def evict_idle_flows(self) -> None:
+        last_seen: Optional[List[int]] = self._controller.read_register(self._sw, FlowVqIndexer.LAST_SEEN_REGISTER)
+        if last_seen is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            for flow, index in list(self._flow_to_index.items()):
+                if self._index_last_seen.get(index) != last_seen[index]:
+                    self._index_last_seen[index] = last_seen[index]
+                    self._index_last_active[index] = now
+                elif now - self._index_last_active[index] >= self._idle_timeout_seconds:
+                    self._controller.delete_table_entry(self._sw, FlowVqIndexer.TABLE,
+                                                        FlowVqIndexer._get_match_keys(flow))
+                    del self._flow_to_index[flow]
+                    self._free_indexes.append(index)
+                    self._evicted_flow_count += 1
+            self._logger.info(f"Switch {self._sw}: {len(self._flow_to_index)} flows with an assigned VQ,"
+                              f" {len(self._unassigned_flows)} flows sharing the hashed VQs,"
+                              f" {self._evicted_flow_count} idle flows evicted so far")
+
+    @staticmethod
+    def _get_match_keys(flow: FlowKey) -> List[str]:
+        return [str(key) for key in flow]
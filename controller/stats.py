@@ -0,0 +1,85 @@
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+from controller.controller import Controller
+from tracing.tracer import traced
+
+# The meter colors counted by the switch, in this order: see vq_color_packets in logic.p4
+METER_COLOR_NAMES: List[str] = ['green', 'yellow', 'red']
+
+# The records of the VQ statistics file: the cumulative counters of a VQ at a point in time
+# See the reader in plotter/vqstats.py, it must be kept in sync
+VQ_STATS_RECORD_DTYPE = np.dtype(
+    [('time_us', '<i8'), ('switch_index', '<u2'), ('vq_id', '<u4')]
+    + [(f'{color}_packets', '<u8') for color in METER_COLOR_NAMES]
+    + [(f'{color}_bytes', '<u8') for color in METER_COLOR_NAMES]
+)
+
+
+class VqStatsPoller:
+    """
+    Periodically reads the per-VQ color counters of the switches in bulk (one Thrift call per register array),
+    and appends a record for each VQ whose counters have changed since the last poll to a binary file.
+    The switch index of the records is the index of the switch in the controller's (sorted) switch names.
+    """
+
+    PACKETS_REGISTER = "MyIngress.vq_color_packets"
+    BYTES_REGISTER = "MyIngress.vq_color_bytes"
+
+    def __init__(self, controller: Controller, interval_seconds: float, output_path: Path) -> None:
+        self._logger: logging.Logger = logging.getLogger(__name__)
+        self._controller: Controller = controller
+        self._interval_seconds: float = interval_seconds
+        self._output_path: Path = output_path
+        # The counters at the last poll, shape: (2 * colors, VQs), packets first
+        self._last_counters: Dict[str, np.ndarray] = dict()
+
+    def start(self) -> None:
+        """Polls the switches in a background thread."""
+        self._logger.info(f"Polling the VQ statistics every {self._interval_seconds} s into {self._output_path}")
+        threading.Thread(target=self._run, name='vq-stats', daemon=True).start()
+
+    def _run(self) -> None:
+        self._output_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self._output_path, 'ab') as f:
+            while True:
+                start = time.perf_counter()
+                records = self.poll()
+                records.tofile(f)
+                f.flush()
+                duration = time.perf_counter() - start
+                self._logger.debug(f"Polled {len(records)} changed VQs in {duration:.3f} s")
+                time.sleep(max(self._interval_seconds - duration, 0))
+
+    @traced('controller')
+    def poll(self) -> np.ndarray:
+        """Reads the counters of each switch; returns the records of the VQs which have changed."""
+        time_us = time.time_ns() // 1_000
+        all_records = []
+        for switch_index, sw in enumerate(self._controller.switch_names):
+            packets = self._controller.read_register(sw, VqStatsPoller.PACKETS_REGISTER)
+            byte_counts = self._controller.read_register(sw, VqStatsPoller.BYTES_REGISTER)
+            if packets is None or byte_counts is None:
+                continue  # The running P4 program has no VQs
+            counters = np.concatenate([np.array(packets, dtype=np.uint64).reshape(len(METER_COLOR_NAMES), -1),
+                                       np.array(byte_counts, dtype=np.uint64).reshape(len(METER_COLOR_NAMES), -1)])
+            last_counters = self._last_counters.get(sw, np.zeros_like(counters))
+            vq_ids = np.flatnonzero((counters != last_counters).any(axis=0))
+            self._last_counters[sw] = counters
+
+            records = np.zeros(len(vq_ids), dtype=VQ_STATS_RECORD_DTYPE)
+            records['time_us'] = time_us
+            records['switch_index'] = switch_index
+            records['vq_id'] = vq_ids
+            for color_index, color in enumerate(METER_COLOR_NAMES):
+                records[f'{color}_packets'] = counters[color_index, vq_ids]
+                records[f'{color}_bytes'] = counters[len(METER_COLOR_NAMES) + color_index, vq_ids]
+            all_records.append(records)
+        if len(all_records) == 0:
+            return np.zeros(0, dtype=VQ_STATS_RECORD_DTYPE)
+        return np.concatenate(all_records)
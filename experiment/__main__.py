@@ -0,0 +1,46 @@
+import os
+from argparse import ArgumentParser
+from pathlib import Path
+
+from experiment.runner import load_sweep, ExperimentRunner
+from experiment.trials import StoppingRule
+
+
+def main() -> None:
+    parser = ArgumentParser(description='Executes network.py for each run of a sweep, skipping finished runs')
+    parser.add_argument('--sweep', type=Path, default=Path('experiment/sweeps/default.json'),
+                        help='The sweep definition: variants, alpha pairs and traffic mixes')
+    parser.add_argument('--measure-dir', type=Path, default=Path('work/measure'),
+                        help='Where to put the logs of the finished runs, one directory per run')
+    parser.add_argument('--work-dir', type=Path, default=Path('work/runs'),
+                        help='Where to put the files of the ongoing runs, one directory per run')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='How many runs to execute in parallel; parallel runs use isolated network namespaces'
+                             ' (0: CPU count)')
+    parser.add_argument('--trials', type=int, default=1,
+                        help='The maximum number of trials (repeated runs) of each run: NAME.1, NAME.2, ...')
+    parser.add_argument('--min-trials', type=int, default=3,
+                        help='How many trials of each run to execute before checking the confidence intervals')
+    parser.add_argument('--target-ci', type=float,
+                        help='Stop the trials of a run once the 95%% confidence interval of each statistic (queue delay'
+                             ' and flow size percentiles of each flow type) is within this fraction of its mean,'
+                             ' e.g. 0.05 (default: always execute the maximum number of trials)')
+    args = parser.parse_args()
+
+    # The confidence intervals need at least 2 trials: a single trial never converges
+    rule = StoppingRule(min_trials=min(args.min_trials, args.trials), max_trials=args.trials,
+                        relative_ci=args.target_ci)
+
+    runs = load_sweep(args.sweep)
+    print(f'The sweep contains {len(runs)} runs: {", ".join(run.name for run in runs)}')
+
+    jobs: int = args.jobs if args.jobs > 0 else os.cpu_count()
+    runner = ExperimentRunner(args.measure_dir, args.work_dir, isolate=jobs > 1)
+    failed_runs = runner.run_all(runs, jobs, rule)
+    if len(failed_runs) > 0:
+        raise RuntimeError(f'Failed runs: {", ".join(run.name for run in failed_runs)}')
+    print('All runs have finished')
+
+
+if __name__ == '__main__':
+    main()
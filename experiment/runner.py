@@ -0,0 +1,235 @@
+import dataclasses
+import json
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import List, Optional, Dict, Union, Any, Tuple, Iterator
+
+from experiment.trials import StoppingRule, TrialAggregator
+
+# The directory of network.py
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+# The measurement names start with these prefixes, e.g. pfvq-05-10
+VARIANT_PREFIXES: Dict[str, str] = {'no-vq': 'no-vq', 'per-port-vq': 'ppvq', 'per-flow-vq': 'pfvq',
+                                    'indexed-vq': 'ivq'}
+
+
+@dataclass(frozen=True)
+class Run:
+    """A single network.py execution: one measurement."""
+    name: str
+    variant: str
+    committed_alpha: Optional[float]
+    peak_alpha: Optional[float]
+    flows: Optional[str]  # The traffic mix in the format of network.py's --flows argument
+    scenario: Optional[str] = None  # Or a scenario spec (topology and flow classes), see scenario/specs
+
+    def get_trial(self, trial: int, rule: StoppingRule) -> 'Run':
+        """The run of a trial (from 1): NAME.1, NAME.2, ... (see the plotter), or just NAME if there is only one."""
+        return self if rule.max_trials == 1 else dataclasses.replace(self, name=f'{self.name}.{trial}')
+
+    def get_network_args(self) -> List[str]:
+        args = ['--variant', self.variant]
+        args += ['--scenario', self.scenario] if self.scenario is not None else ['--flows', self.flows]
+        if self.committed_alpha is not None:
+            args += ['--vq-committed-alpha', str(self.committed_alpha), '--vq-peak-alpha', str(self.peak_alpha)]
+        return args
+
+
+def load_sweep(sweep_path: Path) -> List[Run]:
+    """
+    Expands a sweep file into runs: each sweep entry is a variant, its alpha pairs and (optionally) its traffic mixes.
+    A traffic mix is either a --flows argument, or a scenario spec, e.g. {"scenario": "scenario/specs/incast.json"}.
+    See sweeps/default.json, which is equivalent to the original measure.sh.
+    """
+    with open(sweep_path, 'r') as f:
+        sweep = json.load(f)
+
+    traffic_mixes: Dict[str, Union[str, Dict[str, Any]]] = sweep['traffic_mixes']
+    runs: List[Run] = []
+    for entry in sweep['sweeps']:
+        variant: str = entry['variant']
+        if variant not in VARIANT_PREFIXES:
+            raise ValueError(f'Unknown variant: {variant}')
+        alpha_pairs = entry.get('alpha_pairs', [[None, None]])
+        mix_names: List[str] = entry.get('traffic_mixes', list(traffic_mixes.keys()))
+        for committed_alpha, peak_alpha in alpha_pairs:
+            for mix_name in mix_names:
+                name = VARIANT_PREFIXES[variant]
+                if committed_alpha is not None:
+                    name += f'-{round(committed_alpha * 100):02d}-{round(peak_alpha * 100):02d}'
+                if len(traffic_mixes) > 1:
+                    name += f'-{mix_name}'
+                traffic_mix = traffic_mixes[mix_name]
+                if isinstance(traffic_mix, dict):
+                    runs.append(Run(name, variant, committed_alpha, peak_alpha, None, traffic_mix['scenario']))
+                else:
+                    runs.append(Run(name, variant, committed_alpha, peak_alpha, traffic_mix))
+
+    names = [run.name for run in runs]
+    if len(set(names)) != len(names):
+        raise ValueError('The sweep contains duplicate runs')
+    return runs
+
+
+class ExperimentRunner:
+    """
+    Executes runs, possibly in parallel, each in its own work directory.
+    Parallel runs are also isolated in their own network and mount namespaces (a private /tmp): Mininet interfaces,
+    the Thrift ports and the bmv2 IPC sockets would collide otherwise.
+    """
+
+    # Written into the measurement directory when a run has finished successfully
+    RESULT_FILE_NAME = 'run.json'
+    # Written into the measure directory: the statistics of the trials of each configuration
+    TRIALS_FILE_NAME = 'trials.json'
+
+    def __init__(self, measure_dir: Path, work_dir: Path, isolate: bool) -> None:
+        self._measure_dir: Path = measure_dir
+        self._work_dir: Path = work_dir
+        self._isolate: bool = isolate
+
+    def run_all(self, runs: List[Run], jobs: int, rule: StoppingRule = StoppingRule()) -> List[Run]:
+        """
+        Executes the trials of each run (i.e. configuration) which have no results yet; returns the failed trials.
+        At most `jobs` trials are executed at a time: the first trials of all configurations are preferred, the idle
+        workers execute additional trials of the configurations whose statistics have not converged yet.
+        """
+        configurations = [_Configuration(run, TrialAggregator(run.name)) for run in runs]
+        for configuration in configurations:
+            while configuration.next_trial <= rule.max_trials and self.has_result(configuration.get_next_run(rule)):
+                print(f'Skipping {configuration.get_next_run(rule).name}: it already has results')
+                self._add_result(configuration, configuration.get_next_run(rule), rule)
+                configuration.next_trial += 1
+
+        failed_runs: List[Run] = []
+        futures: Dict[Future, Tuple[_Configuration, Run]] = dict()
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            while True:
+                for configuration in self._get_next_trials(configurations, jobs - len(futures), rule):
+                    run = configuration.get_next_run(rule)
+                    configuration.next_trial += 1
+                    configuration.running_count += 1
+                    futures[executor.submit(self.run, run)] = (configuration, run)
+                if len(futures) == 0:
+                    break
+
+                # Decide about the next trials as soon as any trial has finished
+                done, _ = wait(futures.keys(), return_when=FIRST_COMPLETED)
+                for future in done:
+                    configuration, run = futures.pop(future)
+                    configuration.running_count -= 1
+                    if future.result():
+                        self._add_result(configuration, run, rule)
+                    else:
+                        failed_runs.append(run)
+                        configuration.stopping_reason = 'failed'
+
+        if rule.max_trials > 1:
+            self._write_trials(configurations)
+        return failed_runs
+
+    @staticmethod
+    def _get_next_trials(configurations: List['_Configuration'], free_workers: int,
+                         rule: StoppingRule) -> Iterator['_Configuration']:
+        """
+        Yields the configuration of each trial to start now (the caller starts it before the next one is chosen).
+        The first min_trials of each configuration come first; then the configurations which have not converged with
+        their finished trials get one more trial each, preferring those with the fewest running trials.
+        """
+        for configuration in configurations:
+            while free_workers > 0 and configuration.can_start_trial(rule) \
+                    and configuration.next_trial <= rule.min_trials:
+                free_workers -= 1
+                yield configuration
+        while free_workers > 0:
+            candidates = [configuration for configuration in configurations if configuration.can_start_trial(rule)
+                          and configuration.aggregator.trial_count >= rule.min_trials]
+            if len(candidates) == 0:
+                return
+            free_workers -= 1
+            yield min(candidates, key=lambda configuration: configuration.running_count)
+
+    def _add_result(self, configuration: '_Configuration', run: Run, rule: StoppingRule) -> None:
+        """Merges the statistics of a finished trial, then stops the configuration if they have converged."""
+        if rule.max_trials == 1:
+            return  # A single trial has no confidence intervals
+        try:
+            configuration.aggregator.add(self._measure_dir / run.name)
+        except (OSError, ValueError, KeyError) as e:
+            print(f'WARNING: Cannot summarize the results of {run.name}: {e}')
+            return
+        trial_count = configuration.aggregator.trial_count
+        if configuration.stopping_reason is None and trial_count >= rule.min_trials \
+                and rule.relative_ci is not None and configuration.aggregator.is_converged(rule.relative_ci):
+            configuration.stopping_reason = 'converged'
+            print(f'The confidence intervals of {configuration.run.name} are within {rule.relative_ci:.0%} of the means'
+                  f' after {trial_count} trials: no more trials are started')
+
+    def _write_trials(self, configurations: List['_Configuration']) -> None:
+        trials: Dict[str, Any] = dict()
+        for configuration in configurations:
+            stopping_reason = configuration.stopping_reason or 'max_trials'
+            trials[configuration.run.name] = configuration.aggregator.to_dict(stopping_reason)
+            print(f'{configuration.run.name}: {configuration.aggregator.trial_count} trials ({stopping_reason})')
+            for name, interval in configuration.aggregator.get_confidence_intervals().items():
+                print(f'  {name}: {interval.mean:.3f} +- {interval.half_width:.3f} (95% CI)')
+
+        trials_path = self._measure_dir / ExperimentRunner.TRIALS_FILE_NAME
+        trials_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(trials_path, 'w') as f:
+            json.dump(trials, f, indent=2)
+        print(f'The statistics of the trials have been written to {trials_path}')
+
+    def has_result(self, run: Run) -> bool:
+        return (self._measure_dir / run.name / ExperimentRunner.RESULT_FILE_NAME).exists()
+
+    def run(self, run: Run) -> bool:
+        print(f'Running {run.name}...')
+        run_work_dir = (self._work_dir / run.name).resolve()
+        log_dir = run_work_dir / 'log'
+        shutil.rmtree(log_dir, ignore_errors=True)  # Leftovers of an interrupted run
+        log_dir.mkdir(parents=True)
+
+        command = [sys.executable, 'network.py', *run.get_network_args(), '--work-dir', str(run_work_dir)]
+        if self._isolate:
+            command = ['unshare', '--net', '--mount', '--', 'sh', '-c',
+                       'mount -t tmpfs tmpfs /tmp && ip link set lo up && exec "$0" "$@"', *command]
+
+        start = time.time()
+        with open(log_dir / 'network.log', 'a') as network_log:
+            process = subprocess.run(command, cwd=PROJECT_DIR, stdout=network_log, stderr=subprocess.STDOUT)
+        duration = time.time() - start
+        if process.returncode != 0:
+            print(f'Run {run.name} has failed with exit code {process.returncode}, see {log_dir / "network.log"}')
+            return False
+
+        result_dir = self._measure_dir / run.name
+        shutil.rmtree(result_dir, ignore_errors=True)
+        result_dir.parent.mkdir(parents=True, exist_ok=True)
+        shutil.move(str(log_dir), str(result_dir))
+        with open(result_dir / ExperimentRunner.RESULT_FILE_NAME, 'w') as f:
+            json.dump({**asdict(run), 'duration_seconds': duration}, f, indent=2)
+        print(f'Run {run.name} has finished in {duration:.0f} s')
+        return True
+
+
+@dataclass
+class _Configuration:
+    """The state of the trials of a run of the sweep."""
+    run: Run
+    aggregator: TrialAggregator
+    next_trial: int = 1
+    running_count: int = 0
+    stopping_reason: Optional[str] = None  # Set once no more trials should be started, e.g. 'converged'
+
+    def get_next_run(self, rule: StoppingRule) -> Run:
+        return self.run.get_trial(self.next_trial, rule)
+
+    def can_start_trial(self, rule: StoppingRule) -> bool:
+        return self.stopping_reason is None and self.next_trial <= rule.max_trials
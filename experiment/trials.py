@@ -0,0 +1,101 @@
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Dict, List, Any
+
+import numpy as np
+
+from plotter.loader import load_summary, SWITCH_LOG_FILE_NAME, TELEMETRY_FILE_NAME
+from plotter.stats import mean_confidence_interval_95
+from plotter.summary import MeasurementSummary
+
+# The statistics of each flow type whose confidence intervals decide when a configuration has enough trials
+DELAY_PERCENTILES: List[float] = [50, 99]
+FLOW_LENGTH_PERCENTILES: List[float] = [50, 90]
+
+
+@dataclass(frozen=True)
+class StoppingRule:
+    """
+    How many trials (repeated runs) of each configuration to execute: at least min_trials, then one more at a time
+    until each 95% confidence interval is at most relative_ci times its mean (never if None), but at most max_trials.
+    """
+    min_trials: int = 1
+    max_trials: int = 1
+    relative_ci: Optional[float] = None
+
+    def __post_init__(self) -> None:
+        if not 1 <= self.min_trials <= self.max_trials:
+            raise ValueError('The minimum number of trials must be between 1 and the maximum number of trials')
+
+
+@dataclass(frozen=True)
+class ConfidenceInterval:
+    mean: float
+    half_width: float  # Of the 95% confidence interval, NaN if fewer than 2 trials have values
+    trial_count: int
+
+    def is_within(self, relative_ci: float) -> bool:
+        return bool(self.half_width <= relative_ci * abs(self.mean))
+
+
+class TrialAggregator:
+    """
+    Merges the summaries of the finished trials of a configuration one at a time, as they finish (in any order).
+    The summary of each trial is stored next to its log (see SummaryStore), therefore the plotter does not recompute it.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name: str = name
+        self.summary: Optional[MeasurementSummary] = None
+
+    @property
+    def trial_count(self) -> int:
+        return self.summary.run_count if self.summary is not None else 0
+
+    def add(self, measurement_dir: Path) -> None:
+        log_path = measurement_dir / SWITCH_LOG_FILE_NAME
+        if not log_path.exists():
+            log_path = measurement_dir / TELEMETRY_FILE_NAME
+        summary = load_summary(log_path, streaming=False)
+        self.summary = summary if self.summary is None else MeasurementSummary.merge([self.summary, summary])
+
+    def get_confidence_intervals(self) -> Dict[str, ConfidenceInterval]:
+        """The mean of each statistic over the trials, e.g. of the 99th queue delay percentile of the small flows."""
+        intervals: Dict[str, ConfidenceInterval] = dict()
+        if self.summary is None:
+            return intervals
+        for flow_type in self.summary.get_flow_types():
+            delays = self.summary.get_delay_percentiles(flow_type, DELAY_PERCENTILES) / 1_000  # Milliseconds
+            flow_lengths = self.summary.get_flow_length_percentiles(flow_type, FLOW_LENGTH_PERCENTILES) / 1_000  # KB
+            for percentile_index, percentile in enumerate(DELAY_PERCENTILES):
+                intervals[f'{flow_type.name} queue delay p{percentile:g} [ms]'] = \
+                    TrialAggregator._get_interval(delays[:, percentile_index])
+            for percentile_index, percentile in enumerate(FLOW_LENGTH_PERCENTILES):
+                intervals[f'{flow_type.name} flow size p{percentile:g} [KB]'] = \
+                    TrialAggregator._get_interval(flow_lengths[:, percentile_index])
+        return intervals
+
+    def is_converged(self, relative_ci: float) -> bool:
+        """Whether each confidence interval is tight enough (the statistics without values are ignored)."""
+        intervals = [interval for interval in self.get_confidence_intervals().values() if interval.trial_count > 0]
+        return len(intervals) > 0 and all(interval.is_within(relative_ci) for interval in intervals)
+
+    def to_dict(self, stopping_reason: str) -> Dict[str, Any]:
+        return {
+            'trials': self.trial_count,
+            'stopping_reason': stopping_reason,
+            # NaN (e.g. the half-width of a single trial) is not valid JSON
+            'statistics': {name: {'mean': None if np.isnan(interval.mean) else interval.mean,
+                                  'ci95_half_width': None if np.isnan(interval.half_width) else interval.half_width,
+                                  'trials': interval.trial_count}
+                           for name, interval in self.get_confidence_intervals().items()},
+        }
+
+    @staticmethod
+    def _get_interval(values: np.ndarray) -> ConfidenceInterval:
+        """The trials without values (e.g. without flows of the flow type) are left out."""
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return ConfidenceInterval(np.nan, np.nan, 0)
+        mean, half_width = mean_confidence_interval_95(values)
+        return ConfidenceInterval(float(mean), float(half_width), len(values))
@@ -1,13 +1,18 @@
 import os
 import time
 from argparse import ArgumentParser
+from pathlib import Path
 from typing import List, Tuple, Dict
 
 from p4utils.mininetlib.network_API import NetworkAPI
-from p4utils.utils.compiler import P4C
+
+from p4build.cache import CachedP4C, get_compiler_options, get_build_dir_name
+from p4build.constants import VARIANTS
+from scenario.spec import ScenarioSpec, IperfPair, MEASURED_SWITCH
+from tracing.tracer import span, enable_tracing
 
 parser = ArgumentParser()
-parser.add_argument("--variant", choices=['no-vq', 'per-port-vq', 'per-flow-vq'], default='per-flow-vq',
+parser.add_argument("--variant", choices=VARIANTS, default='per-flow-vq',
                     help="Which P4 source code variant to use")
 parser.add_argument("--cli", action="store_true",
                     help="Start the Mininet CLI after setting up the network")
@@ -15,61 +20,114 @@ parser.add_argument("--vq-committed-alpha", type=float, default=0.2,
                     help="The virtual queues' committed rate to use as a fraction of the switch's maximum rate")
 parser.add_argument("--vq-peak-alpha", type=float, default=0.3,
                     help="The virtual queues' peak rate to use as a fraction of the switch's maximum rate")
+parser.add_argument("--vq-adaptive-interval", type=float,
+                    help="Let the controller adapt the alphas to the switch state every this many seconds")
+parser.add_argument("--vq-stats-interval", type=float,
+                    help="Let the controller poll the per-VQ color counters every this many seconds (log/vq_stats.bin)")
+parser.add_argument("--controller-init-workers", type=int,
+                    help="How many switches the controller initializes concurrently (default: all of them)")
+parser.add_argument("--controller-api-port", type=int,
+                    help="Let the controller serve an HTTP API on this port to change its configuration at runtime")
+parser.add_argument("--work-dir", default='./work',
+                    help="Where to put the generated files; concurrent runs must use different directories")
+parser.add_argument("--flows", default='400K:10,2M:3',
+                    help="The traffic mix: comma-separated rate:count pairs, one for each flow type (i.e. client host)")
+parser.add_argument("--scenario", type=Path,
+                    help="A JSON spec of the topology and of the flow classes (see scenario/specs), instead of --flows")
+parser.add_argument("--telemetry", action="store_true",
+                    help="Stream binary telemetry records to a collector host instead of logging each packet verbosely")
+parser.add_argument("--profile", action="store_true",
+                    help="Record how long the setup, the controller and the measurement take into log/trace.json"
+                         " (Chrome trace format)")
+parser.add_argument("--p4-cache-dir", default='./work/p4cache',
+                    help="Where to cache the compiled P4 programs; shared by the runs, see python -m p4build")
 args = parser.parse_args()
+work_dir: str = args.work_dir
+
+# The controller appends its spans to the same trace file
+trace_file = f'{work_dir}/log/trace.json'
+if args.profile:
+    enable_tracing(Path(trace_file), 'network', truncate=True)
+
+# By default: a single switch, one client host for each flow type of --flows, and 2 server hosts
+scenario = ScenarioSpec.load(args.scenario) if args.scenario else ScenarioSpec.of_flows(args.flows)
+layout = scenario.get_layout()
 
 net = NetworkAPI()
 
 # Topology definition
-net.addP4Switch('s1')
-for i in [1, 2, 3, 4]:
-    net.addHost(f'h{i}')
-    net.addLink('s1', f'h{i}')
+for switch in layout.switches:
+    net.addP4Switch(switch)
+for host in layout.hosts:
+    net.addHost(host)
+for node1, node2 in layout.links:  # The order of the links determines the switch ports
+    net.addLink(node1, node2)
+if args.telemetry:
+    # The collector host: the measured switch clones a telemetry record of each packet to this port
+    telemetry_host, telemetry_port = f'h{len(layout.hosts) + 1}', layout.get_next_port(MEASURED_SWITCH)
+    net.addHost(telemetry_host)
+    net.addLink(MEASURED_SWITCH, telemetry_host)
 net.setDelayAll(2)  # 2 ms link delay
 
 # Host configuration
 net.l3()
 
 # Switch configuration
-compiler_dir = f'./work/switch_{args.variant}'
+# The program is only compiled if its sources or options have changed since it has been cached
+compiler_dir = f'{work_dir}/{get_build_dir_name(args.variant, args.telemetry)}'
 os.makedirs(compiler_dir, exist_ok=True)
-net.setCompiler(P4C, outdir=compiler_dir, opts=f'--target bmv2 --arch v1model --std p4-16'
-                                               f' -D VARIANT_{args.variant.upper().replace("-", "_")}=1')
+net.setCompiler(CachedP4C, outdir=compiler_dir, opts=get_compiler_options(args.variant, args.telemetry),
+                cache_dir=Path(args.p4_cache_dir))
 net.setP4SourceAll(f'./switch/switch.p4')
 
 # Initialize the switches via the controller
-net.setTopologyFile(f'./work/topology.json')
+net.setTopologyFile(f'{work_dir}/topology.json')
 os.makedirs(os.path.dirname(net.topoFile), exist_ok=True)
 # The topology file will be created on network startup, before the controller is executed
-controller_out_file = './work/log/controller.log'
+controller_out_file = f'{work_dir}/log/controller.log'
 net.execScript(f'python3 -m controller --topology-path {net.topoFile}'
                f' --queue-rate-pps 500'  # 500 pps * 1500 bytes/packet = 6.0 Mbps
                f' --queue-depth-packets 30'  # 1000 ms / 500 pps * 30 packets = 60.0 ms
                f' --vq-committed-alpha {args.vq_committed_alpha}'
-               f' --vq-peak-alpha {args.vq_peak_alpha}',
+               f' --vq-peak-alpha {args.vq_peak_alpha}'
+               f' --init-workers {args.controller_init_workers or len(layout.switches)}'
+               + (f' --adaptive-interval {args.vq_adaptive_interval}' if args.vq_adaptive_interval else '')
+               + (f' --api-port {args.controller_api_port}' if args.controller_api_port else '')
+               + (f' --vq-stats-interval {args.vq_stats_interval} --vq-stats-output {work_dir}/log/vq_stats.bin'
+                  if args.vq_stats_interval else '')
+               + (f' --telemetry-port {telemetry_port}' if args.telemetry else '')
+               + (f' --profile {trace_file}' if args.profile else ''),
                out_file=controller_out_file)
 os.makedirs(os.path.dirname(controller_out_file), exist_ok=True)
 
 # Logging, capturing configuration
 net.setLogLevel('info')
-net.enableLogAll(log_dir='./work/log')
+net.enableLogAll(log_dir=f'{work_dir}/log')
 net.disablePcapDumpAll()
-# net.enablePcapDumpAll(pcap_dir='./work/pcap')
+# net.enablePcapDumpAll(pcap_dir=f'{work_dir}/pcap')
 
 # Start Mininet interactively
 if args.cli:
     net.enableCli()
-    net.startNetwork()
+    with span('start network', 'network'):
+        net.startNetwork()
     exit(0)
 
 # Traffic constants
 port_min = 5201  # The first port to use for iperf3
-# Small and large flows to simulate (currently only 2 flow types are supported by the plotter)
-flows_rate_count: List[Tuple[str, int]] = [('400K', 10), ('2M', 3)]  # 0.4 Mbps * 10 + 2 Mbps * 3 = 10 Mbps (per port)
+# Each flow class of the scenario is a flow type of the plots
+# By default: 0.4 Mbps * 10 + 2 Mbps * 3 = 10 Mbps (per port)
+iperf_pairs: List[IperfPair] = layout.get_iperf_pairs(port_min)
 task_from_to_sec: Dict[str, Tuple[int, int]] = {
     'server': (1, 31),  # When the iperf servers are active
     'warmup': (2, 5),  # Warmup period (during which iperf clients are active), skipped when plots are generated
     'evaluation': (10, 30)  # Iperf clients are activate, plots are generated from this data
 }
+iperf_client_logs: List[str] = []  # Filled in when the iperf client tasks are scheduled
+
+# The plotter reads the flow types and the client ports of the measurement from the log directory; it drops the
+# first 6 seconds of the logs (the warmup phase)
+layout.get_metadata(warmup_seconds=6, variant=args.variant).write(Path(f'{work_dir}/log'))
 
 
 def get_host_ip(host: str) -> str:
@@ -80,39 +138,66 @@ def get_host_ip(host: str) -> str:
     return ip_with_mask.split('/')[0]
 
 
-def add_task_iperf_server(host_to: str, time_from: float, time_to: float) -> None:
-    """Starts the iperf servers: one for each incoming iperf client."""
-    for flow_index, (rate, count) in enumerate(flows_rate_count):
-        host_from = f'h{flow_index + 1}'
-        iperf = f'iperf3 --server --port {port_min + flow_index}'
-        cmd = f'bash -c "{iperf} > ./work/log/iperf-s_{host_from}-{host_to}_{rate}x{count}.log 2>&1"'
-        net.addTask(host_to, cmd, time_from, time_to - time_from)
+def add_task_iperf_server(pair: IperfPair, time_from: float, time_to: float) -> None:
+    """Starts the iperf server of an iperf client."""
+    host_from, host_to, rate, count = pair.client_host, pair.server_host, pair.flow_class.rate, pair.flow_class.count
+    iperf = f'iperf3 --server --port {pair.port}'
+    cmd = f'bash -c "{iperf} > {work_dir}/log/iperf-s_{host_from}-{host_to}_{rate}x{count}.log 2>&1"'
+    net.addTask(host_to, cmd, time_from, time_to - time_from)
 
 
-def add_task_iperf_client(host_to: str, time_from: float, time_to: float) -> None:
-    """Starts the iperf clients: one for each flow type."""
+def add_task_iperf_client(pair: IperfPair, time_from: float, time_to: float) -> None:
+    """Starts an iperf client, which sends the flows of its flow class."""
     duration = time_to - time_from
-    ip = get_host_ip(host_to)
-    for flow_index, (rate, count) in enumerate(flows_rate_count):
-        host_from = f'h{flow_index + 1}'
-        iperf = (f'iperf3 --client {ip} --port {port_min + flow_index} --bitrate {rate} --fq-rate {rate}'
-                 f' --parallel {count} --time {duration} --version4 --set-mss 1460')
-        log = f'./work/log/iperf-c_{host_from}-{host_to}_{time_from}s-{time_to}s_{rate}x{count}.log'
-        cmd = f'bash -c "{iperf} > {log} 2>&1"'
-        net.addTask(host_from, cmd, time_from, duration)
+    ip = get_host_ip(pair.server_host)
+    host_from, host_to, rate, count = pair.client_host, pair.server_host, pair.flow_class.rate, pair.flow_class.count
+    iperf = (f'iperf3 --client {ip} --port {pair.port} --bitrate {rate} --fq-rate {rate}'
+             f' --parallel {count} --time {duration} --version4 --set-mss 1460')
+    log = f'{work_dir}/log/iperf-c_{host_from}-{host_to}_{time_from}s-{time_to}s_{rate}x{count}.log'
+    cmd = f'bash -c "{iperf} > {log} 2>&1"'
+    net.addTask(host_from, cmd, time_from, duration)
+    iperf_client_logs.append(log)
+
+
+def wait_for_iperf_clients(timeout_sec: float) -> None:
+    """Waits until each iperf client has exited (i.e. its log is complete), but at most until the timeout."""
+    deadline = time.time() + timeout_sec
+    while time.time() < deadline:
+        if all(is_iperf_client_log_complete(log) for log in iperf_client_logs):
+            return
+        time.sleep(0.5)
+    print("Timed out while waiting for the iperf clients")
+
+
+def is_iperf_client_log_complete(log: str) -> bool:
+    if not os.path.exists(log):
+        return False
+    with open(log, 'r') as f:
+        content = f.read()
+    return 'iperf Done.' in content or 'iperf3: error' in content
 
 
 # Schedule traffic
-# h1 and h2 are responsible for smalling small and large flows, respectively.
-# Both h1 and h2 send to both h3 and h4: each iperf server receives both traffic types.
-for h in ["h3", "h4"]:
-    add_task_iperf_server(h, *task_from_to_sec['server'])
-    add_task_iperf_client(h, *task_from_to_sec['warmup'])
-    add_task_iperf_client(h, *task_from_to_sec['evaluation'])
+# By default, h1 and h2 are responsible for sending small and large flows, respectively.
+# Both h1 and h2 send to both h3 and h4: each iperf server host receives both traffic types.
+# The incast flow classes send to a single server host instead, at the same time.
+for iperf_pair in iperf_pairs:
+    add_task_iperf_server(iperf_pair, *task_from_to_sec['server'])
+    add_task_iperf_client(iperf_pair, *task_from_to_sec['warmup'])
+    add_task_iperf_client(iperf_pair, *task_from_to_sec['evaluation'])
+if args.telemetry:
+    # Collect the telemetry records during the whole measurement
+    net.addTask(telemetry_host, f'python3 -m plotter.collector --interface {telemetry_host}-eth0'
+                                f' --output {work_dir}/log/telemetry.bin',
+                0, task_from_to_sec['server'][1] + 3)
 
 # Execute automatic traffic simulation
 net.disableCli()
-net.startNetwork()
+# Compiles the P4 program, starts the switches and the hosts, then executes the controller
+with span('start network', 'network', variant=args.variant, switches=len(layout.switches), hosts=len(layout.hosts)):
+    net.startNetwork()
 print("Waiting for the the simulation to finish...")
-time.sleep(task_from_to_sec['server'][1] + 3)  # Few seconds grace period
-net.stopNetwork()
+with span('measurement', 'network', flow_classes=[flow_class.name for flow_class in scenario.flow_classes]):
+    wait_for_iperf_clients(task_from_to_sec['server'][1] + 3)  # Few seconds grace period
+with span('stop network', 'network'):
+    net.stopNetwork()
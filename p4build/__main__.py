@@ -0,0 +1,40 @@
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Tuple
+
+from p4build.cache import DEFAULT_CACHE_DIR, CachedP4C, get_compiler_options, get_build_dir_name
+from p4build.constants import VARIANTS
+
+
+def main() -> None:
+    parser = ArgumentParser(description='Compiles the switch variants into the P4 build cache, in parallel')
+    parser.add_argument('--variants', choices=VARIANTS, nargs='+', default=VARIANTS)
+    parser.add_argument('--telemetry', action='store_true', help='Also compile the variants with TELEMETRY')
+    parser.add_argument('--jobs', type=int, default=len(VARIANTS), help='How many compilers to run in parallel')
+    parser.add_argument('--p4-src', type=Path, default=Path('switch/switch.p4'))
+    parser.add_argument('--work-dir', type=Path, default=Path('work'),
+                        help='The compiled programs are also copied into the switch_* directories of this one, '
+                             'like network.py does')
+    parser.add_argument('--cache-dir', type=Path, default=DEFAULT_CACHE_DIR)
+    args = parser.parse_args()
+
+    # Load some args into intermediate variables to add type hints
+    args_work_dir: Path = args.work_dir
+
+    builds: List[Tuple[str, bool]] = [(variant, telemetry) for variant in args.variants
+                                      for telemetry in ([False, True] if args.telemetry else [False])]
+    compilers = [CachedP4C(str(args.p4_src), outdir=str(args_work_dir / get_build_dir_name(variant, telemetry)),
+                           opts=get_compiler_options(variant, telemetry), cache_dir=args.cache_dir)
+                 for variant, telemetry in builds]
+
+    start = time.perf_counter()
+    # The compilers are separate processes, threads are enough to run them in parallel
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        list(executor.map(CachedP4C.compile, compilers))
+    print(f'{len(compilers)} programs are in {args.cache_dir} after {time.perf_counter() - start:.1f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+import hashlib
+import os
+import shutil
+import subprocess
+from pathlib import Path
+from typing import Any
+
+from p4utils.utils.compiler import P4C
+from p4utils.utils.helper import cksum
+
+from tracing.tracer import span
+
+# Shared by the work directories of all runs, e.g. the parallel runs of the experiment runner
+DEFAULT_CACHE_DIR = Path('work/p4cache')
+
+
+def get_compiler_options(variant: str, telemetry: bool) -> str:
+    """The P4C options of a switch variant; network.py and the prebuild must use the same ones to share the cache."""
+    return (f'--target bmv2 --arch v1model --std p4-16 -D VARIANT_{variant.upper().replace("-", "_")}=1'
+            + (' -D TELEMETRY=1' if telemetry else ''))
+
+
+def get_build_dir_name(variant: str, telemetry: bool) -> str:
+    """Where p4utils finds the compiled program of a variant within the work directory, e.g. switch_per-flow-vq."""
+    return f'switch_{variant}' + ('-telemetry' if telemetry else '')
+
+
+class CachedP4C(P4C):
+    """
+    A P4C which only compiles a program once: the outputs are stored in a cache directory, keyed by the hash of the
+    P4 sources, the compiler options (e.g. the -D defines) and the compiler version. They are copied into the output
+    directory (e.g. work/switch_per-flow-vq), where p4utils expects them.
+    Usage: net.setCompiler(CachedP4C, outdir=..., opts=..., cache_dir=...)
+    """
+
+    def __init__(self, *args: Any, cache_dir: Path = DEFAULT_CACHE_DIR, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._cache_dir: Path = cache_dir
+
+    def compile(self) -> None:
+        key = self.get_key()
+        entry_dir = self._cache_dir / key
+        if entry_dir.exists():
+            print(f'Reusing the compiled P4 program {entry_dir}')
+            self.cksum = cksum(self.p4_src)
+            self.compiled = True
+        else:
+            with span('compile P4', 'network', opts=self.opts):
+                self._compile_into(entry_dir)
+
+        os.makedirs(self.outdir, exist_ok=True)
+        for path in entry_dir.iterdir():
+            shutil.copy2(path, Path(self.outdir) / path.name)
+
+    def _compile_into(self, entry_dir: Path) -> None:
+        """Compiles into a temporary directory, then renames it: concurrent compilations of the same key are safe."""
+        temp_dir = entry_dir.with_name(f'{entry_dir.name}.{os.getpid()}.tmp')
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        temp_dir.mkdir(parents=True)
+        outdir, p4rt_out = self.outdir, self.p4rt_out
+        self.outdir, self.p4rt_out = str(temp_dir), str(temp_dir / Path(p4rt_out).name)
+        try:
+            super().compile()
+        except Exception:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            raise
+        finally:
+            self.outdir, self.p4rt_out = outdir, p4rt_out
+        try:
+            os.rename(temp_dir, entry_dir)
+        except OSError:
+            shutil.rmtree(temp_dir)  # Another process has compiled the same program meanwhile
+
+    def get_key(self) -> str:
+        sha256 = hashlib.sha256()
+        # The P4 program includes the other P4 files of its directory, e.g. types.p4 and logic.p4
+        for source_path in sorted(Path(self.p4_src).parent.glob('*.p4')):
+            sha256.update(source_path.name.encode() + b'\0' + source_path.read_bytes() + b'\0')
+        sha256.update(f'{Path(self.p4_src).name}\0{self.opts}\0{self.p4rt}\0'.encode())
+        sha256.update(self._get_compiler_version().encode())
+        return sha256.hexdigest()[:16]
+
+    def _get_compiler_version(self) -> str:
+        """Different compiler versions might compile different programs, e.g. because of the included core.p4."""
+        try:
+            return subprocess.run([self.p4c_bin, '--version'], capture_output=True, text=True).stdout
+        except OSError:
+            return ''
@@ -0,0 +1,15 @@
+from typing import List
+
+# The constants of the P4 program which the Python code depends on, without the dependency on p4utils of cache.py
+
+# See the VARIANT_* defines in types.p4
+VARIANTS: List[str] = ['no-vq', 'per-port-vq', 'per-flow-vq', 'indexed-vq']
+# The variants whose VQs are meant for single flows; the VQs of the others are shared by design
+PER_FLOW_VQ_VARIANTS: List[str] = ['per-flow-vq', 'indexed-vq']
+
+# The width of the flow ID in the VQ ID, see FLOW_ID_T_WIDTH in types.p4
+FLOW_ID_WIDTH = 12
+
+# The VQs of the indexed VQ variant which the controller assigns to single flows,
+# see VQ_INDEX_ASSIGNED_COUNT in types.p4
+VQ_INDEX_ASSIGNED_COUNT = 768
@@ -1,49 +1,111 @@
 import os
+import re
+import time
 from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict
+from typing import Dict, List, Callable, Optional
 
-import pandas as pd
+import matplotlib
+import numpy as np
 from matplotlib import pyplot as plt
 
-from plotter.classifier import classify_ingress_port
-from plotter.constants import IPERF_CLIENT_HOST_COUNT, LOGS_DROP_LENGTH_SECONDS, FlowType, IPERF_CONNECTION_COUNT
-from plotter.parser import SwitchLogParser
-from plotter.plotter import plot_flow_type_vs_queue_delay_cdf, plot_flow_type_vs_sum_packet_length_boxplot
-
-
-def generate_plots(name_to_data: Dict[str, pd.DataFrame], plot_dir: Path) -> None:
-    plot_flow_type_vs_sum_packet_length_boxplot(name_to_data, plot_dir)
-    plot_flow_type_vs_queue_delay_cdf(name_to_data, plot_dir)
-
-
-def load_data(switch_log_path: Path) -> pd.DataFrame:
-    data: pd.DataFrame = SwitchLogParser.parse_caching(switch_log_path)
-
-    # Drop the backward packets (e.g. TCP ACKs): take only packets that are outbound to an iperf server
-    data = data[data.egress_port > IPERF_CLIENT_HOST_COUNT]
-
-    # Consider the timestamp of the first log entry as the epoch time
-    start_time = data.at[0, 'timestamp']
-    data['timestamp'] -= start_time
-
-    # Drop the first few seconds, the Mininet warmup phase
-    data = data[data.timestamp >= LOGS_DROP_LENGTH_SECONDS * 1_000_000]
-
-    # Drop the smallest flows: they are iperf meta flows, and they would be outliers in the graphs
-    flow_lengths = data[["flow_id", "packet_length"]].groupby("flow_id").sum()
-    flow_lengths = flow_lengths.rename(columns={"packet_length": "flow_length"})
-    flow_lengths.sort_values("flow_length", ascending=True, inplace=True)
-    to_drop_flows = flow_lengths.head(IPERF_CONNECTION_COUNT).index
-    data = data[~data.flow_id.isin(to_drop_flows)]
-
-    # Consider the timestamp of the first log entry as the epoch time
-    # Yes, do this again: we dropped the first few seconds, so the start time has changed
-    data.reset_index(inplace=True)  # Make the first row be at index 0
-    start_time = data.at[0, 'timestamp']
-    data['timestamp'] -= start_time
-
-    return data
+from plotter.compact import enable_memory_report
+from plotter.loader import SWITCH_LOG_FILE_NAME, TELEMETRY_FILE_NAME, load_summary, load_time_series
+from plotter.plotter import plot_flow_type_vs_queue_delay_cdf, plot_flow_type_vs_sum_packet_length_boxplot, \
+    plot_vq_meter_color_share_bar, plot_vq_collision_rate_bar, plot_flow_type_throughput_time_series, \
+    plot_fairness_time_series, plot_flow_type_queue_delay_time_series, plot_vq_color_time_series
+from plotter.streaming import IncrementalSummarizer
+from plotter.summary import MeasurementSummary
+from plotter.timeseries import MeasurementTimeSeries
+from scenario.spec import MeasurementMetadata
+from tracing.tracer import span, enable_tracing
+
+# Repeated runs of the same measurement are put into directories like pfvq-05-10.1, pfvq-05-10.2, ...
+REPEATED_RUN_PATTERN = re.compile(r'^(?P<name>.+)\.(?P<run>\d+)$')
+
+
+# Each of them creates a figure from the summaries and saves it into the plot directory
+PLOT_FUNCTIONS: List[Callable[[Dict[str, MeasurementSummary], Path], None]] = [
+    plot_flow_type_vs_sum_packet_length_boxplot,
+    plot_flow_type_vs_queue_delay_cdf,
+    plot_vq_meter_color_share_bar,
+    plot_vq_collision_rate_bar,
+]
+
+
+def generate_plots(name_to_summary: Dict[str, MeasurementSummary], plot_dir: Path, jobs: int = 1) -> None:
+    """Renders the plots, each in its own process if multiple jobs are used (the figures are not kept open then)."""
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(PLOT_FUNCTIONS))) as executor:
+            list(executor.map(render_plot, PLOT_FUNCTIONS, [name_to_summary] * len(PLOT_FUNCTIONS),
+                              [plot_dir] * len(PLOT_FUNCTIONS)))
+    else:
+        for plot_function in PLOT_FUNCTIONS:
+            with span(plot_function.__name__, 'plotter'):
+                plot_function(name_to_summary, plot_dir)
+
+
+# Same as PLOT_FUNCTIONS, but they create the figures from the time series
+TIME_SERIES_PLOT_FUNCTIONS: List[Callable[[Dict[str, MeasurementTimeSeries], Path], None]] = [
+    plot_flow_type_throughput_time_series,
+    plot_fairness_time_series,
+    plot_flow_type_queue_delay_time_series,
+    plot_vq_color_time_series,
+]
+
+
+def render_plot(plot_function: Callable[[Dict[str, MeasurementSummary], Path], None],
+                name_to_summary: Dict[str, MeasurementSummary], plot_dir: Path) -> None:
+    with span(plot_function.__name__, 'plotter'):
+        plot_function(name_to_summary, plot_dir)
+        plt.close('all')
+
+
+def merge_repeated_runs(name_to_summary: Dict[str, MeasurementSummary]) -> Dict[str, MeasurementSummary]:
+    """Merges the summaries of the repeated runs of each measurement, keeping the order of the names."""
+    name_to_run_summaries: Dict[str, List[MeasurementSummary]] = dict()
+    for name, summary in name_to_summary.items():
+        match = REPEATED_RUN_PATTERN.match(name)
+        name_to_run_summaries.setdefault(match.group('name') if match else name, []).append(summary)
+    return {name: summaries[0] if len(summaries) == 1 else MeasurementSummary.merge(summaries)
+            for name, summaries in name_to_run_summaries.items()}
+
+
+def print_summary(summary: MeasurementSummary) -> None:
+    print(f'  Count of log entries: {summary.entry_count}')
+    for flow_type in summary.get_flow_types():
+        print(f"  Number of {flow_type.name} flows: {summary.get_flow_count(flow_type)}")
+    vq_count, shared_vq_count = summary.vq_counts.sum(axis=0)
+    collision_rate = summary.get_vq_collision_rate()
+    if np.isnan(collision_rate):
+        print(f'  Number of VQs: {vq_count}, not per flow (no collisions)')
+    else:
+        print(f'  Number of VQs: {vq_count}, shared by multiple flows: {shared_vq_count}'
+              f' ({collision_rate:.1%} of the log entries)')
+
+
+def follow(name_to_switch_log_path: Dict[str, Path], plot_dir: Path, interval_seconds: float,
+           open_plots: bool) -> None:
+    """Redraws the queue delay CDF periodically while the logs are growing, until interrupted."""
+    name_to_summarizer = {name: IncrementalSummarizer(path, MeasurementMetadata.read(path.parent))
+                          for name, path in name_to_switch_log_path.items()}
+    try:
+        while True:
+            name_to_summary: Dict[str, MeasurementSummary] = dict()
+            for name, summarizer in name_to_summarizer.items():
+                new_bytes = summarizer.update()
+                name_to_summary[name] = summarizer.summarize()
+                print(f'{name}: {new_bytes} new bytes, {name_to_summary[name].entry_count} log entries')
+
+            plt.close('all')
+            plot_flow_type_vs_queue_delay_cdf(name_to_summary, plot_dir)
+            if open_plots:
+                plt.pause(interval_seconds)  # Keeps the plot window responsive while waiting
+            else:
+                time.sleep(interval_seconds)
+    except KeyboardInterrupt:
+        print('Following has been interrupted')
 
 
 def main() -> None:
@@ -51,11 +113,50 @@ def main() -> None:
     parser.add_argument('--measure-dir', type=Path, required=True)
     parser.add_argument('--plot-dir', type=Path, required=True)
     parser.add_argument('--open-plots', action='store_true')
+    parser.add_argument('--streaming', action='store_true',
+                        help='Parse the logs chunk by chunk, keeping only aggregates in memory (for very large logs)')
+    parser.add_argument('--follow', type=float, metavar='SECONDS',
+                        help='Redraw the queue delay CDF every SECONDS while the logs are being written, until'
+                             ' interrupted')
+    parser.add_argument('--telemetry', action='store_true',
+                        help=f'Load the telemetry records ({TELEMETRY_FILE_NAME}) instead of the switch logs')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='How many measurements to load (and plots to render) in parallel, each in its own process'
+                             ' (0: CPU count)')
+    parser.add_argument('--batch', action='store_true',
+                        help='Render the plots headless, without a display (incompatible with --open-plots)')
+    parser.add_argument('--no-store', action='store_true',
+                        help='Recompute the summaries of the measurements even if their logs have not changed')
+    parser.add_argument('--time-series', action='store_true',
+                        help='Also plot the throughput, fairness, queue delay and VQ meter colors over time')
+    parser.add_argument('--window', type=float, default=1.0,
+                        help='The length of the sliding windows of the time series in seconds')
+    parser.add_argument('--window-step', type=float, default=0.25,
+                        help='How many seconds the sliding windows of the time series move at a time')
+    parser.add_argument('--profile', type=Path, nargs='?', const=Path(), metavar='TRACE_PATH',
+                        help='Record how long each stage takes into a Chrome trace file (default: trace.json in the'
+                             ' plot directory)')
+    parser.add_argument('--memory-report', action='store_true',
+                        help='Print the memory used by the log entries after parsing, filtering and classifying them')
     args = parser.parse_args()
 
+    if args.batch:
+        if args.open_plots or args.follow is not None:
+            raise ValueError('Batch rendering cannot open plots')
+        matplotlib.use('Agg')  # Non-interactive: no display is needed
+
     # Load some args into intermediate variables to add type hints
     args_measure_dir: Path = args.measure_dir
     args_plot_dir: Path = args.plot_dir
+    args_profile: Optional[Path] = args.profile
+
+    if args_profile is not None:
+        trace_path = args_profile if args_profile != Path() else args_plot_dir / 'trace.json'
+        enable_tracing(trace_path, 'plotter', truncate=True)
+        print(f'Recording the trace into {trace_path}')
+
+    if args.memory_report:
+        enable_memory_report()
 
     if not args_measure_dir.exists():
         raise FileNotFoundError(f'Cannot find the directory: {args_measure_dir}')
@@ -67,32 +168,71 @@ def main() -> None:
     if len(names) == 0:
         raise ValueError('No measurements have been found')
 
+    if args.follow is not None:
+        # Only follow the measurements which have already been started
+        name_to_switch_log_path = {name: args_measure_dir / name / SWITCH_LOG_FILE_NAME for name in names}
+        name_to_switch_log_path = {name: path for name, path in name_to_switch_log_path.items() if path.exists()}
+        if len(name_to_switch_log_path) == 0:
+            raise ValueError('No switch logs have been found')
+        os.makedirs(args_plot_dir, exist_ok=True)
+        follow(name_to_switch_log_path, args_plot_dir, args.follow, args.open_plots)
+        return
+
     print('Notes regarding the raw data:')
     print('  Time unit: microseconds')
     print('  Packet length unit: bytes')
-    print('  Flow types: ' + ", ".join([f'{flow_type.value}={flow_type.name.lower()}' for flow_type in FlowType]))
+    print('  Flow types: see the scenario of each measurement')
     print()
 
     # Load the measurements
-    name_to_data: Dict[str, pd.DataFrame] = dict()
-    for name in names:
-        print(f"Loading measurement: {name}")
-        data: pd.DataFrame = load_data(args_measure_dir / name / 'p4s.s1.log')
-        print(f'  Count of log entries: {data.shape[0]}')
-
-        data = classify_ingress_port(data)
-        data_flows = data[['flow_id', 'flow_type']].drop_duplicates()  # Flow to flow_type mapping
-        for flow_type in FlowType:
-            # noinspection PyUnresolvedReferences
-            print(f"  Number of {flow_type.name.lower()} flows: {(data_flows.flow_type == flow_type.value).sum()}")
-
-        name_to_data[name] = data
-        print(f'  First few classified log entries:')
-        print(data.head())
+    name_to_summary: Dict[str, MeasurementSummary] = dict()
+    log_file_name = TELEMETRY_FILE_NAME if args.telemetry else SWITCH_LOG_FILE_NAME
+    switch_log_paths = [args_measure_dir / name / log_file_name for name in names]
+    jobs: int = args.jobs if args.jobs > 0 else os.cpu_count()
+    use_store: bool = not args.no_store
+    with span('load measurements', 'plotter', jobs=jobs):
+        if jobs > 1:
+            # The workers only send back the summaries (a few NumPy arrays), not the log entries
+            print(f'Loading the measurements using {jobs} processes...')
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                summaries = list(executor.map(load_summary, switch_log_paths, [args.streaming] * len(names),
+                                              [use_store] * len(names)))
+        else:
+            summaries = list(map(load_summary, switch_log_paths, [args.streaming] * len(names),
+                                 [use_store] * len(names)))
+    for name, summary in zip(names, summaries):
+        print(f"Loaded measurement: {name}")
+        print('  Flow types: ' + ", ".join([f'{flow_type.value}={flow_type.name}'
+                                            for flow_type in summary.get_flow_types()]))
+        print_summary(summary)
+        name_to_summary[name] = summary
         print()
 
+    merged_name_to_summary = merge_repeated_runs(name_to_summary)
+    for name, summary in merged_name_to_summary.items():
+        if summary.run_count > 1:
+            print(f'Merged {summary.run_count} runs of {name}')
+
     os.makedirs(args_plot_dir, exist_ok=True)
-    generate_plots(name_to_data, args_plot_dir)
+    start = time.perf_counter()
+    # Only render the plots in parallel if they do not need to be shown
+    with span('generate plots', 'plotter'):
+        generate_plots(merged_name_to_summary, args_plot_dir, jobs=1 if args.open_plots else jobs)
+    print(f'Plots saved to {args_plot_dir} in {time.perf_counter() - start:.1f} s')
+
+    if args.time_series:
+        print('Computing the time series...')
+        window_length_us, window_step_us = round(args.window * 1_000_000), round(args.window_step * 1_000_000)
+        time_series_args = (switch_log_paths, [window_length_us] * len(names), [window_step_us] * len(names))
+        if jobs > 1:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                all_time_series = list(executor.map(load_time_series, *time_series_args))
+        else:
+            all_time_series = list(map(load_time_series, *time_series_args))
+        name_to_time_series = dict(zip(names, all_time_series))
+        for plot_function in TIME_SERIES_PLOT_FUNCTIONS:
+            with span(plot_function.__name__, 'plotter'):
+                plot_function(name_to_time_series, args_plot_dir)
 
     if args.open_plots:
         plt.show()
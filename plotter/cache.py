@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import struct
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from tracing.tracer import traced
+
+
+class ColumnarCache:
+    """
+    Binary cache of a parsed switch log: a small JSON header, followed by the fixed-width columns one after the other.
+    The columns are memory-mapped when the cache is loaded, therefore loading does not depend on the log length.
+    """
+
+    MAGIC = b'SWLOGCOL'
+    VERSION = 1
+
+    # Little-endian, fixed-width types which are wide enough for the corresponding bmv2 fields
+    COLUMN_DTYPES: Dict[str, str] = {
+        'timestamp': '<i8',
+        'ingress_port': '<u2',
+        'egress_port': '<u2',
+        'flow_id': '<u4',
+        'vq_id': '<u4',
+        'dequeue_timedelta': '<u4',
+        'packet_length': '<u4',
+    }
+
+    # Same, for the "Meter color" log entries (see SwitchLogParser.parse_meter_colors_caching)
+    METER_COLOR_COLUMN_DTYPES: Dict[str, str] = {
+        'time': '<i8',
+        'vq_id': '<u4',
+        'color': '<u1',
+    }
+
+    # The magic bytes and the header are followed by the columns from this offset; each column is aligned
+    DATA_OFFSET_BYTES = 4096
+    ALIGNMENT_BYTES = 64
+
+    # This many bytes are hashed from the start and from the end of the log file to detect changes
+    PARTIAL_HASH_BYTES = 1024 * 1024
+
+    @staticmethod
+    @traced('plotter')
+    def get_key(path: Path) -> str:
+        """A cheap fingerprint of a file: its size, modification time and the hash of its first and last bytes."""
+        stat = path.stat()
+        sha1 = hashlib.sha1()
+        with open(path, 'rb') as f:
+            sha1.update(f.read(ColumnarCache.PARTIAL_HASH_BYTES))
+            if stat.st_size > ColumnarCache.PARTIAL_HASH_BYTES:
+                f.seek(max(ColumnarCache.PARTIAL_HASH_BYTES, stat.st_size - ColumnarCache.PARTIAL_HASH_BYTES))
+                sha1.update(f.read())
+        return f'{stat.st_size}-{stat.st_mtime_ns}-{sha1.hexdigest()}'
+
+    @staticmethod
+    @traced('plotter')
+    def load(cache_path: Path, key: str) -> Optional[pd.DataFrame]:
+        """Returns None if the cache does not exist or if it has been created from a different file (or version)."""
+        header = ColumnarCache._read_header(cache_path)
+        if header is None or header['version'] != ColumnarCache.VERSION or header['key'] != key:
+            return None
+
+        row_count: int = header['row_count']
+        columns: Dict[str, np.ndarray] = dict()
+        for column in header['columns']:
+            if row_count == 0:  # Empty files can't be memory-mapped
+                columns[column['name']] = np.empty(0, dtype=column['dtype'])
+            else:
+                # Copy-on-write: the data frame can be modified without modifying the cache
+                columns[column['name']] = np.memmap(cache_path, dtype=column['dtype'], mode='c',
+                                                    offset=column['offset'], shape=(row_count,))
+        return pd.DataFrame(columns, copy=False)
+
+    @staticmethod
+    @traced('plotter')
+    def save(cache_path: Path, key: str, data: pd.DataFrame, column_dtypes: Optional[Dict[str, str]] = None) -> None:
+        """The column types are those of the parsed "Egress data" log entries by default (see COLUMN_DTYPES)."""
+        if column_dtypes is None:
+            column_dtypes = ColumnarCache.COLUMN_DTYPES
+        row_count = data.shape[0]
+        arrays = {name: ColumnarCache._to_dtype(data[name].to_numpy(), name, dtype)
+                  for name, dtype in column_dtypes.items()}
+
+        columns = []
+        offset = ColumnarCache.DATA_OFFSET_BYTES
+        for name, dtype in column_dtypes.items():
+            columns.append({'name': name, 'dtype': dtype, 'offset': offset})
+            offset = ColumnarCache._align(offset + arrays[name].nbytes)
+        header = {'version': ColumnarCache.VERSION, 'key': key, 'row_count': row_count, 'columns': columns}
+        header_bytes = json.dumps(header).encode()
+        if len(ColumnarCache.MAGIC) + 4 + len(header_bytes) > ColumnarCache.DATA_OFFSET_BYTES:
+            raise ValueError('The cache header is too long')
+
+        # Write to a temporary file first: an interrupted write must not leave a corrupt cache behind
+        temp_path = cache_path.with_name(cache_path.name + '.tmp')
+        with open(temp_path, 'wb') as f:
+            f.write(ColumnarCache.MAGIC)
+            f.write(struct.pack('<I', len(header_bytes)))
+            f.write(header_bytes)
+            for column in columns:
+                f.seek(column['offset'])
+                f.write(arrays[column['name']].tobytes())
+        os.replace(temp_path, cache_path)
+
+    @staticmethod
+    def _read_header(cache_path: Path) -> Optional[dict]:
+        if not cache_path.exists():
+            return None
+        with open(cache_path, 'rb') as f:
+            if f.read(len(ColumnarCache.MAGIC)) != ColumnarCache.MAGIC:
+                return None
+            (header_length,) = struct.unpack('<I', f.read(4))
+            return json.loads(f.read(header_length).decode())
+
+    @staticmethod
+    def _to_dtype(array: np.ndarray, name: str, dtype: str) -> np.ndarray:
+        info = np.iinfo(dtype)
+        if len(array) > 0 and (array.min() < info.min or array.max() > info.max):
+            raise ValueError(f'The values of the {name} column do not fit into {dtype}')
+        return array.astype(dtype, copy=False)
+
+    @staticmethod
+    def _align(offset: int) -> int:
+        return -(-offset // ColumnarCache.ALIGNMENT_BYTES) * ColumnarCache.ALIGNMENT_BYTES
@@ -1,7 +1,11 @@
+from typing import List, Optional
+
 import numpy as np
 import pandas as pd
 
-from plotter.constants import FlowType
+from plotter.compact import to_flow_type_category
+from scenario.spec import MeasurementMetadata
+from tracing.tracer import traced
 
 
 def classify_flow_size(data: pd.DataFrame, flow_size_threshold: int) -> pd.DataFrame:
@@ -10,17 +14,29 @@ def classify_flow_size(data: pd.DataFrame, flow_size_threshold: int) -> pd.DataF
         "flow_id").sum().rename(columns={"packet_length": "sum(packet_length)"})
 
     data_group_sum["sum(packet_length)"] = np.where(data_group_sum["sum(packet_length)"] <= flow_size_threshold,
-                                                    FlowType.SMALL.value, FlowType.LARGE.value)
+                                                    1, 2)  # The default flow types: small and large
     flow_to_type = data_group_sum.rename(columns={"sum(packet_length)": "flow_type"})
     data = data.join(flow_to_type, on='flow_id')
 
     return data
 
 
-def classify_ingress_port(data: pd.DataFrame) -> pd.DataFrame:
+@traced('plotter')
+def classify_ingress_port(data: pd.DataFrame, flow_type_ports: Optional[List[List[int]]] = None) -> pd.DataFrame:
     """
-    Classify flows based on their packets' ingress port: port=1 -> FlowType[1], etc.
+    Classify flows based on their packets' ingress port: the ports of the client hosts of the i-th flow class of the
+    scenario (see MeasurementMetadata.flow_type_ports) -> flow type i + 1; other ports -> 0.
     Because of flow ID collisions, two log entries with the same flow ID might have different flow types.
+    The flow_type column is categorical (1 byte per log entry); it is added to the data frame in place, without copying
+    the other columns.
     """
-    data["flow_type"] = np.where(data["ingress_port"] == 1, FlowType.SMALL.value, FlowType.LARGE.value)
+    if flow_type_ports is None:
+        flow_type_ports = MeasurementMetadata().flow_type_ports
+    port_to_flow_type = np.zeros(max(port for ports in flow_type_ports for port in ports) + 2,
+                                 dtype=np.int8 if len(flow_type_ports) <= np.iinfo(np.int8).max else np.int16)
+    for flow_type_index, ports in enumerate(flow_type_ports):
+        port_to_flow_type[ports] = flow_type_index + 1
+    # A single lookup; the larger ports are clipped to the last one, which is unclassified (0)
+    flow_types = np.take(port_to_flow_type, data["ingress_port"].to_numpy(), mode='clip')
+    data["flow_type"] = to_flow_type_category(flow_types, len(flow_type_ports))
     return data
@@ -0,0 +1,61 @@
+import signal
+import socket
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+from types import FrameType
+from typing import Optional
+
+from plotter.telemetry import ETHER_TYPE_TELEMETRY, ETHERNET_HEADER_SIZE_BYTES, TELEMETRY_RECORD_SIZE_BYTES
+
+
+class TelemetryCollector:
+    """Receives the telemetry packets cloned by the switch and appends their records to a file, as they are."""
+
+    # How often the received records are written to the disk
+    FLUSH_INTERVAL_SECONDS = 1.0
+
+    def __init__(self, interface: str, output_path: Path) -> None:
+        self._interface: str = interface
+        self._output_path: Path = output_path
+        self._running: bool = False
+
+    def run(self) -> None:
+        """Collects the records until SIGTERM or SIGINT is received."""
+        self._running = True
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        with socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETHER_TYPE_TELEMETRY)) as s, \
+                open(self._output_path, 'ab') as f:
+            s.bind((self._interface, 0))
+            s.settimeout(self.FLUSH_INTERVAL_SECONDS)
+            record_end = ETHERNET_HEADER_SIZE_BYTES + TELEMETRY_RECORD_SIZE_BYTES
+            last_flush = time.monotonic()
+            while self._running:
+                try:
+                    frame = s.recv(2048)
+                    if len(frame) >= record_end:
+                        f.write(frame[ETHERNET_HEADER_SIZE_BYTES:record_end])
+                except socket.timeout:
+                    pass
+                except InterruptedError:
+                    pass
+                if time.monotonic() - last_flush >= self.FLUSH_INTERVAL_SECONDS:
+                    f.flush()
+                    last_flush = time.monotonic()
+
+    def _stop(self, signum: int, frame: Optional[FrameType]) -> None:
+        self._running = False
+
+
+def main() -> None:
+    parser = ArgumentParser(description='Saves the telemetry records received on an interface')
+    parser.add_argument('--interface', required=True, help='The interface connected to the switch, e.g. h5-eth0')
+    parser.add_argument('--output', type=Path, required=True, help='The file to append the records to')
+    args = parser.parse_args()
+    TelemetryCollector(args.interface, args.output).run()
+
+
+if __name__ == '__main__':
+    main()
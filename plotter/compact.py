@@ -0,0 +1,55 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from tracing.tracer import get_rss_bytes
+
+# The unsigned integer types, from the smallest one
+UNSIGNED_DTYPES = [np.uint8, np.uint16, np.uint32, np.uint64]
+SIGNED_DTYPES = [np.int8, np.int16, np.int32, np.int64]
+
+# Disabled by default, see enable_memory_report
+_memory_report_enabled: bool = False
+
+
+def get_compact_dtype(array: np.ndarray) -> np.dtype:
+    """The smallest integer type which fits each value of the array, e.g. uint8 for switch ports."""
+    if len(array) == 0:
+        return array.dtype
+    minimum, maximum = int(array.min()), int(array.max())
+    for dtype in UNSIGNED_DTYPES if minimum >= 0 else SIGNED_DTYPES:
+        info = np.iinfo(dtype)
+        if info.min <= minimum and maximum <= info.max:
+            return np.dtype(dtype)
+    return array.dtype
+
+
+def compact_array(array: np.ndarray) -> np.ndarray:
+    return array.astype(get_compact_dtype(array), copy=False)
+
+
+def to_flow_type_category(flow_types: np.ndarray, flow_type_count: int) -> pd.Categorical:
+    """The flow types as a categorical column: 1 byte per log entry; the categories are 0 (unclassified), 1, 2, ..."""
+    # pandas stores the codes in the smallest fitting type
+    return pd.Categorical.from_codes(flow_types, categories=range(flow_type_count + 1))
+
+
+def get_frame_bytes(data: pd.DataFrame) -> int:
+    """The memory used by the columns and the index of the data frame."""
+    return int(data.memory_usage(index=True).sum())
+
+
+def enable_memory_report() -> None:
+    """Prints the memory usage of the log entries at each step of loading them (also in the forked worker processes)."""
+    global _memory_report_enabled
+    _memory_report_enabled = True
+
+
+def report_memory(path: Path, step: str, data: pd.DataFrame) -> None:
+    """Prints the size of the log entries of the file after a step (e.g. parsing), and the RSS of the process."""
+    if not _memory_report_enabled:
+        return
+    dtypes = ', '.join(f'{name}: {dtype}' for name, dtype in data.dtypes.items())
+    print(f'{path}: {data.shape[0]} log entries after {step}, {get_frame_bytes(data) / 2 ** 20:,.1f} MiB'
+          f' ({dtypes}), RSS: {get_rss_bytes() / 2 ** 20:,.1f} MiB', flush=True)
@@ -1,22 +1,24 @@
-from enum import Enum
+from dataclasses import dataclass
+from typing import List
 
 
-class FlowType(Enum):
-    SMALL = 1
-    LARGE = 2
+@dataclass(frozen=True)
+class FlowType:
+    """A flow class of the measurement's scenario (see MeasurementMetadata); the value is its flow_type column value."""
+    value: int
+    name: str
 
 
+# The flow types of the measurements without scenario metadata (see MeasurementMetadata): the 2 client hosts of the
+# original network.py; the scenario of each measurement describes its flow types, hosts and warmup phase
+DEFAULT_FLOW_TYPE_NAMES: List[str] = ['small', 'large']
+
 # Switches have a fixed queue size and a fixed dequeue rate, therefore a maximum queue delay can be determined
 MAX_QUEUE_DELAY_MS = 60
 
-# This many hosts will be used to generate traffic, starting with h1 and switch port 1
-IPERF_CLIENT_HOST_COUNT = len(FlowType)
-
-# This many hosts will be used to receive traffic, hN and port indexes are continued from the client hosts
-IPERF_SERVER_HOST_COUNT = 2
-
-# How many iperf connections will be established in total
-IPERF_CONNECTION_COUNT = IPERF_SERVER_HOST_COUNT * len(FlowType)
+# The queue delays are summarized in histograms with bins of this width; the last bin also holds the larger delays
+QUEUE_DELAY_BIN_WIDTH_US = 100
+QUEUE_DELAY_BIN_COUNT = MAX_QUEUE_DELAY_MS * 1_000 // QUEUE_DELAY_BIN_WIDTH_US + 1
 
-# How many seconds of log data should be dropped from the start of the logs (to drop the warmup phase)
-LOGS_DROP_LENGTH_SECONDS = 6
+# The meter colors of the VQs, in the order of their values (see METER_GREEN etc. in types.p4)
+METER_COLORS = ['green', 'yellow', 'red']
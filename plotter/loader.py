@@ -0,0 +1,150 @@
+import dataclasses
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from plotter.classifier import classify_ingress_port
+from plotter.compact import compact_array, report_memory
+from plotter.parser import SwitchLogParser
+from plotter.store import SummaryStore
+from plotter.streaming import StreamingSummarizer
+from plotter.summary import MeasurementSummary, MeterColorAccumulator
+from plotter.telemetry import TelemetryReader
+from plotter.timeseries import MeasurementTimeSeries
+from plotter.vqstats import VqStatsReader
+from scenario.spec import MeasurementMetadata
+from tracing.tracer import traced
+
+# The log entries of a measurement are either in the switch log or in the telemetry records (see TELEMETRY in logic.p4)
+SWITCH_LOG_FILE_NAME = 'p4s.s1.log'
+TELEMETRY_FILE_NAME = 'telemetry.bin'
+# The VQ color counters polled by the controller, preferred over the "Meter color" log entries (see VqStatsPoller)
+VQ_STATS_FILE_NAME = 'vq_stats.bin'
+
+
+def parse_entries(switch_log_path: Path) -> pd.DataFrame:
+    if switch_log_path.name == TELEMETRY_FILE_NAME:
+        return TelemetryReader.read(switch_log_path)
+    return SwitchLogParser.parse_caching(switch_log_path)
+
+
+def parse_entry_chunks(switch_log_path: Path) -> Iterator[Tuple[pd.DataFrame, Optional[pd.DataFrame]]]:
+    """Yields the log entries of each chunk and their "Meter color" log entries (None for the telemetry records)."""
+    if switch_log_path.name == TELEMETRY_FILE_NAME:
+        return ((chunk, None) for chunk in TelemetryReader.read_chunks(switch_log_path))
+    return SwitchLogParser.parse_chunks_with_meter_colors(switch_log_path)
+
+
+@traced('plotter')
+def load_data(switch_log_path: Path, metadata: Optional[MeasurementMetadata] = None) -> pd.DataFrame:
+    """
+    The metadata describes the scenario of the measurement; it is read from the log's directory by default.
+    The filters are combined into a single mask over the parsed columns: the log entries are only copied once, when the
+    remaining ones are taken, and each column is downcast to its smallest fitting type (e.g. uint8 ports).
+    """
+    if metadata is None:
+        metadata = MeasurementMetadata.read(switch_log_path.parent)
+    data: pd.DataFrame = parse_entries(switch_log_path)
+    report_memory(switch_log_path, 'parsing', data)
+    timestamps = data.timestamp.to_numpy()
+    flow_ids = data.flow_id.to_numpy()
+
+    # Drop the backward packets (e.g. TCP ACKs): take only packets that are outbound to an iperf server
+    client_ports = metadata.client_ports
+    mask = np.isin(data.ingress_port.to_numpy(), client_ports) & ~np.isin(data.egress_port.to_numpy(), client_ports)
+    if not mask.any():
+        raise ValueError(f'No packets have been sent by the client hosts in {switch_log_path}')
+
+    # Consider the timestamp of the first log entry as the epoch time
+    start_time = timestamps[mask.argmax()]
+
+    # Drop the first few seconds, the Mininet warmup phase
+    mask &= timestamps >= start_time + metadata.warmup_seconds * 1_000_000
+
+    # Drop the smallest flows: they are iperf meta flows, and they would be outliers in the graphs
+    flow_lengths = pd.Series(data.packet_length.to_numpy(dtype=np.int64)[mask]).groupby(flow_ids[mask]).sum()
+    to_drop_flows = flow_lengths.sort_values(ascending=True).head(metadata.meta_flow_count).index
+    mask &= ~np.isin(flow_ids, to_drop_flows)
+
+    # Consider the timestamp of the first log entry as the epoch time
+    # Yes, do this again: we dropped the first few seconds, so the start time has changed
+    start_time = timestamps[mask.argmax()]
+    # The columns are taken one by one: at most one of them is copied at its original width at a time
+    columns = {'timestamp': compact_array(timestamps[mask] - start_time)}
+    columns.update({name: compact_array(data[name].to_numpy()[mask]) for name in data.columns if name != 'timestamp'})
+    data = pd.DataFrame(columns, copy=False)
+    report_memory(switch_log_path, 'filtering', data)
+    return data
+
+
+@traced('plotter')
+def load_summary_streaming(switch_log_path: Path,
+                           metadata: MeasurementMetadata) -> Tuple[MeasurementSummary, np.ndarray]:
+    """
+    Same as load_data + classify_ingress_port, but only one chunk of log entries is kept in memory at a time.
+    Also returns the VQs of the summarized log entries.
+    """
+    summarizer = StreamingSummarizer(metadata)
+    for chunk, meter_colors in parse_entry_chunks(switch_log_path):
+        summarizer.add(chunk, meter_colors)
+    return summarizer.summarize(), summarizer.get_vq_ids()
+
+
+@traced('plotter')
+def load_summary(switch_log_path: Path, streaming: bool, use_store: bool = True) -> MeasurementSummary:
+    """
+    Loads and summarizes a measurement, unless its summary has been stored since its inputs have last changed: the log,
+    the metadata (scenario.json) and the VQ statistics. It is executed in a worker process when multiple jobs are used.
+    """
+    store_path = SummaryStore.get_store_path(switch_log_path)
+    vq_stats_path = switch_log_path.parent / VQ_STATS_FILE_NAME
+    key = SummaryStore.get_key(switch_log_path, [switch_log_path.parent / MeasurementMetadata.FILE_NAME, vq_stats_path])
+    if use_store:
+        summary = SummaryStore.load(store_path, key)
+        if summary is not None:
+            return summary
+
+    metadata = MeasurementMetadata.read(switch_log_path.parent)
+    if streaming:
+        summary, vq_ids = load_summary_streaming(switch_log_path, metadata)
+    else:
+        data = classify_ingress_port(load_data(switch_log_path, metadata), metadata.flow_type_ports)
+        report_memory(switch_log_path, 'classification', data)
+        summary = MeasurementSummary.of_data(data, metadata.flow_type_names, metadata.per_flow_vqs)
+        vq_ids = np.unique(data.vq_id.to_numpy())
+
+    # The meter colors are counted like the log entries: only those of their VQs, without the warmup phase
+    if vq_stats_path.exists():
+        color_counts = VqStatsReader.get_color_counts(VqStatsReader.read(vq_stats_path), vq_ids,
+                                                      metadata.warmup_seconds)
+        summary = dataclasses.replace(summary, color_counts=color_counts[np.newaxis])
+    elif not streaming and switch_log_path.name == SWITCH_LOG_FILE_NAME:
+        # The streaming summary already contains them; otherwise they have been cached when the log was parsed
+        meter_color_accumulator = MeterColorAccumulator(metadata.warmup_seconds)
+        meter_color_accumulator.add(SwitchLogParser.parse_meter_colors_caching(switch_log_path))
+        summary = dataclasses.replace(summary,
+                                      color_counts=meter_color_accumulator.get_color_counts(vq_ids)[np.newaxis])
+
+    if use_store:
+        SummaryStore.save(store_path, key, summary)
+    return summary
+
+
+@traced('plotter')
+def load_time_series(switch_log_path: Path, window_length_us: int, window_step_us: int) -> MeasurementTimeSeries:
+    metadata = MeasurementMetadata.read(switch_log_path.parent)
+    data = classify_ingress_port(load_data(switch_log_path, metadata), metadata.flow_type_ports)
+    report_memory(switch_log_path, 'classification', data)
+    meter_colors, vq_stats = None, None
+    # Same as in the summary: only the meter colors of the VQs of the log entries
+    vq_ids = np.unique(data.vq_id.to_numpy())
+    vq_stats_path = switch_log_path.parent / VQ_STATS_FILE_NAME
+    if vq_stats_path.exists():
+        vq_stats = VqStatsReader.read(vq_stats_path)
+        vq_stats = vq_stats[vq_stats.vq_id.isin(vq_ids)]
+    elif switch_log_path.name == SWITCH_LOG_FILE_NAME:
+        meter_colors = SwitchLogParser.parse_meter_colors_caching(switch_log_path)
+        meter_colors = meter_colors[meter_colors.vq_id.isin(vq_ids)]
+    return MeasurementTimeSeries.of_data(data, window_length_us, window_step_us, metadata, meter_colors, vq_stats)
@@ -1,53 +1,177 @@
-import base64
-import hashlib
-import os.path
 import re
 from pathlib import Path
-from typing import Optional, List
+from typing import Iterator, List, Tuple
 
 import numpy as np
 import pandas as pd
 
+from plotter.cache import ColumnarCache
+from tracing.tracer import traced
+
 
 class SwitchLogParser:
+    # The parsed columns, in the order in which they appear in the "Egress data" log entries
+    COLUMNS: List[str] = ['timestamp', 'ingress_port', 'egress_port', 'flow_id', 'vq_id', 'dequeue_timedelta',
+                          'packet_length']
+
+    # How many bytes of the log file are parsed at once
+    BLOCK_SIZE_BYTES: int = 16 * 1024 * 1024
+
+    # Matches a whole "Egress data" log line; trailing whitespace is ignored, just like a line.rstrip() would
+    _EGRESS_DATA_PATTERN = re.compile(rb'^\[[^]\n]+] \[bmv2] \[I] \[[^]\n]+] Egress data:'
+                                      rb' timestamp=(\d+); ingress_port=(\d+); egress_port=(\d+); '
+                                      rb'flow_id=(\d+); vq_id=(\d+); dequeue_timedelta=(\d+); packet_length=(\d+)'
+                                      rb'[ \t\r\f\v]*$', re.MULTILINE)
+
+    # Matches a "Meter color" log line (only logged by the VQ variants, see MyIngress in logic.p4): the wall-clock time
+    # of the log entry (e.g. [12:34:56.789]), the VQ ID and the color
+    _METER_COLOR_TIME_PATTERN = re.compile(rb'^\[(\d+):(\d+):(\d+)\.(\d+)] \[bmv2] \[I] \[[^]\n]+]'
+                                           rb' Meter color of VQ=(\d+): (\d+)', re.MULTILINE)
+
+    # The parsed columns of the "Meter color" log entries; the time is in microseconds since midnight
+    METER_COLOR_COLUMNS: List[str] = ['time', 'vq_id', 'color']
+
     @staticmethod
+    @traced('plotter')
     def parse_caching(path: Path) -> pd.DataFrame:
-        # Cache the parsed file, but add a hash to the filename to be able to detect changes
-        # Detecting changes is not actually necessary anymore: we usually delete the caches when we gather new logs
-        sha1 = hashlib.sha1(path.read_bytes()).digest()
-        b64 = base64.b64encode(sha1).decode().replace('/', '-')
-        parsed_path = path.with_suffix('.parsed.' + b64)
-
-        if os.path.exists(parsed_path):
-            with open(parsed_path, 'r') as f:
-                # print('Loading cached switch log file...')
-                data = pd.read_csv(f)
-                # print('Switch log file loaded')
-                return data
-        else:
-            # print('Parsing switch log file...')
-            data = SwitchLogParser.parse(path)
-            data.to_csv(parsed_path, index=False)
-            # print('Switch log file parsed and cached')
-            return data
-
-    @staticmethod
-    def parse(path: Path) -> pd.DataFrame:
-        columns = ['timestamp', 'ingress_port', 'egress_port', 'flow_id', 'vq_id', 'dequeue_timedelta', 'packet_length']
-        data = pd.DataFrame(np.empty((0, len(columns)), dtype=np.int64), columns=columns)
-        with open(path, 'r') as f:
-            for line in f:
-                row = SwitchLogParser._parse_line(line)
-                if row is not None:
-                    data_row_array = np.array(row, dtype=np.int64).reshape((1, len(columns)))
-                    data_row_frame = pd.DataFrame(data_row_array, columns=data.columns)
-                    data = pd.concat([data, data_row_frame], ignore_index=True)
+        """Parses the log file, unless a cache created from the same file exists next to it (e.g. p4s.s1.parsed.bin)."""
+        cache_path = path.with_suffix('.parsed.bin')
+        key = ColumnarCache.get_key(path)
+        data = ColumnarCache.load(cache_path, key)
+        if data is None:
+            SwitchLogParser._parse_into_caches(path, key)
+            data = ColumnarCache.load(cache_path, key)  # Load it to use the same column types on cache hits and misses
         return data
 
     @staticmethod
-    def _parse_line(line: str) -> Optional[List[int]]:
-        line = line.rstrip()
-        match = re.fullmatch(r'\[[^]]+] \[bmv2] \[I] \[[^]]+] Egress data:'
-                             r' timestamp=(\d+); ingress_port=(\d+); egress_port=(\d+); '
-                             r'flow_id=(\d+); vq_id=(\d+); dequeue_timedelta=(\d+); packet_length=(\d+)', line)
-        return list(map(int, match.groups())) if match else None
+    @traced('plotter')
+    def parse_meter_colors_caching(path: Path) -> pd.DataFrame:
+        """
+        Same as parse_meter_colors, but the "Meter color" log entries are cached next to the log file (e.g.
+        p4s.s1.meter.bin). They are cached by parse_caching too: the log file is only parsed once for both.
+        """
+        cache_path = path.with_suffix('.meter.bin')
+        key = ColumnarCache.get_key(path)
+        meter_colors = ColumnarCache.load(cache_path, key)
+        if meter_colors is None:
+            SwitchLogParser._parse_into_caches(path, key)
+            meter_colors = ColumnarCache.load(cache_path, key)
+        return meter_colors
+
+    @staticmethod
+    def _parse_into_caches(path: Path, key: str) -> None:
+        data, meter_colors = SwitchLogParser.parse_with_meter_colors(path)
+        ColumnarCache.save(path.with_suffix('.parsed.bin'), key, data)
+        ColumnarCache.save(path.with_suffix('.meter.bin'), key, meter_colors, ColumnarCache.METER_COLOR_COLUMN_DTYPES)
+
+    @staticmethod
+    @traced('plotter')
+    def parse(path: Path, block_size: int = BLOCK_SIZE_BYTES) -> pd.DataFrame:
+        """Parses all "Egress data" log entries; the log file is processed in large blocks to keep parsing linear."""
+        return SwitchLogParser._to_frame([array for array, _ in SwitchLogParser._parse_blocks(path, block_size)])
+
+    @staticmethod
+    def parse_chunks(path: Path, block_size: int = BLOCK_SIZE_BYTES) -> Iterator[pd.DataFrame]:
+        """Parses the log file lazily: yields the "Egress data" log entries of each block as a separate DataFrame."""
+        for array, _ in SwitchLogParser._parse_blocks(path, block_size):
+            if array.shape[0] > 0:
+                yield pd.DataFrame(array, columns=SwitchLogParser.COLUMNS)
+
+    @staticmethod
+    def parse_chunks_from(path: Path, offset: int,
+                          block_size: int = BLOCK_SIZE_BYTES) -> Iterator[Tuple[pd.DataFrame, int]]:
+        """
+        Parses the complete lines after a byte offset of a (possibly still growing) log file.
+        Yields the log entries of each block and the offset from which the parsing can be resumed later.
+        """
+        for array, end_offset in SwitchLogParser._parse_blocks(path, block_size, offset, include_incomplete_line=False):
+            yield pd.DataFrame(array, columns=SwitchLogParser.COLUMNS), end_offset
+
+    @staticmethod
+    @traced('plotter')
+    def parse_meter_colors(path: Path, block_size: int = BLOCK_SIZE_BYTES) -> pd.DataFrame:
+        """
+        Parses all "Meter color" log entries. Unlike the egress timestamps, their time is the wall-clock time of bmv2's
+        logger, which has a millisecond resolution (and wraps around at midnight, which is not handled).
+        """
+        arrays = [SwitchLogParser._parse_meter_colors_in_block(block)
+                  for block, _ in SwitchLogParser._read_blocks(path, block_size)]
+        return SwitchLogParser._to_meter_color_frame(arrays)
+
+    @staticmethod
+    @traced('plotter')
+    def parse_with_meter_colors(path: Path, block_size: int = BLOCK_SIZE_BYTES) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Same as parse and parse_meter_colors, but each block of the log file is only read once for both."""
+        arrays, meter_color_arrays = [], []
+        for block, _ in SwitchLogParser._read_blocks(path, block_size):
+            arrays.append(SwitchLogParser._parse_block(block))
+            meter_color_arrays.append(SwitchLogParser._parse_meter_colors_in_block(block))
+        return SwitchLogParser._to_frame(arrays), SwitchLogParser._to_meter_color_frame(meter_color_arrays)
+
+    @staticmethod
+    def parse_chunks_with_meter_colors(path: Path, block_size: int = BLOCK_SIZE_BYTES) \
+            -> Iterator[Tuple[pd.DataFrame, pd.DataFrame]]:
+        """Same as parse_chunks, but also yields the "Meter color" log entries of each block."""
+        for block, _ in SwitchLogParser._read_blocks(path, block_size):
+            yield (pd.DataFrame(SwitchLogParser._parse_block(block), columns=SwitchLogParser.COLUMNS),
+                   SwitchLogParser._to_meter_color_frame([SwitchLogParser._parse_meter_colors_in_block(block)]))
+
+    @staticmethod
+    def _to_frame(arrays: List[np.ndarray]) -> pd.DataFrame:
+        if len(arrays) == 0:
+            arrays = [np.empty((0, len(SwitchLogParser.COLUMNS)), dtype=np.int64)]
+        return pd.DataFrame(np.concatenate(arrays), columns=SwitchLogParser.COLUMNS)
+
+    @staticmethod
+    def _to_meter_color_frame(arrays: List[np.ndarray]) -> pd.DataFrame:
+        if len(arrays) == 0:
+            arrays = [np.empty((0, len(SwitchLogParser.METER_COLOR_COLUMNS)), dtype=np.int64)]
+        return pd.DataFrame(np.concatenate(arrays), columns=SwitchLogParser.METER_COLOR_COLUMNS)
+
+    @staticmethod
+    def _parse_meter_colors_in_block(block: bytes) -> np.ndarray:
+        matches = SwitchLogParser._METER_COLOR_TIME_PATTERN.findall(block)
+        if len(matches) == 0:
+            return np.empty((0, len(SwitchLogParser.METER_COLOR_COLUMNS)), dtype=np.int64)
+        hours, minutes, seconds, milliseconds, vq_ids, colors = np.array(matches, dtype=np.bytes_).astype(np.int64).T
+        times = ((hours * 60 + minutes) * 60 + seconds) * 1_000_000 + milliseconds * 1_000
+        return np.stack([times, vq_ids, colors], axis=1)
+
+    @staticmethod
+    def _parse_blocks(path: Path, block_size: int, start_offset: int = 0,
+                      include_incomplete_line: bool = True) -> Iterator[Tuple[np.ndarray, int]]:
+        """Yields the parsed rows of each block of the log file and the offset after the block's last parsed line."""
+        for block, offset in SwitchLogParser._read_blocks(path, block_size, start_offset, include_incomplete_line):
+            yield SwitchLogParser._parse_block(block), offset
+
+    @staticmethod
+    def _read_blocks(path: Path, block_size: int, start_offset: int = 0,
+                     include_incomplete_line: bool = True) -> Iterator[Tuple[bytes, int]]:
+        """
+        Yields each block of the log file and the offset after the block's last line.
+        Blocks are split at line boundaries; the incomplete last line of the file is optional.
+        """
+        with open(path, 'rb') as f:
+            f.seek(start_offset)
+            offset = start_offset
+            incomplete_line = b''
+            while True:
+                block = f.read(block_size)
+                if not block:
+                    break
+                block = incomplete_line + block
+                end = block.rfind(b'\n') + 1  # The last line might continue in the next block
+                incomplete_line = block[end:]
+                if end > 0:
+                    offset += end
+                    yield block[:end], offset
+            if incomplete_line and include_incomplete_line:
+                yield incomplete_line, offset + len(incomplete_line)
+
+    @staticmethod
+    def _parse_block(block: bytes) -> np.ndarray:
+        """Parses the complete lines of a block into an int64 array: one row per "Egress data" log entry."""
+        matches = SwitchLogParser._EGRESS_DATA_PATTERN.findall(block)
+        if len(matches) == 0:
+            return np.empty((0, len(SwitchLogParser.COLUMNS)), dtype=np.int64)
+        return np.array(matches, dtype=np.bytes_).astype(np.int64)
@@ -1,36 +1,51 @@
 from pathlib import Path
-from typing import Dict, Union, Iterable, Iterator, Any, Tuple, TypeVar
+from typing import Dict, Union, Iterable, Iterator, Any, Tuple, TypeVar, List
 
 import matplotlib
 import numpy as np
-import pandas as pd
 import matplotlib.pyplot as plt
 from matplotlib.axes import Axes
+from matplotlib.figure import Figure
 
-from plotter.constants import FlowType, MAX_QUEUE_DELAY_MS
+from plotter.constants import FlowType, MAX_QUEUE_DELAY_MS, METER_COLORS
+from plotter.stats import mean_confidence_interval_95
+from plotter.summary import MeasurementSummary
+from plotter.timeseries import MeasurementTimeSeries, TIME_SERIES_PERCENTILES
 
 
-def plot_flow_type_vs_sum_packet_length_boxplot(name_to_data: Dict[str, pd.DataFrame], plot_dir: Path) -> None:
-    name_to_data_group_sum = dict()
-    for name, data in name_to_data.items():
-        data_group_sum = data[["flow_id", "packet_length", "flow_type"]]
-        data_group_sum = data_group_sum.groupby(["flow_id", "flow_type"], as_index=False).sum()
-        data_group_sum = data_group_sum.rename(columns={"packet_length": "sum(packet_length)"})
-        name_to_data_group_sum[name] = data_group_sum
+def get_flow_type_names(measurements: Iterable[Union[MeasurementSummary, MeasurementTimeSeries]]) -> List[str]:
+    """The flow types of all measurements, in order: each one is plotted in its own subplot."""
+    names: List[str] = []
+    for measurement in measurements:
+        names += [str(name) for name in measurement.flow_type_names if str(name) not in names]
+    return names
 
-    fig, axes = plt.subplots(1, len(FlowType))
+
+def create_flow_type_subplots(flow_type_names: List[str], extra_count: int = 0,
+                              **subplots_kwargs: Any) -> Tuple[Figure, List[Axes]]:
+    """A row of subplots: the extra ones first, then one for each flow type; wider if there are many of them."""
+    count = extra_count + len(flow_type_names)
+    fig, axes = plt.subplots(1, count, squeeze=False, figsize=(max(6.4, 3.2 * count), 4.8), **subplots_kwargs)
+    return fig, list(axes[0])
+
+
+def plot_flow_type_vs_sum_packet_length_boxplot(name_to_summary: Dict[str, MeasurementSummary],
+                                                plot_dir: Path) -> None:
+    flow_type_names = get_flow_type_names(name_to_summary.values())
+    fig, axes = create_flow_type_subplots(flow_type_names)
     fig.suptitle("Sum of Flow Packet Lengths for Different Flow Types")
     axes[0].set_ylabel("Flow Size [KBs]")
 
-    for ax, flow_type in zip(axes, FlowType):
+    for ax, flow_type_name in zip(axes, flow_type_names):
         ax: Axes = ax  # Type hint
-        ax.set_title(f"'{flow_type.name.capitalize()}' Flows")
+        ax.set_title(f"'{flow_type_name.capitalize()}' Flows")
 
         x, labels = [], []
-        for name, data_group_sum in name_to_data_group_sum.items():
+        for name, summary in name_to_summary.items():
             labels.append(name)
-            values = data_group_sum[data_group_sum.flow_type == flow_type.value]["sum(packet_length)"]
-            values /= 1_000  # Convert bytes to kilobytes
+            flow_type = summary.get_flow_type(flow_type_name)
+            # A measurement of another scenario might not have this flow type
+            values = summary.get_flow_lengths(flow_type) / 1_000 if flow_type is not None else np.array([])
             x.append(values)
         ax.boxplot(x, labels=labels)
         ax.tick_params(axis='x', labelrotation=45)
@@ -39,8 +54,9 @@ def plot_flow_type_vs_sum_packet_length_boxplot(name_to_data: Dict[str, pd.DataF
     fig.savefig(f"{plot_dir}/sum_packet_length_boxplot.pdf")
 
 
-def plot_flow_type_vs_queue_delay_cdf(name_to_data: Dict[str, pd.DataFrame], plot_dir: Path) -> None:
-    fig, axes = plt.subplots(1, len(FlowType), sharey='all', sharex='all')
+def plot_flow_type_vs_queue_delay_cdf(name_to_summary: Dict[str, MeasurementSummary], plot_dir: Path) -> None:
+    flow_type_names = get_flow_type_names(name_to_summary.values())
+    fig, axes = create_flow_type_subplots(flow_type_names, sharey='all', sharex='all')
     fig.suptitle("Queue Delay CDF for Different Flow Types")
     axes[0].set_ylabel("Cumulative Distribution")
     axes[0].set_xlabel("Queue Delay [ms]")
@@ -49,22 +65,29 @@ def plot_flow_type_vs_queue_delay_cdf(name_to_data: Dict[str, pd.DataFrame], plo
     line_styles = MemorizingValueProvider.of_line_styles()
     colors = MemorizingValueProvider.of_colors()
 
-    for ax, flow_type in zip(axes, FlowType):
+    for ax, flow_type_name in zip(axes, flow_type_names):
         ax: Axes = ax  # Type hint
-        ax.set_title(f"'{flow_type.name.capitalize()}' Flows")
+        ax.set_title(f"'{flow_type_name.capitalize()}' Flows")
 
-        for name, data in name_to_data.items():
+        for name, summary in name_to_summary.items():
             name_without_numbers = ''.join([i for i in name if not i.isdigit()])
+            flow_type = summary.get_flow_type(flow_type_name)
+            if flow_type is None:
+                continue
+
+            if summary.run_count > 1:
+                plot_cdf_confidence_band(ax, summary, flow_type, label=name,
+                                         linestyle=line_styles.get(name_without_numbers), color=colors.get(name))
+                continue
 
             # Axes.ecdf is not available for Python 3.8 (which Ubuntu 20.04 uses)
-            values = data[data.flow_type == flow_type.value]["dequeue_timedelta"]
-            values /= 1_000  # Convert microseconds to milliseconds
-            if len(values) == 0:
+            # The summary has already binned the data and sorted the bins
+            x, counts = summary.get_delay_distribution(flow_type)
+            x = x / 1_000  # Convert microseconds to milliseconds
+            if len(x) == 0:
                 print(f'WARNING: No data in {name} for the {flow_type.name} flow type. Skipping.')
                 continue
 
-            # Handles duplicates and sorts the data
-            x, counts = np.unique(values, return_counts=True)
             cumulative_sum = np.cumsum(counts)
             y = cumulative_sum / cumulative_sum[-1]
             # Forces a jump at smallest data value
@@ -79,6 +102,178 @@ def plot_flow_type_vs_queue_delay_cdf(name_to_data: Dict[str, pd.DataFrame], plo
     fig.savefig(f"{plot_dir}/queue_delay_cdf.pdf")
 
 
+def plot_vq_meter_color_share_bar(name_to_summary: Dict[str, MeasurementSummary], plot_dir: Path) -> None:
+    # Only the VQ variants log the meter colors
+    name_to_counts = {name: summary.color_counts.sum(axis=0) for name, summary in name_to_summary.items()}
+    name_to_counts = {name: counts for name, counts in name_to_counts.items() if counts.sum() > 0}
+    if len(name_to_counts) == 0:
+        print('WARNING: No meter colors have been logged. Skipping the VQ meter color plot.')
+        return
+
+    fig, ax = plt.subplots()
+    ax: Axes = ax  # Type hint
+    fig.suptitle("Share of the VQ Meter Colors")
+    ax.set_ylabel("Share of Packets")
+
+    names = list(name_to_counts.keys())
+    shares = np.array([counts / counts.sum() for counts in name_to_counts.values()])
+    bottom = np.zeros(len(names))
+    for color_index, color in enumerate(METER_COLORS):
+        ax.bar(names, shares[:, color_index], bottom=bottom, label=color.capitalize(), color=color)
+        bottom += shares[:, color_index]
+    ax.tick_params(axis='x', labelrotation=45)
+    ax.legend()
+
+    fig.tight_layout()
+    fig.savefig(f"{plot_dir}/vq_meter_color_share.pdf")
+
+
+def plot_vq_collision_rate_bar(name_to_summary: Dict[str, MeasurementSummary], plot_dir: Path) -> None:
+    # Only the variants with per-flow VQs can have collisions
+    name_to_rate = {name: summary.get_vq_collision_rate() for name, summary in name_to_summary.items()}
+    name_to_rate = {name: rate for name, rate in name_to_rate.items() if not np.isnan(rate)}
+    if len(name_to_rate) == 0:
+        print('WARNING: No measurement has per-flow VQs. Skipping the VQ collision rate plot.')
+        return
+
+    fig, ax = plt.subplots()
+    ax: Axes = ax  # Type hint
+    fig.suptitle("VQ Collisions: Share of Packets in VQs Shared by Multiple Flows")
+    ax.set_ylabel("Share of Packets")
+    ax.set_ylim(0, 1.05)
+
+    ax.bar(list(name_to_rate.keys()), list(name_to_rate.values()))
+    ax.tick_params(axis='x', labelrotation=45)
+
+    fig.tight_layout()
+    fig.savefig(f"{plot_dir}/vq_collision_rate.pdf")
+
+
+def plot_flow_type_throughput_time_series(name_to_time_series: Dict[str, MeasurementTimeSeries],
+                                          plot_dir: Path) -> None:
+    flow_type_names = get_flow_type_names(name_to_time_series.values())
+    fig, axes = create_flow_type_subplots(flow_type_names, sharey='all', sharex='all')
+    fig.suptitle("Throughput over Time for Different Flow Types")
+    axes[0].set_ylabel("Throughput [Mbps]")
+    axes[0].set_xlabel("Time [s]")
+
+    colors = MemorizingValueProvider.of_colors()
+    for ax, flow_type_name in zip(axes, flow_type_names):
+        ax: Axes = ax  # Type hint
+        ax.set_title(f"'{flow_type_name.capitalize()}' Flows")
+        for name, time_series in name_to_time_series.items():
+            if flow_type_name not in time_series.flow_type_names:
+                continue
+            flow_type_index = time_series.flow_type_names.index(flow_type_name)
+            ax.plot(get_window_centers_seconds(time_series), time_series.flow_type_throughputs[flow_type_index],
+                    label=name, color=colors.get(name))
+
+    axes[0].legend()
+    fig.tight_layout()
+    fig.savefig(f"{plot_dir}/throughput_time_series.pdf")
+
+
+def plot_fairness_time_series(name_to_time_series: Dict[str, MeasurementTimeSeries], plot_dir: Path) -> None:
+    flow_type_names = get_flow_type_names(name_to_time_series.values())
+    fig, axes = create_flow_type_subplots(flow_type_names, extra_count=1, sharey='all', sharex='all')
+    fig.suptitle("Jain's Fairness Index over Time")
+    axes[0].set_ylabel("Fairness Index")
+    axes[0].set_xlabel("Time [s]")
+    axes[0].set_ylim(0, 1.05)
+
+    colors = MemorizingValueProvider.of_colors()
+    axes[0].set_title("VQs")
+    for ax, flow_type_name in zip(axes[1:], flow_type_names):
+        ax.set_title(f"'{flow_type_name.capitalize()}' Flows")
+    for name, time_series in name_to_time_series.items():
+        x = get_window_centers_seconds(time_series)
+        axes[0].plot(x, time_series.vq_fairness, label=name, color=colors.get(name))
+        for flow_type_index, flow_type_name in enumerate(time_series.flow_type_names):
+            ax = axes[1 + flow_type_names.index(flow_type_name)]
+            ax.plot(x, time_series.flow_fairness[flow_type_index], label=name, color=colors.get(name))
+
+    axes[0].legend()
+    fig.tight_layout()
+    fig.savefig(f"{plot_dir}/fairness_time_series.pdf")
+
+
+def plot_flow_type_queue_delay_time_series(name_to_time_series: Dict[str, MeasurementTimeSeries],
+                                           plot_dir: Path) -> None:
+    flow_type_names = get_flow_type_names(name_to_time_series.values())
+    fig, axes = create_flow_type_subplots(flow_type_names, sharey='all', sharex='all')
+    fig.suptitle("Queue Delay Percentiles over Time for Different Flow Types")
+    axes[0].set_ylabel("Queue Delay [ms]")
+    axes[0].set_xlabel("Time [s]")
+    axes[0].set_ylim(-3, MAX_QUEUE_DELAY_MS + 3)  # padding: +-3
+
+    colors = MemorizingValueProvider.of_colors()
+    line_styles = MemorizingValueProvider.of_line_styles()
+    for ax, flow_type_name in zip(axes, flow_type_names):
+        ax: Axes = ax  # Type hint
+        ax.set_title(f"'{flow_type_name.capitalize()}' Flows")
+        for name, time_series in name_to_time_series.items():
+            if flow_type_name not in time_series.flow_type_names:
+                continue
+            flow_type_index = time_series.flow_type_names.index(flow_type_name)
+            x = get_window_centers_seconds(time_series)
+            for percentile_index, percentile in enumerate(TIME_SERIES_PERCENTILES):
+                y = time_series.delay_percentiles[flow_type_index, percentile_index] / 1_000  # Convert to milliseconds
+                ax.plot(x, y, label=f'{name} (p{percentile:g})', color=colors.get(name),
+                        linestyle=line_styles.get(percentile))
+
+    axes[0].legend()
+    fig.tight_layout()
+    fig.savefig(f"{plot_dir}/queue_delay_time_series.pdf")
+
+
+def plot_vq_color_time_series(name_to_time_series: Dict[str, MeasurementTimeSeries], plot_dir: Path) -> None:
+    # Only the VQ variants log the meter colors
+    name_to_time_series = {name: time_series for name, time_series in name_to_time_series.items()
+                           if time_series.color_shares is not None}
+    if len(name_to_time_series) == 0:
+        print('WARNING: No meter colors have been logged. Skipping the VQ meter color time series plot.')
+        return
+
+    # Yellow packets are ECN marked, red packets are dropped by the VQs
+    color_indexes = [METER_COLORS.index('yellow'), METER_COLORS.index('red')]
+    fig, axes = plt.subplots(1, len(color_indexes), sharey='all', sharex='all')
+    fig.suptitle("ECN Marking and Drop Rates of the VQs over Time")
+    axes[0].set_ylabel("Share of Metered Packets")
+    axes[0].set_xlabel("Time (Wall Clock) [s]")
+    axes[0].set_title("ECN Marked (Yellow)")
+    axes[1].set_title("Dropped (Red)")
+
+    colors = MemorizingValueProvider.of_colors()
+    for name, time_series in name_to_time_series.items():
+        x = (time_series.color_window_starts + time_series.window_length_us / 2) / 1_000_000
+        for ax, color_index in zip(axes, color_indexes):
+            ax.plot(x, time_series.color_shares[color_index], label=name, color=colors.get(name))
+
+    axes[0].legend()
+    fig.tight_layout()
+    fig.savefig(f"{plot_dir}/vq_color_time_series.pdf")
+
+
+def get_window_centers_seconds(time_series: MeasurementTimeSeries) -> np.ndarray:
+    return (time_series.window_starts + time_series.window_length_us / 2) / 1_000_000
+
+
+def plot_cdf_confidence_band(ax: Axes, summary: MeasurementSummary, flow_type: FlowType, label: str,
+                             **line_kwargs: Any) -> None:
+    """Plots the mean queue delay CDF of the runs of a merged summary, with the 95% confidence interval as a band."""
+    edges, cdfs = summary.get_delay_cdfs(flow_type)
+    if cdfs.shape[0] == 0:
+        print(f'WARNING: No data in {label} for the {flow_type.name} flow type. Skipping.')
+        return
+    mean, half_width = mean_confidence_interval_95(cdfs)
+    x = np.insert(edges / 1_000, 0, 0.0)  # Convert microseconds to milliseconds
+    mean = np.insert(mean, 0, 0.0)
+    half_width = np.insert(np.nan_to_num(half_width), 0, 0.0)  # No band if a single run has data
+    lines = ax.plot(x, mean, label=f'{label} (n={cdfs.shape[0]})', **line_kwargs)
+    ax.fill_between(x, np.clip(mean - half_width, 0, 1), np.clip(mean + half_width, 0, 1),
+                    color=lines[0].get_color(), alpha=0.2, linewidth=0)
+
+
 T = TypeVar('T')
 
 
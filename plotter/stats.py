@@ -0,0 +1,50 @@
+from typing import Tuple, List
+
+import numpy as np
+
+from plotter.constants import QUEUE_DELAY_BIN_WIDTH_US
+
+# Two-sided 95% critical values of Student's t-distribution, indexed by the degrees of freedom (1-30)
+# SciPy is not a dependency of the project, and the number of runs is small, so a table is sufficient
+_T_CRITICAL_VALUES_95 = np.array([
+    np.nan, 12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+    2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+    2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042,
+])
+_Z_CRITICAL_VALUE_95 = 1.960
+
+
+def t_critical_value_95(sample_count: int) -> float:
+    """The critical value of the 95% confidence interval of the mean of this many samples (at least 2)."""
+    degrees_of_freedom = sample_count - 1
+    if degrees_of_freedom < len(_T_CRITICAL_VALUES_95):
+        return float(_T_CRITICAL_VALUES_95[degrees_of_freedom])
+    return _Z_CRITICAL_VALUE_95
+
+
+def mean_confidence_interval_95(samples: np.ndarray, axis: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the mean of the samples along the axis and the half-width of its 95% confidence interval (NaN for 1 sample).
+    """
+    sample_count = samples.shape[axis]
+    mean = samples.mean(axis=axis)
+    if sample_count < 2:
+        return mean, np.full_like(mean, np.nan, dtype=np.float64)
+    standard_error = samples.std(axis=axis, ddof=1) / np.sqrt(sample_count)
+    return mean, t_critical_value_95(sample_count) * standard_error
+
+
+def histogram_percentiles(histograms: np.ndarray, percentiles: List[float]) -> np.ndarray:
+    """
+    Returns the percentiles of queue delay histograms of shape (groups, QUEUE_DELAY_BIN_COUNT, windows or runs): the
+    upper edge of the first bin at which the CDF reaches the percentile. Shape: (groups, percentiles, windows or runs),
+    NaN for empty histograms.
+    """
+    cumulative_sums = np.cumsum(histograms, axis=1)
+    totals = cumulative_sums[:, -1:, :]
+    result = np.full((histograms.shape[0], len(percentiles), histograms.shape[2]), np.nan)
+    for percentile_index, percentile in enumerate(percentiles):
+        reached = cumulative_sums >= totals * (percentile / 100)
+        bins = reached.argmax(axis=1)
+        result[:, percentile_index, :] = np.where(totals[:, 0, :] > 0, (bins + 1) * QUEUE_DELAY_BIN_WIDTH_US, np.nan)
+    return result
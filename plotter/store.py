@@ -0,0 +1,57 @@
+import dataclasses
+import os
+from pathlib import Path
+from typing import Optional, List
+
+import numpy as np
+
+from plotter.cache import ColumnarCache
+from plotter.summary import MeasurementSummary
+from tracing.tracer import traced
+
+
+class SummaryStore:
+    """
+    Persists the summary of a measurement next to its log (e.g. p4s.s1.summary.npz), keyed by the fingerprints of the
+    log and of the other files it is computed from. A summary is only recomputed if one of them has changed (or has
+    been added or removed), so replotting a sweep with one new measurement is fast.
+    """
+
+    # Increase it whenever MeasurementSummary or the way it is computed changes (e.g. the queue delay bin width)
+    VERSION = 6
+
+    @staticmethod
+    def get_store_path(log_path: Path) -> Path:
+        return log_path.with_suffix('.summary.npz')
+
+    @staticmethod
+    def get_key(log_path: Path, input_paths: List[Path]) -> str:
+        """The fingerprints of the log and of the other input files (e.g. scenario.json), which might not exist."""
+        return '/'.join(ColumnarCache.get_key(path) if path.exists() else 'absent' for path in [log_path] + input_paths)
+
+    @staticmethod
+    @traced('plotter')
+    def load(store_path: Path, key: str) -> Optional[MeasurementSummary]:
+        """Returns None if the summary does not exist or if it has been created from different inputs (or version)."""
+        if not store_path.exists():
+            return None
+        try:
+            with np.load(store_path, allow_pickle=False) as arrays:
+                if int(arrays['version']) != SummaryStore.VERSION or str(arrays['key']) != key:
+                    return None
+                fields = {field.name: arrays[field.name] for field in dataclasses.fields(MeasurementSummary)}
+        except (OSError, ValueError, KeyError):
+            return None  # E.g. a summary which has been written only partially
+        fields['entry_count'] = int(fields['entry_count'])
+        return MeasurementSummary(**fields)
+
+    @staticmethod
+    @traced('plotter')
+    def save(store_path: Path, key: str, summary: MeasurementSummary) -> None:
+        """Writes the summary atomically: concurrent readers see either the old or the new summary."""
+        temp_path = store_path.with_name(store_path.name + '.tmp')
+        with open(temp_path, 'wb') as f:
+            np.savez(f, version=np.array(SummaryStore.VERSION), key=np.array(key),
+                     **{field.name: np.asarray(getattr(summary, field.name))
+                        for field in dataclasses.fields(MeasurementSummary)})
+        os.replace(temp_path, store_path)
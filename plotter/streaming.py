@@ -0,0 +1,84 @@
+import dataclasses
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from plotter.classifier import classify_ingress_port
+from plotter.parser import SwitchLogParser
+from plotter.summary import MeasurementSummary, SummaryAccumulator, MeterColorAccumulator
+from scenario.spec import MeasurementMetadata
+
+
+class StreamingSummarizer:
+    """
+    Same as load_data + classify_ingress_port + MeasurementSummary.of_data, but one chunk of log entries at a time.
+    """
+
+    def __init__(self, metadata: MeasurementMetadata) -> None:
+        self._metadata: MeasurementMetadata = metadata
+        self._accumulator = SummaryAccumulator(metadata.flow_type_names, metadata.per_flow_vqs)
+        self._meter_color_accumulator = MeterColorAccumulator(metadata.warmup_seconds)
+        self._start_time: Optional[int] = None
+
+    def add(self, chunk: pd.DataFrame, meter_colors: Optional[pd.DataFrame] = None) -> None:
+        """Also counts the meter colors of the chunk's "Meter color" log entries, if they are given (None: no VQs)."""
+        if meter_colors is not None:
+            self._meter_color_accumulator.add(meter_colors)
+
+        # Drop the backward packets (e.g. TCP ACKs): take only packets that are outbound to an iperf server
+        client_ports = self._metadata.client_ports
+        chunk = chunk[chunk.ingress_port.isin(client_ports) & ~chunk.egress_port.isin(client_ports)]
+        if chunk.shape[0] == 0:
+            return
+
+        # Consider the timestamp of the first log entry as the epoch time
+        if self._start_time is None:
+            self._start_time = int(chunk.timestamp.iloc[0])
+
+        # Drop the first few seconds, the Mininet warmup phase
+        chunk = chunk[chunk.timestamp - self._start_time >= self._metadata.warmup_seconds * 1_000_000]
+
+        self._accumulator.add(classify_ingress_port(chunk.reset_index(drop=True), self._metadata.flow_type_ports))
+
+    def summarize(self) -> MeasurementSummary:
+        # Drop the smallest flows: they are iperf meta flows, and they would be outliers in the graphs
+        summary = self._accumulator.summarize(drop_smallest_flow_count=self._metadata.meta_flow_count)
+        color_counts = self._meter_color_accumulator.get_color_counts(self.get_vq_ids())
+        return dataclasses.replace(summary, color_counts=color_counts[np.newaxis])
+
+    def get_vq_ids(self) -> np.ndarray:
+        """The VQs of the summarized log entries."""
+        return self._accumulator.get_vq_ids(drop_smallest_flow_count=self._metadata.meta_flow_count)
+
+
+class IncrementalSummarizer:
+    """Summarizes a growing switch log: each update only parses the bytes that have been appended since the last one."""
+
+    def __init__(self, switch_log_path: Path, metadata: MeasurementMetadata) -> None:
+        self._switch_log_path: Path = switch_log_path
+        self._metadata: MeasurementMetadata = metadata
+        self._offset: int = 0  # The log has been processed up until this byte
+        self._inode: Optional[int] = None  # Of the processed log file
+        self._summarizer = StreamingSummarizer(metadata)
+
+    def update(self) -> int:
+        """Processes the new complete lines of the log; returns how many new bytes have been processed."""
+        if not self._switch_log_path.exists():
+            return 0
+        stat = self._switch_log_path.stat()
+        if stat.st_size < self._offset or (self._inode is not None and stat.st_ino != self._inode):
+            # The log has been truncated or replaced (e.g. a new measurement has been started): start over
+            self._offset = 0
+            self._summarizer = StreamingSummarizer(self._metadata)
+        self._inode = stat.st_ino
+
+        offset = self._offset
+        for chunk, offset in SwitchLogParser.parse_chunks_from(self._switch_log_path, self._offset):
+            self._summarizer.add(chunk)
+        new_bytes, self._offset = offset - self._offset, offset
+        return new_bytes
+
+    def summarize(self) -> MeasurementSummary:
+        return self._summarizer.summarize()
@@ -0,0 +1,290 @@
+from dataclasses import dataclass, field
+from typing import Tuple, List, Sequence, Optional
+
+import numpy as np
+import pandas as pd
+
+from plotter.constants import FlowType, QUEUE_DELAY_BIN_WIDTH_US, QUEUE_DELAY_BIN_COUNT, METER_COLORS, \
+    DEFAULT_FLOW_TYPE_NAMES
+from plotter.stats import histogram_percentiles
+from tracing.tracer import traced
+
+
+@dataclass
+class MeasurementSummary:
+    """
+    The aggregates the plots are generated from; much smaller than the log entries of a measurement.
+    Summaries of repeated runs of a measurement can be merged: they keep a runs dimension.
+    """
+    entry_count: int
+    # One element per (run, flow ID, flow type)
+    flow_runs: np.ndarray
+    flow_ids: np.ndarray
+    flow_types: np.ndarray
+    flow_lengths: np.ndarray  # Sum of the packet lengths in bytes
+    # Shape: (runs, flow types, QUEUE_DELAY_BIN_COUNT), how many log entries have a queue delay in each bin
+    delay_histograms: np.ndarray
+    # The names of the flow types (i.e. the flow classes of the scenario), flow type i + 1 is the i-th one
+    flow_type_names: np.ndarray = field(default_factory=lambda: np.array(DEFAULT_FLOW_TYPE_NAMES))
+    # Shape: (runs, meter colors), how many packets the VQs have marked with each color (see METER_COLORS)
+    color_counts: np.ndarray = field(default_factory=lambda: np.zeros((1, len(METER_COLORS)), dtype=np.int64))
+    # Shape: (runs, 2), how many VQs have been used, and how many of them by multiple flows (i.e. collisions)
+    # A flow is identified by its ingress port and flow ID, which is a lower bound of the distinct 5-tuples
+    vq_counts: np.ndarray = field(default_factory=lambda: np.zeros((1, 2), dtype=np.int64))
+    # Shape: (runs, 2), how many log entries there are, and how many of them belong to a VQ used by multiple flows
+    # Without per-flow VQs (no-vq, per-port-vq), the VQs are shared by design: there are no collisions, both are 0
+    vq_entry_counts: np.ndarray = field(default_factory=lambda: np.zeros((1, 2), dtype=np.int64))
+
+    @property
+    def run_count(self) -> int:
+        return self.delay_histograms.shape[0]
+
+    def get_flow_types(self) -> List[FlowType]:
+        return [FlowType(index + 1, str(name)) for index, name in enumerate(self.flow_type_names)]
+
+    def get_flow_type(self, name: str) -> Optional[FlowType]:
+        """None if the scenario of the measurement has no flow type with this name."""
+        return next((flow_type for flow_type in self.get_flow_types() if flow_type.name == name), None)
+
+    def get_flow_count(self, flow_type: FlowType) -> int:
+        return int((self.flow_types == flow_type.value).sum())
+
+    def get_flow_lengths(self, flow_type: FlowType) -> np.ndarray:
+        return self.flow_lengths[self.flow_types == flow_type.value]
+
+    def get_delay_distribution(self, flow_type: FlowType) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the lower edges of the non-empty queue delay bins (sorted) and their counts, summed over the runs."""
+        counts = self.delay_histograms[:, MeasurementSummary._flow_type_index(flow_type)].sum(axis=0)
+        bins = np.flatnonzero(counts)
+        return bins * QUEUE_DELAY_BIN_WIDTH_US, counts[bins]
+
+    def get_delay_cdfs(self, flow_type: FlowType) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the upper edges of the queue delay bins and the CDF of each run at those edges.
+        Shape of the CDFs: (runs with entries of this flow type, QUEUE_DELAY_BIN_COUNT).
+        """
+        histograms = self.delay_histograms[:, MeasurementSummary._flow_type_index(flow_type)]
+        histograms = histograms[histograms.sum(axis=1) > 0]
+        cumulative_sums = np.cumsum(histograms, axis=1)
+        edges = (np.arange(QUEUE_DELAY_BIN_COUNT) + 1) * QUEUE_DELAY_BIN_WIDTH_US
+        return edges, cumulative_sums / cumulative_sums[:, -1:]
+
+    def get_delay_percentiles(self, flow_type: FlowType, percentiles: List[float]) -> np.ndarray:
+        """
+        Returns the queue delay percentiles of each run (the upper edges of the bins, microseconds).
+        Shape: (runs, percentiles), NaN for the runs without entries of this flow type.
+        """
+        histograms = self.delay_histograms[:, MeasurementSummary._flow_type_index(flow_type)]
+        return histogram_percentiles(histograms.T[np.newaxis], percentiles)[0].T
+
+    def get_flow_length_percentiles(self, flow_type: FlowType, percentiles: List[float]) -> np.ndarray:
+        """
+        Returns the flow length percentiles of each run (bytes).
+        Shape: (runs, percentiles), NaN for the runs without flows of this flow type.
+        """
+        result = np.full((self.run_count, len(percentiles)), np.nan)
+        flow_type_mask = self.flow_types == flow_type.value
+        for run in range(self.run_count):
+            flow_lengths = self.flow_lengths[flow_type_mask & (self.flow_runs == run)]
+            if len(flow_lengths) > 0:
+                result[run] = np.percentile(flow_lengths, percentiles)
+        return result
+
+    def get_vq_collision_rate(self) -> float:
+        """
+        The share of the log entries whose VQ has been shared by multiple flows, e.g. because of hash collisions.
+        NaN without per-flow VQs.
+        """
+        entry_count, shared_entry_count = self.vq_entry_counts.sum(axis=0)
+        return float(shared_entry_count / entry_count) if entry_count > 0 else np.nan
+
+    @staticmethod
+    @traced('plotter')
+    def of_data(data: pd.DataFrame, flow_type_names: Sequence[str] = tuple(DEFAULT_FLOW_TYPE_NAMES),
+                per_flow_vqs: Optional[bool] = None) -> 'MeasurementSummary':
+        """Summarizes log entries that have already been filtered and classified."""
+        accumulator = SummaryAccumulator(flow_type_names, per_flow_vqs)
+        accumulator.add(data)
+        return accumulator.summarize(drop_smallest_flow_count=0)
+
+    @staticmethod
+    @traced('plotter')
+    def merge(summaries: Sequence['MeasurementSummary']) -> 'MeasurementSummary':
+        """Merges the summaries of repeated runs (e.g. of the same configuration) into one summary."""
+        if any(list(summary.flow_type_names) != list(summaries[0].flow_type_names) for summary in summaries):
+            raise ValueError('Only the summaries of the same scenario (i.e. flow types) can be merged')
+        flow_runs, run_offset = [], 0
+        for summary in summaries:
+            flow_runs.append(summary.flow_runs + run_offset)
+            run_offset += summary.run_count
+        return MeasurementSummary(
+            entry_count=sum(summary.entry_count for summary in summaries),
+            flow_runs=np.concatenate(flow_runs),
+            flow_ids=np.concatenate([summary.flow_ids for summary in summaries]),
+            flow_types=np.concatenate([summary.flow_types for summary in summaries]),
+            flow_lengths=np.concatenate([summary.flow_lengths for summary in summaries]),
+            delay_histograms=np.concatenate([summary.delay_histograms for summary in summaries]),
+            flow_type_names=summaries[0].flow_type_names,
+            color_counts=np.concatenate([summary.color_counts for summary in summaries]),
+            vq_counts=np.concatenate([summary.vq_counts for summary in summaries]),
+            vq_entry_counts=np.concatenate([summary.vq_entry_counts for summary in summaries]),
+        )
+
+    @staticmethod
+    def _flow_type_index(flow_type: FlowType) -> int:
+        return flow_type.value - 1
+
+
+class SummaryAccumulator:
+    """
+    Aggregates classified log entries chunk by chunk: the memory usage depends on the flows, not the log length.
+    Whether the variant has per-flow VQs is guessed from the log entries if it is unknown (see MeasurementMetadata).
+    """
+
+    def __init__(self, flow_type_names: Sequence[str] = tuple(DEFAULT_FLOW_TYPE_NAMES),
+                 per_flow_vqs: Optional[bool] = None) -> None:
+        self._flow_type_names: List[str] = list(flow_type_names)
+        self._per_flow_vqs: Optional[bool] = per_flow_vqs
+        self._entry_count: int = 0
+        # Indexed by (flow_id, flow_type)
+        self._flow_lengths: pd.Series = pd.Series([], dtype=np.int64)
+        # Indexed by (flow_id, flow_type, delay_bin)
+        self._delay_counts: pd.Series = pd.Series([], dtype=np.int64)
+        # Indexed by (flow_id, vq_id, ingress_port)
+        self._vq_flow_counts: pd.Series = pd.Series([], dtype=np.int64)
+        # Indexed by (egress_port, vq_id)
+        self._egress_port_vq_counts: pd.Series = pd.Series([], dtype=np.int64)
+
+    def add(self, data: pd.DataFrame) -> None:
+        if data.shape[0] == 0:
+            return
+        self._entry_count += data.shape[0]
+        # The columns might be compact (see compact_array in plotter/compact.py):
+        # the sums of the packet lengths need a wider type
+        packet_lengths = pd.Series(data.packet_length.to_numpy(dtype=np.int64), index=data.index, name="packet_length")
+        flow_lengths = packet_lengths.groupby([data.flow_id, data.flow_type], observed=True).sum()
+        delay_bins = np.minimum(data.dequeue_timedelta.to_numpy() // QUEUE_DELAY_BIN_WIDTH_US,
+                                QUEUE_DELAY_BIN_COUNT - 1)
+        delay_counts = data.groupby([data.flow_id, data.flow_type, pd.Series(delay_bins, index=data.index,
+                                                                              name="delay_bin")], observed=True).size()
+        self._flow_lengths = SummaryAccumulator._merge(self._flow_lengths, flow_lengths)
+        self._delay_counts = SummaryAccumulator._merge(self._delay_counts, delay_counts)
+        vq_flow_counts = data.groupby(["flow_id", "vq_id", "ingress_port"]).size()
+        self._vq_flow_counts = SummaryAccumulator._merge(self._vq_flow_counts, vq_flow_counts)
+        egress_port_vq_counts = data.groupby(["egress_port", "vq_id"]).size()
+        self._egress_port_vq_counts = SummaryAccumulator._merge(self._egress_port_vq_counts, egress_port_vq_counts)
+
+    def summarize(self, drop_smallest_flow_count: int) -> MeasurementSummary:
+        """Summarizes the log entries added so far, without the smallest flows (e.g. the iperf meta flows)."""
+        flow_lengths, delay_counts, vq_flow_counts = self._flow_lengths, self._delay_counts, self._vq_flow_counts
+        entry_count = self._entry_count
+
+        if drop_smallest_flow_count > 0 and len(flow_lengths) > 0:
+            to_drop_flows = self._get_smallest_flow_ids(drop_smallest_flow_count)
+            flow_lengths = flow_lengths[~flow_lengths.index.get_level_values("flow_id").isin(to_drop_flows)]
+            dropped_delay_counts = delay_counts.index.get_level_values("flow_id").isin(to_drop_flows)
+            entry_count -= int(delay_counts[dropped_delay_counts].sum())
+            delay_counts = delay_counts[~dropped_delay_counts]
+            vq_flow_counts = vq_flow_counts[~vq_flow_counts.index.get_level_values("flow_id").isin(to_drop_flows)]
+
+        # The flow IDs are no longer needed for the queue delays
+        delay_histograms = np.zeros((1, len(self._flow_type_names), QUEUE_DELAY_BIN_COUNT), dtype=np.int64)
+        flow_type_indexes = SummaryAccumulator._level_values(delay_counts, "flow_type") - 1
+        np.add.at(delay_histograms[0],
+                  (flow_type_indexes, SummaryAccumulator._level_values(delay_counts, "delay_bin")),
+                  delay_counts.to_numpy(dtype=np.int64))
+
+        # The VQs used by multiple flows
+        vq_flow_count = vq_flow_counts.groupby(level="vq_id").size()
+        vq_entry_count = vq_flow_counts.groupby(level="vq_id").sum()
+        shared_vqs = vq_flow_count > 1
+        vq_entry_counts = [int(vq_entry_count.sum()), int(vq_entry_count[shared_vqs].sum())]
+        if not (self._per_flow_vqs if self._per_flow_vqs is not None else self._guess_per_flow_vqs()):
+            shared_vqs[:] = False
+            vq_entry_counts = [0, 0]
+
+        return MeasurementSummary(
+            entry_count=entry_count,
+            flow_runs=np.zeros(len(flow_lengths), dtype=np.int64),
+            flow_ids=SummaryAccumulator._level_values(flow_lengths, "flow_id"),
+            flow_types=SummaryAccumulator._level_values(flow_lengths, "flow_type"),
+            flow_lengths=flow_lengths.to_numpy(dtype=np.int64),
+            delay_histograms=delay_histograms,
+            flow_type_names=np.array(self._flow_type_names),
+            vq_counts=np.array([[len(vq_flow_count), int(shared_vqs.sum())]], dtype=np.int64),
+            vq_entry_counts=np.array([vq_entry_counts], dtype=np.int64),
+        )
+
+    def get_vq_ids(self, drop_smallest_flow_count: int) -> np.ndarray:
+        """The VQs of the log entries added so far, without the ones only used by the smallest flows."""
+        vq_flow_counts = self._vq_flow_counts
+        if drop_smallest_flow_count > 0 and len(vq_flow_counts) > 0:
+            to_drop_flows = self._get_smallest_flow_ids(drop_smallest_flow_count)
+            vq_flow_counts = vq_flow_counts[~vq_flow_counts.index.get_level_values("flow_id").isin(to_drop_flows)]
+        return np.unique(SummaryAccumulator._level_values(vq_flow_counts, "vq_id"))
+
+    def _guess_per_flow_vqs(self) -> bool:
+        """
+        Whether the VQ of a log entry depends on more than its egress port: no-vq uses a single VQ, per-port-vq a VQ per
+        egress port (see MyIngress in logic.p4). It misses per-flow VQs if all flows of each port have collided.
+        """
+        vq_counts = self._egress_port_vq_counts.groupby(level="egress_port").size()
+        return bool((vq_counts > 1).any())
+
+    def _get_smallest_flow_ids(self, count: int) -> pd.Index:
+        flow_id_lengths = self._flow_lengths.groupby(level="flow_id").sum()
+        return flow_id_lengths.sort_values(ascending=True).head(count).index
+
+    @staticmethod
+    def _merge(aggregate: pd.Series, addition: pd.Series) -> pd.Series:
+        if len(aggregate) == 0:
+            return addition
+        levels: List[str] = list(addition.index.names)
+        # Only the observed flow types: the flow_type level might be categorical
+        return pd.concat([aggregate, addition]).groupby(level=levels, observed=True).sum()
+
+    @staticmethod
+    def _level_values(series: pd.Series, level: str) -> np.ndarray:
+        if len(series) == 0:
+            return np.empty(0, dtype=np.int64)
+        return series.index.get_level_values(level).to_numpy(dtype=np.int64)
+
+
+class MeterColorAccumulator:
+    """
+    Counts the "Meter color" log entries of each VQ chunk by chunk (see SwitchLogParser.parse_meter_colors), without
+    the warmup phase. Like in MeasurementTimeSeries, the first entry is the epoch time: they are timed by another clock
+    than the "Egress data" log entries.
+    """
+
+    def __init__(self, warmup_seconds: float) -> None:
+        self._warmup_us: int = round(warmup_seconds * 1_000_000)
+        self._start_time: Optional[int] = None
+        # Indexed by (vq_id, color)
+        self._vq_color_counts: pd.Series = pd.Series([], dtype=np.int64)
+
+    def add(self, meter_colors: pd.DataFrame) -> None:
+        if meter_colors.shape[0] == 0:
+            return
+        times = meter_colors.time.to_numpy(dtype=np.int64)
+        if self._start_time is None:
+            self._start_time = int(times[0])
+        meter_colors = meter_colors[times >= self._start_time + self._warmup_us]
+        vq_color_counts = meter_colors.groupby(["vq_id", "color"]).size()
+        self._vq_color_counts = SummaryAccumulator._merge(self._vq_color_counts, vq_color_counts)
+
+    def get_color_counts(self, vq_ids: np.ndarray) -> np.ndarray:
+        """
+        How many packets the VQs have marked with each color (see METER_COLORS), only counting the given VQs: those of
+        the filtered log entries, therefore the backward packets and the meta flows are left out (unless they share a
+        VQ with the other flows, e.g. in per-port-vq).
+        """
+        counts = np.zeros(len(METER_COLORS), dtype=np.int64)
+        vq_color_counts = self._vq_color_counts
+        if len(vq_color_counts) == 0:
+            return counts
+        vq_color_counts = vq_color_counts[vq_color_counts.index.get_level_values("vq_id").isin(vq_ids)]
+        colors = SummaryAccumulator._level_values(vq_color_counts, "color")
+        known_colors = colors < len(METER_COLORS)  # Without METER_INVALID
+        np.add.at(counts, colors[known_colors], vq_color_counts.to_numpy(dtype=np.int64)[known_colors])
+        return counts
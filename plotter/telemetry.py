@@ -0,0 +1,55 @@
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+
+from plotter.parser import SwitchLogParser
+from tracing.tracer import traced
+
+# See ETHER_TYPE_TELEMETRY and telemetry_t in types.p4
+ETHER_TYPE_TELEMETRY = 0x88B5
+ETHERNET_HEADER_SIZE_BYTES = 14
+TELEMETRY_RECORD_DTYPE = np.dtype([
+    ('timestamp_high', '>u2'),  # The 48-bit timestamp is split into two fields
+    ('timestamp_low', '>u4'),
+    ('ingress_port', '>u2'),
+    ('egress_port', '>u2'),
+    ('flow_id', '>u2'),
+    ('vq_id', '>u2'),
+    ('dequeue_timedelta', '>u4'),
+    ('packet_length', '>u4'),
+])
+TELEMETRY_RECORD_SIZE_BYTES = TELEMETRY_RECORD_DTYPE.itemsize
+
+
+class TelemetryReader:
+    """Reads the telemetry records saved by the collector; the result is the same as that of SwitchLogParser."""
+
+    # How many records are decoded at once
+    CHUNK_RECORD_COUNT: int = 1024 * 1024
+
+    @staticmethod
+    @traced('plotter')
+    def read(path: Path) -> pd.DataFrame:
+        records = np.fromfile(path, dtype=np.uint8)
+        records = records[:len(records) - len(records) % TELEMETRY_RECORD_SIZE_BYTES]  # Drop an incomplete record
+        return TelemetryReader._decode(records.view(TELEMETRY_RECORD_DTYPE))
+
+    @staticmethod
+    def read_chunks(path: Path, chunk_record_count: int = CHUNK_RECORD_COUNT) -> Iterator[pd.DataFrame]:
+        with open(path, 'rb') as f:
+            while True:
+                records = np.fromfile(f, dtype=TELEMETRY_RECORD_DTYPE, count=chunk_record_count)
+                if len(records) == 0:
+                    break
+                yield TelemetryReader._decode(records)
+
+    @staticmethod
+    def _decode(records: np.ndarray) -> pd.DataFrame:
+        columns = {
+            'timestamp': (records['timestamp_high'].astype(np.int64) << 32) | records['timestamp_low'].astype(np.int64)
+        }
+        for column in SwitchLogParser.COLUMNS[1:]:
+            columns[column] = records[column].astype(np.int64)
+        return pd.DataFrame(columns, columns=SwitchLogParser.COLUMNS)
@@ -0,0 +1,147 @@
+from dataclasses import dataclass
+from typing import Optional, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from plotter.constants import QUEUE_DELAY_BIN_WIDTH_US, QUEUE_DELAY_BIN_COUNT, METER_COLORS
+from plotter.stats import histogram_percentiles
+from plotter.vqstats import VqStatsReader
+from scenario.spec import MeasurementMetadata
+from tracing.tracer import traced
+
+# The queue delay percentiles of each window
+TIME_SERIES_PERCENTILES: List[float] = [50, 99]
+
+
+@dataclass
+class MeasurementTimeSeries:
+    """
+    Metrics of a measurement in sliding windows: window i covers [window_starts[i], window_starts[i] + window length).
+    The times are in microseconds since the start of the (filtered) log entries.
+    """
+    window_starts: np.ndarray
+    window_length_us: int
+    # The names of the flow types, flow type i + 1 is the i-th one (see MeasurementMetadata)
+    flow_type_names: List[str]
+    # Shape: (flow types, windows), Mbps
+    flow_type_throughputs: np.ndarray
+    # Shape: (VQs, windows), Mbps; one row per element of vq_ids
+    vq_ids: np.ndarray
+    vq_throughputs: np.ndarray
+    # Shape: (windows), Jain's fairness index of the throughputs of the VQs active in the window
+    vq_fairness: np.ndarray
+    # Shape: (flow types, windows), Jain's fairness index of the throughputs of the flows of each flow type
+    flow_fairness: np.ndarray
+    # Shape: (flow types, TIME_SERIES_PERCENTILES, windows), microseconds (upper edge of the queue delay bin)
+    delay_percentiles: np.ndarray
+    # The meter colors are timed by bmv2's wall clock (or by the controller's polls), therefore they have their own
+    # windows (None: no VQs)
+    color_window_starts: Optional[np.ndarray] = None
+    # Shape: (meter colors, color windows), the share of the metered packets with each color (e.g. red: dropped)
+    color_shares: Optional[np.ndarray] = None
+
+    @staticmethod
+    @traced('plotter')
+    def of_data(data: pd.DataFrame, window_length_us: int, window_step_us: int, metadata: MeasurementMetadata,
+                meter_colors: Optional[pd.DataFrame] = None,
+                vq_stats: Optional[pd.DataFrame] = None) -> 'MeasurementTimeSeries':
+        """
+        Computes the metrics of log entries that have already been filtered and classified (see load_data).
+        The window length must be a multiple of the step; everything is binned by the step first, then summed up.
+        The meter colors are taken from the VQ statistics polled by the controller if available (see VqStatsReader),
+        otherwise from the "Meter color" log entries (see SwitchLogParser.parse_meter_colors_caching).
+        """
+        if window_length_us % window_step_us != 0:
+            raise ValueError('The window length must be a multiple of the window step')
+        window_steps = window_length_us // window_step_us
+        window_seconds = window_length_us / 1_000_000
+
+        steps = data.timestamp.to_numpy(dtype=np.int64) // window_step_us
+        step_count = max(int(steps.max(initial=-1)) + 1, window_steps)
+        packet_bits = data.packet_length.to_numpy(dtype=np.int64) * 8
+        flow_type_count = len(metadata.flow_type_names)
+        flow_type_indexes = data.flow_type.to_numpy(dtype=np.int64) - 1
+
+        # Throughputs: bits per (group, step), summed over the steps of each window
+        flow_type_bits = _sliding_sums(_bincount_2d(flow_type_indexes, flow_type_count, steps, step_count, packet_bits),
+                                       window_steps)
+        vq_ids, vq_indexes = np.unique(data.vq_id.to_numpy(dtype=np.int64), return_inverse=True)
+        vq_bits = _sliding_sums(_bincount_2d(vq_indexes.reshape(-1), len(vq_ids), steps, step_count, packet_bits),
+                                window_steps)
+
+        # The flows are keyed by their flow type too: a flow ID might be shared by different flow types (collisions)
+        flow_keys, flow_indexes = np.unique(data.flow_id.to_numpy(dtype=np.int64) * flow_type_count + flow_type_indexes,
+                                            return_inverse=True)
+        flow_bits = _sliding_sums(_bincount_2d(flow_indexes.reshape(-1), len(flow_keys), steps, step_count,
+                                               packet_bits), window_steps)
+        flow_fairness = np.stack([_jain_fairness(flow_bits[flow_keys % flow_type_count == flow_type_index])
+                                  for flow_type_index in range(flow_type_count)])
+
+        # Queue delay percentiles: a queue delay histogram per (flow type, window)
+        delay_bins = np.minimum(data.dequeue_timedelta.to_numpy(dtype=np.int64) // QUEUE_DELAY_BIN_WIDTH_US,
+                                QUEUE_DELAY_BIN_COUNT - 1)
+        delay_histograms = _bincount_2d(flow_type_indexes * QUEUE_DELAY_BIN_COUNT + delay_bins,
+                                        flow_type_count * QUEUE_DELAY_BIN_COUNT, steps, step_count)
+        delay_histograms = _sliding_sums(delay_histograms, window_steps).reshape(flow_type_count, QUEUE_DELAY_BIN_COUNT,
+                                                                                 -1)
+        delay_percentiles = histogram_percentiles(delay_histograms, TIME_SERIES_PERCENTILES)
+
+        time_series = MeasurementTimeSeries(
+            window_starts=np.arange(step_count - window_steps + 1) * window_step_us,
+            window_length_us=window_length_us,
+            flow_type_names=list(metadata.flow_type_names),
+            flow_type_throughputs=flow_type_bits / window_seconds / 1e6,
+            vq_ids=vq_ids,
+            vq_throughputs=vq_bits / window_seconds / 1e6,
+            vq_fairness=_jain_fairness(vq_bits),
+            flow_fairness=flow_fairness,
+            delay_percentiles=delay_percentiles,
+        )
+        if vq_stats is not None and vq_stats.shape[0] > 0:
+            poll_times, deltas = VqStatsReader.get_color_deltas(vq_stats)
+            time_series.color_window_starts, time_series.color_shares = MeasurementTimeSeries._get_color_shares(
+                np.tile(poll_times, len(METER_COLORS)), np.repeat(np.arange(len(METER_COLORS)), len(poll_times)),
+                deltas.reshape(-1), window_steps, window_step_us, metadata.warmup_seconds)
+        elif meter_colors is not None and meter_colors.shape[0] > 0:
+            time_series.color_window_starts, time_series.color_shares = MeasurementTimeSeries._get_color_shares(
+                meter_colors.time.to_numpy(dtype=np.int64), meter_colors.color.to_numpy(dtype=np.int64), None,
+                window_steps, window_step_us, metadata.warmup_seconds)
+        return time_series
+
+    @staticmethod
+    def _get_color_shares(times: np.ndarray, colors: np.ndarray, counts: Optional[np.ndarray], window_steps: int,
+                          window_step_us: int, warmup_seconds: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Windows the colors (and their counts, 1 each by default) which have been observed at the given times."""
+        # Same as the log entries: the first observation is the epoch time, and the warmup phase is dropped
+        times = times - times.min() - round(warmup_seconds * 1_000_000)
+        mask = (times >= 0) & (colors < len(METER_COLORS))
+        steps = times[mask] // window_step_us
+        step_count = max(int(steps.max(initial=-1)) + 1, window_steps)
+        color_counts = _sliding_sums(_bincount_2d(colors[mask], len(METER_COLORS), steps, step_count,
+                                                  counts[mask] if counts is not None else None), window_steps)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            color_shares = color_counts / color_counts.sum(axis=0)
+        return np.arange(step_count - window_steps + 1) * window_step_us, color_shares
+
+
+def _bincount_2d(groups: np.ndarray, group_count: int, steps: np.ndarray, step_count: int,
+                 weights: Optional[np.ndarray] = None) -> np.ndarray:
+    """Sums the weights (or counts the elements) of each (group, step); shape: (group_count, step_count)."""
+    counts = np.bincount(groups * step_count + steps, weights=weights, minlength=group_count * step_count)
+    return counts.reshape(group_count, step_count)
+
+
+def _sliding_sums(values: np.ndarray, window_steps: int) -> np.ndarray:
+    """Sums each window_steps consecutive elements along the last axis."""
+    cumulative_sums = np.cumsum(values, axis=-1)
+    padding = np.zeros(values.shape[:-1] + (1,), dtype=cumulative_sums.dtype)
+    cumulative_sums = np.concatenate([padding, cumulative_sums], axis=-1)
+    return cumulative_sums[..., window_steps:] - cumulative_sums[..., :-window_steps]
+
+
+def _jain_fairness(throughputs: np.ndarray) -> np.ndarray:
+    """Jain's fairness index of each column (window), only considering the rows (e.g. flows) active in that window."""
+    active_counts = (throughputs > 0).sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return throughputs.sum(axis=0) ** 2 / (active_counts * (throughputs ** 2).sum(axis=0))
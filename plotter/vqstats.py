@@ -0,0 +1,58 @@
+from pathlib import Path
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+from plotter.constants import METER_COLORS
+from tracing.tracer import traced
+
+# See VQ_STATS_RECORD_DTYPE in controller/stats.py, which writes the records
+VQ_STATS_RECORD_DTYPE = np.dtype(
+    [('time_us', '<i8'), ('switch_index', '<u2'), ('vq_id', '<u4')]
+    + [(f'{color}_packets', '<u8') for color in METER_COLORS]
+    + [(f'{color}_bytes', '<u8') for color in METER_COLORS]
+)
+
+
+class VqStatsReader:
+    """Reads the per-VQ color counters polled by the controller (see VqStatsPoller) from vq_stats.bin."""
+
+    @staticmethod
+    @traced('plotter')
+    def read(path: Path) -> pd.DataFrame:
+        """One row per record: the cumulative counters of a VQ at a point in time (unix time in microseconds)."""
+        records = np.fromfile(path, dtype=np.uint8)
+        records = records[:len(records) - len(records) % VQ_STATS_RECORD_DTYPE.itemsize]  # Drop an incomplete record
+        records = records.view(VQ_STATS_RECORD_DTYPE)
+        return pd.DataFrame({name: records[name].astype(np.int64) for name in VQ_STATS_RECORD_DTYPE.names})
+
+    @staticmethod
+    def get_color_counts(data: pd.DataFrame, vq_ids: np.ndarray, warmup_seconds: float) -> np.ndarray:
+        """
+        The packet count of each color (see METER_COLORS): the sum of the last counters of each given VQ (e.g. of the
+        filtered log entries, see MeterColorAccumulator), minus its counters at the end of the warmup phase. The first
+        poll is the epoch time.
+        """
+        columns = [f'{color}_packets' for color in METER_COLORS]
+        if data.shape[0] == 0:
+            return np.zeros(len(METER_COLORS), dtype=np.int64)
+        warmup_end_time = data.time_us.min() + round(warmup_seconds * 1_000_000)
+        data = data[data.vq_id.isin(vq_ids)]
+        last_records = data.groupby(['switch_index', 'vq_id'])[columns].last()
+        warmup_records = data[data.time_us < warmup_end_time].groupby(['switch_index', 'vq_id'])[columns].last()
+        counts = (last_records - warmup_records.reindex(last_records.index, fill_value=0)).clip(lower=0)
+        return counts.sum().to_numpy(dtype=np.int64)
+
+    @staticmethod
+    def get_color_deltas(data: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the poll times and how many packets of each color have been metered since the previous poll.
+        Shape of the deltas: (meter colors, polls).
+        """
+        columns = [f'{color}_packets' for color in METER_COLORS]
+        # The records only contain the VQs that have changed, therefore the deltas are computed per VQ
+        deltas = data.groupby(['switch_index', 'vq_id'])[columns].diff().fillna(data[columns])
+        deltas = deltas.clip(lower=0)  # The counters are cleared when the switch state is reset
+        deltas = deltas.groupby(data.time_us).sum()
+        return deltas.index.to_numpy(dtype=np.int64), deltas.to_numpy(dtype=np.int64).T
@@ -0,0 +1,247 @@
+import json
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import List, Tuple, Dict, Any, Optional
+
+from p4build.constants import PER_FLOW_VQ_VARIANTS
+from plotter.constants import DEFAULT_FLOW_TYPE_NAMES
+
+# The switch whose log the plotter analyzes: every client host is connected to it
+MEASURED_SWITCH = 's1'
+
+TOPOLOGY_KINDS: List[str] = ['single', 'leaf-spine', 'fat-tree']
+TRAFFIC_PATTERNS: List[str] = ['all-to-all', 'incast']
+
+
+@dataclass(frozen=True)
+class TopologySpec:
+    """
+    - single: one switch, every host is connected to it
+    - leaf-spine: every leaf is connected to every spine; the clients are connected to the first leaf, the servers to
+      the other leaves (round-robin)
+    - fat-tree: k pods of k/2 edge and k/2 aggregation switches, and (k/2)^2 core switches; the clients are connected
+      to the first edge switch, the servers to the edge switches of the other pods (round-robin)
+    """
+    kind: str = 'single'
+    server_hosts: int = 2
+    leaves: int = 2
+    spines: int = 2
+    k: int = 4
+
+
+@dataclass(frozen=True)
+class FlowClass:
+    """
+    Flows which are sent by the same client hosts with the same iperf parameters; each one is a flow type in the plots.
+    - all-to-all: each client host sends to each server host
+    - incast: each client host sends to the same server host (the target-th one) at the same time
+    """
+    name: str
+    rate: str  # iperf --bitrate, e.g. 400K
+    count: int  # iperf --parallel: how many flows each client host sends to each of its server hosts
+    hosts: int = 1  # How many client hosts send this class
+    pattern: str = 'all-to-all'
+    target: int = 0
+
+
+@dataclass(frozen=True)
+class IperfPair:
+    """An iperf client and its own iperf server; the port is unique for each client host."""
+    flow_class: FlowClass
+    client_host: str
+    server_host: str
+    port: int
+
+
+@dataclass(frozen=True)
+class ScenarioSpec:
+    topology: TopologySpec
+    flow_classes: Tuple[FlowClass, ...]
+
+    @staticmethod
+    def load(path: Path) -> 'ScenarioSpec':
+        """Loads a JSON spec, see the examples in scenario/specs."""
+        with open(path, 'r') as f:
+            spec = json.load(f)
+        return ScenarioSpec.of_dict(spec)
+
+    @staticmethod
+    def of_dict(spec: Dict[str, Any]) -> 'ScenarioSpec':
+        scenario = ScenarioSpec(
+            topology=TopologySpec(**spec.get('topology', dict())),
+            flow_classes=tuple(FlowClass(**flow_class) for flow_class in spec['flow_classes']),
+        )
+        scenario.validate()
+        return scenario
+
+    @staticmethod
+    def of_flows(flows: str) -> 'ScenarioSpec':
+        """The single switch scenario of network.py's --flows argument, e.g. 400K:10,2M:3 (one client host each)."""
+        rate_counts = [flow.split(':') for flow in flows.split(',')]
+        names = DEFAULT_FLOW_TYPE_NAMES if len(rate_counts) == len(DEFAULT_FLOW_TYPE_NAMES) else \
+            [f'type{i + 1}' for i in range(len(rate_counts))]
+        return ScenarioSpec(TopologySpec(), tuple(FlowClass(name, rate, int(count))
+                                                  for name, (rate, count) in zip(names, rate_counts)))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'topology': asdict(self.topology), 'flow_classes': [asdict(c) for c in self.flow_classes]}
+
+    def validate(self) -> None:
+        topology = self.topology
+        if topology.kind not in TOPOLOGY_KINDS:
+            raise ValueError(f'Unknown topology kind: {topology.kind}')
+        if topology.kind == 'leaf-spine' and (topology.leaves < 1 or topology.spines < 1):
+            raise ValueError('A leaf-spine topology needs at least one leaf and one spine')
+        if topology.kind == 'fat-tree' and (topology.k < 2 or topology.k % 2 != 0):
+            raise ValueError('The k of a fat-tree must be a positive even number')
+        if topology.server_hosts < 1 or len(self.flow_classes) == 0:
+            raise ValueError('A scenario needs at least one server host and one flow class')
+        if len({flow_class.name for flow_class in self.flow_classes}) != len(self.flow_classes):
+            raise ValueError('The names of the flow classes must be unique')
+        for flow_class in self.flow_classes:
+            if flow_class.pattern not in TRAFFIC_PATTERNS:
+                raise ValueError(f'Unknown traffic pattern: {flow_class.pattern}')
+            if not 0 <= flow_class.target < topology.server_hosts:
+                raise ValueError(f'The target of {flow_class.name} is not a server host')
+            if flow_class.hosts < 1 or flow_class.count < 1:
+                raise ValueError(f'{flow_class.name} needs at least one host and one flow')
+
+    def get_layout(self) -> 'NetworkLayout':
+        return NetworkLayout(self)
+
+
+class NetworkLayout:
+    """
+    The nodes and links of a scenario. The hosts are named h1, h2, ...: the client hosts of each flow class in order,
+    then the server hosts. The switch ports are numbered in the order of the links, as p4utils numbers them.
+    """
+
+    def __init__(self, scenario: ScenarioSpec) -> None:
+        self._scenario: ScenarioSpec = scenario
+        self.switches: List[str] = []
+        self.hosts: List[str] = []
+        # The client hosts of each flow class, in the order of the flow classes
+        self.class_client_hosts: List[List[str]] = []
+        self.server_hosts: List[str] = []
+        # Each link is added in this order: the switch ports are assigned in this order too
+        self.links: List[Tuple[str, str]] = []
+
+        host_count = 0
+        for flow_class in scenario.flow_classes:
+            self.class_client_hosts.append([f'h{host_count + i + 1}' for i in range(flow_class.hosts)])
+            host_count += flow_class.hosts
+        self.server_hosts = [f'h{host_count + i + 1}' for i in range(scenario.topology.server_hosts)]
+        self.hosts = [host for hosts in self.class_client_hosts for host in hosts] + self.server_hosts
+        self._build_topology()
+
+    def _build_topology(self) -> None:
+        topology = self._scenario.topology
+        client_hosts = [host for hosts in self.class_client_hosts for host in hosts]
+        if topology.kind == 'single':
+            self.switches = [MEASURED_SWITCH]
+            self.links = [(MEASURED_SWITCH, host) for host in self.hosts]
+            return
+
+        if topology.kind == 'leaf-spine':
+            edges = [f's{i + 1}' for i in range(topology.leaves)]
+            uplinks = [(leaf, f's{topology.leaves + i + 1}') for leaf in edges for i in range(topology.spines)]
+            self.switches = edges + [f's{topology.leaves + i + 1}' for i in range(topology.spines)]
+            # The servers are not connected to the clients' leaf, unless it is the only one
+            server_edges = edges[1:] if len(edges) > 1 else edges
+        else:
+            half = topology.k // 2
+            edges = [f's{pod * half + i + 1}' for pod in range(topology.k) for i in range(half)]
+            aggregations = [f's{len(edges) + pod * half + i + 1}' for pod in range(topology.k) for i in range(half)]
+            cores = [f's{2 * len(edges) + i + 1}' for i in range(half * half)]
+            uplinks = [(edges[pod * half + e], aggregations[pod * half + a])
+                       for pod in range(topology.k) for e in range(half) for a in range(half)]
+            uplinks += [(aggregations[pod * half + a], cores[a * half + c])
+                        for pod in range(topology.k) for a in range(half) for c in range(half)]
+            self.switches = edges + aggregations + cores
+            server_edges = edges[half:]  # The edge switches of the other pods
+
+        # The client hosts are connected first: they get the first ports of the measured switch
+        self.links = [(MEASURED_SWITCH, host) for host in client_hosts]
+        self.links += [(server_edges[i % len(server_edges)], host) for i, host in enumerate(self.server_hosts)]
+        self.links += uplinks
+
+    def get_port(self, switch: str, node: str) -> int:
+        """The switch port which is connected to the node."""
+        ports = [link for link in self.links if switch in link]
+        for port, link in enumerate(ports, start=1):
+            if node in link:
+                return port
+        raise ValueError(f'{switch} is not connected to {node}')
+
+    def get_next_port(self, switch: str) -> int:
+        """The port of the next link of the switch, e.g. of the telemetry collector host."""
+        return sum(1 for link in self.links if switch in link) + 1
+
+    def get_iperf_pairs(self, port_min: int) -> List[IperfPair]:
+        """Each client host sends to its server hosts on its own port: an iperf3 server only serves one client."""
+        pairs: List[IperfPair] = []
+        client_index = 0
+        for flow_class, client_hosts in zip(self._scenario.flow_classes, self.class_client_hosts):
+            for client_host in client_hosts:
+                server_hosts = self.server_hosts if flow_class.pattern == 'all-to-all' else \
+                    [self.server_hosts[flow_class.target]]
+                pairs += [IperfPair(flow_class, client_host, server_host, port_min + client_index)
+                          for server_host in server_hosts]
+                client_index += 1
+        return pairs
+
+    def get_metadata(self, warmup_seconds: float, variant: Optional[str] = None) -> 'MeasurementMetadata':
+        return MeasurementMetadata(
+            flow_type_names=[flow_class.name for flow_class in self._scenario.flow_classes],
+            flow_type_ports=[[self.get_port(MEASURED_SWITCH, host) for host in hosts]
+                             for hosts in self.class_client_hosts],
+            # Each iperf client has a control connection besides its flows
+            meta_flow_count=len(self.get_iperf_pairs(port_min=0)),
+            warmup_seconds=warmup_seconds,
+            scenario=self._scenario.to_dict(),
+            variant=variant,
+        )
+
+
+@dataclass(frozen=True)
+class MeasurementMetadata:
+    """
+    What the plotter needs to know about the scenario of a measurement: written next to its logs by network.py.
+    The flow types are numbered from 1 in the order of the flow classes; see the constants of the plotter.
+    """
+    flow_type_names: List[str] = field(default_factory=lambda: list(DEFAULT_FLOW_TYPE_NAMES))
+    # The ports of the measured switch which are connected to the client hosts of each flow type
+    flow_type_ports: List[List[int]] = field(default_factory=lambda: [[1], [2]])
+    # How many of the smallest flows are iperf meta flows (control connections)
+    meta_flow_count: int = 4
+    # How many seconds should be dropped from the start of the logs (the Mininet warmup phase)
+    warmup_seconds: float = 6
+    # The spec of the scenario (see ScenarioSpec.to_dict), to record how the measurement has been made
+    scenario: Optional[Dict[str, Any]] = None
+    # The switch variant (see VARIANTS in p4build/constants.py), None for older measurements
+    variant: Optional[str] = None
+
+    FILE_NAME = 'scenario.json'
+
+    @property
+    def client_ports(self) -> List[int]:
+        return [port for ports in self.flow_type_ports for port in ports]
+
+    @property
+    def per_flow_vqs(self) -> Optional[bool]:
+        """Whether the variant has per-flow VQs; None if it is unknown (older measurements)."""
+        return self.variant in PER_FLOW_VQ_VARIANTS if self.variant is not None else None
+
+    @staticmethod
+    def read(measurement_dir: Path) -> 'MeasurementMetadata':
+        """The metadata of a measurement; the defaults (2 flow types, 2 servers) for older measurements."""
+        path = measurement_dir / MeasurementMetadata.FILE_NAME
+        if not path.exists():
+            return MeasurementMetadata()
+        with open(path, 'r') as f:
+            return MeasurementMetadata(**json.load(f))
+
+    def write(self, measurement_dir: Path) -> None:
+        measurement_dir.mkdir(parents=True, exist_ok=True)
+        with open(measurement_dir / MeasurementMetadata.FILE_NAME, 'w') as f:
+            json.dump(asdict(self), f, indent=2)
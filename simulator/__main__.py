@@ -0,0 +1,67 @@
+import itertools
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import List
+
+import pandas as pd
+
+from controller.data import Config
+from plotter.loader import load_data
+from plotter.classifier import classify_ingress_port
+from scenario.spec import MeasurementMetadata
+from simulator.simulator import VirtualQueueSimulator, summarize_simulation
+
+
+def main() -> None:
+    parser = ArgumentParser(description='Replays a switch log through VQs with different alpha values')
+    parser.add_argument('--switch-log', type=Path, required=True,
+                        help='The switch log to replay, ideally measured without VQs, e.g.'
+                             ' work/measure/no-vq/p4s.s1.log')
+    parser.add_argument('--variant', choices=['per-port-vq', 'per-flow-vq'], default='per-flow-vq',
+                        help='Which VQ variant to simulate')
+    parser.add_argument('--vq-committed-alpha', type=float, nargs='+', required=True,
+                        help='The committed alphas to simulate')
+    parser.add_argument('--vq-peak-alpha', type=float, nargs='+', required=True,
+                        help='The peak alphas to simulate; each one is paired with each committed alpha not above it')
+    parser.add_argument('--queue-rate-pps', type=int, default=500)
+    parser.add_argument('--queue-depth-packets', type=int, default=30)
+    parser.add_argument('--output', type=Path, help='Save the results as CSV to this file')
+    args = parser.parse_args()
+
+    # Load some args into intermediate variables to add type hints
+    args_switch_log: Path = args.switch_log
+
+    alpha_pairs = [(committed, peak) for committed, peak in itertools.product(args.vq_committed_alpha,
+                                                                              args.vq_peak_alpha) if committed <= peak]
+    if len(alpha_pairs) == 0:
+        raise ValueError('No valid alpha pairs: the peak alpha must not be less than the committed alpha')
+
+    print(f'Loading the switch log: {args_switch_log}')
+    metadata = MeasurementMetadata.read(args_switch_log.parent)
+    data: pd.DataFrame = classify_ingress_port(load_data(args_switch_log, metadata), metadata.flow_type_ports)
+    print(f'  Count of log entries: {data.shape[0]}')
+
+    print(f'Simulating {len(alpha_pairs)} alpha pairs...')
+    base_config = Config(
+        switch_queue_rate_pps=args.queue_rate_pps,
+        switch_queue_depth_packets=args.queue_depth_packets,
+        virtual_queue_committed_alpha=alpha_pairs[0][0],
+        virtual_queue_peak_alpha=alpha_pairs[0][1],
+    )
+    simulator = VirtualQueueSimulator(base_config, alpha_pairs, per_flow_vq=args.variant == 'per-flow-vq')
+    start = time.perf_counter()
+    result = simulator.simulate(data)
+    print(f'  Simulated in {time.perf_counter() - start:.1f} s')
+
+    summary = summarize_simulation(data, result, metadata)
+    columns: List[str] = list(summary.columns)
+    with pd.option_context('display.max_rows', None, 'display.max_columns', len(columns), 'display.width', 200):
+        print(summary)
+    if args.output is not None:
+        summary.to_csv(args.output, index=False)
+        print(f'Results saved to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+import dataclasses
+from dataclasses import dataclass
+from enum import Enum
+from typing import List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from controller.data import Config
+from p4build.constants import FLOW_ID_WIDTH
+from scenario.spec import MeasurementMetadata
+
+
+class Outcome(Enum):
+    """What happens to a packet; the first three values match the meter colors of types.p4."""
+    GREEN = 0  # Forwarded
+    YELLOW = 1  # Forwarded with ECN marking
+    RED = 2  # Dropped by the VQ
+    QUEUE_DROP = 3  # Dropped by the (full) switch queue
+
+
+@dataclass
+class SimulationResult:
+    alpha_pairs: List[Tuple[float, float]]  # (committed alpha, peak alpha)
+    outcomes: np.ndarray  # Shape: (packets, alpha pairs), Outcome values
+    queue_delays: np.ndarray  # Shape: (packets, alpha pairs), microseconds, NaN for dropped packets
+
+
+class VirtualQueueSimulator:
+    """
+    Replays the arrivals of a trace (e.g. parsed switch logs) through the VQs and the switch queue, without Mininet.
+    - VQs: two rate three color markers (RFC 2698), the same as the bmv2 meters used by logic.p4
+    - Switch queue: FIFO per egress port with a fixed dequeue rate and a fixed depth
+    Many alpha pairs are simulated at once: the state of every VQ and queue is a vector with one element per pair.
+    The replay is open-loop: the senders do not react to ECN marks and drops like they would in a real measurement.
+    """
+
+    def __init__(self, base_config: Config, alpha_pairs: Sequence[Tuple[float, float]], per_flow_vq: bool) -> None:
+        self._base_config: Config = base_config
+        self._alpha_pairs: List[Tuple[float, float]] = list(alpha_pairs)
+        self._per_flow_vq: bool = per_flow_vq
+
+        # Use the same rates as the controller: [(cir, cburst), (pir, pburst)] for each alpha pair
+        rates = [dataclasses.replace(base_config, virtual_queue_committed_alpha=committed,
+                                     virtual_queue_peak_alpha=peak).get_virtual_queue_rates()
+                 for committed, peak in self._alpha_pairs]
+        self._cir = np.array([r[0][0] for r in rates])  # Tokens per microsecond
+        self._cburst = np.array([r[0][1] for r in rates], dtype=np.float64)
+        self._pir = np.array([r[1][0] for r in rates])
+        self._pburst = np.array([r[1][1] for r in rates], dtype=np.float64)
+
+    def simulate(self, data: pd.DataFrame) -> SimulationResult:
+        """Simulates the packets of the parsed switch log entries; the result's rows follow the rows of the data."""
+        # The packet arrived at the queue (right after being metered) when it had been dequeued minus its queue delay
+        arrivals = (data.timestamp.to_numpy(dtype=np.int64) - data.dequeue_timedelta.to_numpy(dtype=np.int64))
+        egress_ports = data.egress_port.to_numpy(dtype=np.int64)
+        if self._per_flow_vq:
+            vq_keys = (egress_ports << FLOW_ID_WIDTH) | data.flow_id.to_numpy(dtype=np.int64)
+        else:
+            vq_keys = egress_ports
+        vq_indexes = np.unique(vq_keys, return_inverse=True)[1].reshape(-1)
+        port_indexes = np.unique(egress_ports, return_inverse=True)[1].reshape(-1)
+
+        packet_count, pair_count = data.shape[0], len(self._alpha_pairs)
+        vq_count, port_count = int(vq_indexes.max(initial=-1)) + 1, int(port_indexes.max(initial=-1)) + 1
+        outcomes = np.empty((packet_count, pair_count), dtype=np.uint8)
+        queue_delays = np.full((packet_count, pair_count), np.nan, dtype=np.float32)
+
+        # The buckets are full initially
+        committed_tokens = np.tile(self._cburst, (vq_count, 1))
+        peak_tokens = np.tile(self._pburst, (vq_count, 1))
+        last_metered = np.full(vq_count, np.nan)
+        # When the last accepted packet of each port is dequeued
+        last_dequeued = np.full((port_count, pair_count), -np.inf)
+        dequeue_interval = 1_000_000 / self._base_config.switch_queue_rate_pps
+        queue_depth = self._base_config.switch_queue_depth_packets
+
+        for i in np.argsort(arrivals, kind='stable'):
+            time, vq, port = float(arrivals[i]), vq_indexes[i], port_indexes[i]
+
+            # Refill the buckets since the last packet of the VQ, then meter the packet (1 token per packet)
+            if not np.isnan(last_metered[vq]):
+                elapsed = time - last_metered[vq]
+                committed_tokens[vq] = np.minimum(committed_tokens[vq] + elapsed * self._cir, self._cburst)
+                peak_tokens[vq] = np.minimum(peak_tokens[vq] + elapsed * self._pir, self._pburst)
+            last_metered[vq] = time
+            red = peak_tokens[vq] < 1
+            yellow = ~red & (committed_tokens[vq] < 1)
+            peak_tokens[vq] -= ~red
+            committed_tokens[vq] -= ~red & ~yellow
+            outcome = np.where(red, Outcome.RED.value, np.where(yellow, Outcome.YELLOW.value, Outcome.GREEN.value))
+
+            # Tail drop if the switch queue is full, otherwise the packet is dequeued after the previous one
+            backlog = np.maximum(np.ceil((last_dequeued[port] - time) / dequeue_interval), 0)
+            accepted = ~red & (backlog < queue_depth)
+            dequeued = np.maximum(time, last_dequeued[port] + dequeue_interval)
+            last_dequeued[port] = np.where(accepted, dequeued, last_dequeued[port])
+
+            outcomes[i] = np.where(~red & ~accepted, Outcome.QUEUE_DROP.value, outcome)
+            queue_delays[i] = np.where(accepted, dequeued - time, np.nan)
+
+        return SimulationResult(alpha_pairs=self._alpha_pairs, outcomes=outcomes, queue_delays=queue_delays)
+
+
+def summarize_simulation(data: pd.DataFrame, result: SimulationResult, metadata: MeasurementMetadata) -> pd.DataFrame:
+    """One row per (alpha pair, flow type): the share of each outcome, queue delay percentiles and throughput."""
+    duration_seconds = max(int(data.timestamp.max() - data.timestamp.min()), 1) / 1_000_000
+    packet_lengths = data.packet_length.to_numpy(dtype=np.int64)
+    rows = []
+    for flow_type_index, flow_type_name in enumerate(metadata.flow_type_names):
+        flow_type_mask = data.flow_type.to_numpy() == flow_type_index + 1
+        if not flow_type_mask.any():
+            continue
+        for pair_index, (committed_alpha, peak_alpha) in enumerate(result.alpha_pairs):
+            outcomes = result.outcomes[flow_type_mask, pair_index]
+            delays = result.queue_delays[flow_type_mask, pair_index]
+            delays = delays[~np.isnan(delays)] / 1_000  # Convert microseconds to milliseconds
+            forwarded = outcomes <= Outcome.YELLOW.value
+            row = {
+                'committed_alpha': committed_alpha,
+                'peak_alpha': peak_alpha,
+                'flow_type': flow_type_name,
+                'packets': len(outcomes),
+            }
+            for outcome in Outcome:
+                row[f'{outcome.name.lower()}_share'] = float(np.mean(outcomes == outcome.value))
+            row['delay_p50_ms'] = float(np.percentile(delays, 50)) if len(delays) > 0 else np.nan
+            row['delay_p99_ms'] = float(np.percentile(delays, 99)) if len(delays) > 0 else np.nan
+            row['throughput_mbps'] = packet_lengths[flow_type_mask][forwarded].sum() * 8 / duration_seconds / 1e6
+            rows.append(row)
+    return pd.DataFrame(rows)
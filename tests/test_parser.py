@@ -0,0 +1,27 @@
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from benchmark.generator import SyntheticLogGenerator
+from benchmark.reference import ReferenceSwitchLogParser
+from plotter.parser import SwitchLogParser
+
+
+@pytest.fixture(scope='module')
+def switch_log_path(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    path = tmp_path_factory.mktemp('log') / 'p4s.s1.log'
+    SyntheticLogGenerator(2_000, 10, 'per-flow-vq').write(path)
+    # A last line without a newline, with trailing whitespace (ignored by the reference parser's line.rstrip())
+    with open(path, 'a') as f:
+        f.write('[12:00:00.000] [bmv2] [I] [thread 1] Egress data: timestamp=99999999; ingress_port=1; egress_port=4; '
+                'flow_id=7; vq_id=16391; dequeue_timedelta=12; packet_length=1514 \t')
+    return path
+
+
+# The small block sizes split many lines across block boundaries
+@pytest.mark.parametrize('block_size', [SwitchLogParser.BLOCK_SIZE_BYTES, 4096, 1000, 97])
+def test_parse_matches_reference(switch_log_path: Path, block_size: int) -> None:
+    data = SwitchLogParser.parse(switch_log_path, block_size)
+    assert data.shape[0] > 0
+    pd.testing.assert_frame_equal(data, ReferenceSwitchLogParser.parse(switch_log_path))
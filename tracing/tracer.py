@@ -0,0 +1,144 @@
+import functools
+import json
+import os
+import resource
+import threading
+import time
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Optional, Any, Dict, Callable, TypeVar, ContextManager, Set, Tuple
+
+T = TypeVar('T')
+
+
+class Tracer:
+    """
+    Writes spans into a trace file in the Chrome trace format (JSON array format),
+    e.g. for chrome://tracing or Perfetto.
+    Each event is appended to the file as soon as its span has ended, with a single write: the processes of a run
+    (including the forked workers) can share the same trace file. The closing bracket of the array is optional in this
+    format, therefore the file is valid as long as the processes are running, and even if they get killed.
+    """
+
+    def __init__(self, trace_path: Path, process_name: str) -> None:
+        self._trace_path: Path = trace_path
+        self._process_name: str = process_name
+        self._main_pid: int = os.getpid()
+        self._fd: int = Tracer._open(trace_path)
+        # The processes and threads which have already been named in the trace file
+        self._named_pids: Set[int] = set()
+        self._named_threads: Set[Tuple[int, int]] = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _open(trace_path: Path) -> int:
+        """Opens the trace file for appending; the first process to open it writes the opening bracket."""
+        trace_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = trace_path.with_name(f'.{trace_path.name}.{os.getpid()}')
+        temp_path.write_text('[\n')
+        try:
+            os.link(temp_path, trace_path)  # Atomic: fails if another process has already created the trace file
+        except FileExistsError:
+            pass
+        finally:
+            temp_path.unlink()
+        return os.open(trace_path, os.O_WRONLY | os.O_APPEND)
+
+    def span(self, name: str, category: str, args: Dict[str, Any]) -> ContextManager[None]:
+        return _Span(self, name, category, args)
+
+    def write_span(self, name: str, category: str, start_us: int, duration_us: int, args: Dict[str, Any]) -> None:
+        pid, thread = os.getpid(), threading.current_thread()
+        events = []
+        with self._lock:
+            if pid not in self._named_pids:
+                self._named_pids.add(pid)
+                process_name = self._process_name if pid == self._main_pid else f'{self._process_name} worker'
+                events.append({'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': {'name': process_name}})
+            if (pid, thread.ident) not in self._named_threads:
+                self._named_threads.add((pid, thread.ident))
+                events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': thread.ident,
+                               'args': {'name': thread.name}})
+        events.append({'name': name, 'cat': category, 'ph': 'X', 'ts': start_us, 'dur': duration_us, 'pid': pid,
+                       'tid': thread.ident, 'args': args})
+        os.write(self._fd, ''.join(json.dumps(event) + ',\n' for event in events).encode())
+
+
+class _Span:
+    """Measures the wall time, the CPU time (of the whole process) and the RSS change of a block."""
+    __slots__ = ('_tracer', '_name', '_category', '_args', '_start_ns', '_start_cpu_ns', '_start_rss_bytes')
+
+    def __init__(self, tracer: Tracer, name: str, category: str, args: Dict[str, Any]) -> None:
+        self._tracer: Tracer = tracer
+        self._name: str = name
+        self._category: str = category
+        self._args: Dict[str, Any] = args
+
+    def __enter__(self) -> None:
+        self._start_rss_bytes = get_rss_bytes()
+        self._start_cpu_ns = time.process_time_ns()
+        self._start_ns = time.time_ns()  # Wall clock: the spans of different processes are comparable
+
+    def __exit__(self, *exc_info: Any) -> None:
+        end_ns = time.time_ns()
+        cpu_ns = time.process_time_ns() - self._start_cpu_ns
+        rss_bytes = get_rss_bytes()
+        self._tracer.write_span(self._name, self._category, self._start_ns // 1_000,
+                                (end_ns - self._start_ns) // 1_000, {
+                                    **self._args,
+                                    'cpu_ms': round(cpu_ns / 1e6, 3),
+                                    'rss_mib': round(rss_bytes / 2 ** 20, 1),
+                                    'rss_delta_mib': round((rss_bytes - self._start_rss_bytes) / 2 ** 20, 1),
+                                })
+
+
+def get_rss_bytes() -> int:
+    """The current resident set size of the process (the peak one if /proc is not available)."""
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE_BYTES
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+_PAGE_SIZE_BYTES: int = resource.getpagesize()
+
+# Disabled by default; only one tracer per process, see enable_tracing
+_tracer: Optional[Tracer] = None
+_DISABLED_SPAN: ContextManager[None] = nullcontext()
+
+
+def enable_tracing(trace_path: Path, process_name: str, truncate: bool = False) -> None:
+    """
+    Starts recording the spans of this process (and of its forked child processes) into the trace file.
+    The processes of the same run append to the same file; the first one should truncate it.
+    """
+    global _tracer
+    if truncate and trace_path.exists():
+        trace_path.unlink()
+    _tracer = Tracer(trace_path, process_name)
+
+
+def span(name: str, category: str = '', **args: Any) -> ContextManager[None]:
+    """
+    A context manager which records the enclosed block as a span, e.g. with span('parse', 'plotter', path=str(path)).
+    It does nothing (and allocates nothing) while tracing is disabled; the args must be JSON serializable.
+    """
+    if _tracer is None:
+        return _DISABLED_SPAN
+    return _tracer.span(name, category, args)
+
+
+def traced(category: str, name: Optional[str] = None) -> Callable[[Callable[..., T]], Callable[..., T]]:
+    """Records each call of the decorated function as a span, named after the function by default."""
+    def decorator(function: Callable[..., T]) -> Callable[..., T]:
+        span_name = name if name is not None else function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> T:
+            if _tracer is None:
+                return function(*args, **kwargs)
+            with _tracer.span(span_name, category, dict()):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator